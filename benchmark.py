@@ -0,0 +1,329 @@
+"""
+Benchmarks for the Daily Settlement Ledger database layer
+Run with: python benchmark.py [name ...]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from reports import run_report
+from snapshot import Snapshot, export_snapshot
+from database import (SettlementLedgerDB, AMOUNT_COLUMNS, EDITABLE_COLUMNS,
+                      DEFAULT_CACHED_STATEMENTS, DEFAULT_BUSY_TIMEOUT, DEFAULT_LOCK_RETRIES,
+                      MONEY_CENTS)
+
+
+def _seed_entries(db, count):
+    """Insert count entries with random amounts in one transaction"""
+    rng = random.Random(42)
+    with db.transaction():
+        for i in range(count):
+            db.add_entry(f"Customer {i % 500}", *[round(rng.uniform(0, 10000), 2) for _ in range(8)])
+
+
+def _update_workloads(rows, operations):
+    """Build (single-field, mixed-field) lists of (entry_id, fields) updates"""
+    rng = random.Random(7)
+    amount_columns = EDITABLE_COLUMNS[1:]
+    single = []
+    mixed = []
+    for i in range(operations):
+        entry_id = rng.randint(1, rows)
+        single.append((entry_id, {amount_columns[i % len(amount_columns)]: round(rng.uniform(0, 100), 2)}))
+        # A random subset of fields, as produced by the CLI's "press Enter to skip" update
+        columns = [column for column in amount_columns if rng.random() < 0.5] or [amount_columns[0]]
+        mixed.append((entry_id, {column: round(rng.uniform(0, 100), 2) for column in columns}))
+    return single, mixed
+
+
+def bench_update_entry(rows=5000, operations=50000):
+    """
+    Compare update_entry with sqlite3's default 128-statement cache and with DEFAULT_CACHED_STATEMENTS
+    
+    Both runs use the same code, so the difference is statement preparation
+    alone. Updates run inside one transaction so the timing reflects
+    statement preparation and execution rather than per-commit disk syncs.
+    """
+    single, mixed = _update_workloads(rows, operations)
+    print(f"update_entry: {rows} rows, {operations} updates per run")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        dbs = [SettlementLedgerDB(os.path.join(tmp, f"cache-{size}.db"), cached_statements=size)
+               for size in (128, DEFAULT_CACHED_STATEMENTS)]
+        try:
+            for db in dbs:
+                _seed_entries(db, rows)
+            for workload_name, workload in (("single-field", single), ("mixed-field", mixed)):
+                for db in dbs:
+                    label = f"{db.cached_statements} statements"
+                    start = time.perf_counter()
+                    with db.transaction():
+                        for entry_id, fields in workload:
+                            db.update_entry(entry_id, **fields)
+                    elapsed = time.perf_counter() - start
+                    print(f"  {workload_name:<13} {label:<18} {elapsed:8.3f}s "
+                          f"{operations / elapsed:12,.0f} updates/s")
+        finally:
+            for db in dbs:
+                db.close()
+
+
+def bench_totals(rows=200000, repeats=5):
+    """
+    Compare amount totals: per-row rounding in Python vs SQL sums (REAL and cents)
+    """
+    print(f"totals: {rows} rows, best of {repeats}")
+    
+    def python_totals(db):
+        totals = dict.fromkeys(AMOUNT_COLUMNS, 0.0)
+        for entry in db.get_all_entries():
+            for column, value in zip(AMOUNT_COLUMNS, entry[2:10]):
+                if value is not None:
+                    totals[column] = round(totals[column] + round(value, 2), 2)
+        return totals
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        real_db = SettlementLedgerDB(os.path.join(tmp, "real.db"))
+        cents_db = SettlementLedgerDB(os.path.join(tmp, "cents.db"), money_storage=MONEY_CENTS)
+        try:
+            _seed_entries(real_db, rows)
+            _seed_entries(cents_db, rows)
+            runs = (
+                ("REAL, Python round", lambda: python_totals(real_db)),
+                ("REAL, SQL SUM", lambda: real_db.get_totals()),
+                ("cents, SQL SUM", lambda: cents_db.get_totals()),
+            )
+            for label, run in runs:
+                best = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    totals = run()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f"  {label:<20} {best:8.3f}s  today_balance={totals['today_balance']!r}")
+        finally:
+            real_db.close()
+            cents_db.close()
+
+
+def bench_report(rows=1000000, partitions=64):
+    """
+    Compare the partitioned report with one worker against one per CPU
+    """
+    cpus = os.cpu_count() or 1
+    print(f"report: {rows} rows, {partitions} id partitions")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SettlementLedgerDB(os.path.join(tmp, "report.db"), money_storage=MONEY_CENTS)
+        try:
+            _seed_entries(db, rows)
+            for workers in sorted({1, max(1, cpus // 2), cpus}):
+                start = time.perf_counter()
+                report = run_report(db, by="id", workers=workers, partitions=partitions)
+                elapsed = time.perf_counter() - start
+                print(f"  {workers:>3} worker(s) {elapsed:8.3f}s  balance_delta={report['total']['balance_delta']!r}")
+        finally:
+            db.close()
+
+
+def bench_snapshot(rows=200000, repeats=3):
+    """
+    Compare loading a column for analysis: SQL rows vs a memory-mapped snapshot
+    """
+    print(f"snapshot: {rows} rows, best of {repeats}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SettlementLedgerDB(os.path.join(tmp, "snapshot.db"), money_storage=MONEY_CENTS)
+        path = os.path.join(tmp, "ledger.snap")
+        try:
+            _seed_entries(db, rows)
+            start = time.perf_counter()
+            export_snapshot(db, path)
+            print(f"  {'export':<24} {time.perf_counter() - start:8.3f}s  {os.path.getsize(path):,} bytes")
+            
+            def sql_rows():
+                return sum(entry[9] for entry in db.get_all_entries() if entry[9] is not None)
+            
+            def snapshot_column():
+                with Snapshot(path) as snapshot:
+                    column = snapshot.column("today_balance")
+                    total = sum(column) / 100
+                    column.release()
+                return total
+            
+            for label, run in (("SQL rows", sql_rows), ("snapshot column (mmap)", snapshot_column)):
+                best = None
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    total = run()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f"  {label:<24} {best:8.3f}s  today_balance={total:,.2f}")
+        finally:
+            db.close()
+
+
+def _contending_writer(path, busy_timeout, lock_retries, writes, results):
+    """Worker process: add entries one transaction at a time and report lock metrics"""
+    db = SettlementLedgerDB(path)
+    db.set_busy_timeout(busy_timeout)
+    db.lock_retries = lock_retries
+    errors = 0
+    try:
+        for i in range(writes):
+            try:
+                with db.transaction():
+                    db.add_entry(f"Writer {os.getpid()}", seller_1=float(i))
+                    # Hold the lock briefly, like a small batch would
+                    time.sleep(0.002)
+            except Exception:
+                errors += 1
+        results.put((errors, db.lock_metrics()))
+    finally:
+        db.close()
+
+
+def bench_lock_contention(processes=8, writes=100):
+    """
+    Concurrent writer processes on one file under different busy timeout and retry settings
+    """
+    print(f"lock contention: {processes} processes x {writes} writes")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        configurations = (("no wait, no retry", 0.0, 0),
+                          ("50ms wait, no retry", 0.05, 0),
+                          ("50ms wait + retry", 0.05, DEFAULT_LOCK_RETRIES),
+                          ("defaults", DEFAULT_BUSY_TIMEOUT, DEFAULT_LOCK_RETRIES))
+        for number, (label, busy_timeout, lock_retries) in enumerate(configurations):
+            path = os.path.join(tmp, f"contention-{number}.db")
+            SettlementLedgerDB(path).close()
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_contending_writer,
+                                               args=(path, busy_timeout, lock_retries, writes, results))
+                       for _ in range(processes)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            errors = sum(report[0] for report in reports)
+            retries = sum(report[1]["retries"] for report in reports)
+            max_wait = max(report[1]["max_wait_seconds"] for report in reports)
+            print(f"  {label:<22} {elapsed:7.2f}s  failed={errors:<5} retries={retries:<5} "
+                  f"max lock wait={max_wait:.3f}s")
+
+
+def _lookup_then_write(db, record):
+    """The pre-upsert retry: find today's entry by name, then update it or add one"""
+    entry = next((entry for entry in db.search_by_name(record["name"]) if entry[1] == record["name"]), None)
+    fields = {column: record[column] for column in AMOUNT_COLUMNS}
+    if entry:
+        db.update_entry(entry[0], **fields)
+    else:
+        db.add_entry(record["name"], **fields)
+
+
+def bench_upsert(names=2000, runs=3):
+    """
+    Compare re-running an import: look up then write vs one upsert per row
+    """
+    rng = random.Random(42)
+    records = [dict({"name": f"Customer {i}"},
+                    **{column: round(rng.uniform(0, 10000), 2) for column in AMOUNT_COLUMNS})
+               for i in range(names)]
+    print(f"upsert: {names} names imported {runs} times")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, natural_key in (("lookup then write", False), ("upsert_entries", True)):
+            db = SettlementLedgerDB(os.path.join(tmp, f"upsert_{natural_key}.db"), natural_key=natural_key)
+            try:
+                start = time.perf_counter()
+                for _ in range(runs):
+                    if natural_key:
+                        db.upsert_entries(records)
+                    else:
+                        with db.transaction():
+                            for record in records:
+                                _lookup_then_write(db, record)
+                elapsed = time.perf_counter() - start
+                count = db.get_totals()["count"]
+                print(f"  {label:<24} {elapsed:8.3f}s  {count} entries")
+            finally:
+                db.close()
+
+
+def bench_working_set(rows=200000, searches=200, writes=500):
+    """
+    Compare an interactive session on the file against one on a 7-day working set
+    
+    The session searches by name and writes one entry per transaction, as
+    the GUI does. The working-set timing of the writes excludes the flush,
+    which is shown separately.
+    """
+    print(f"working_set: {rows} rows, {searches} searches, {writes} single-entry writes")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "working_set.db")
+        db = SettlementLedgerDB(path)
+        _seed_entries(db, rows)
+        # Most of the ledger is older than the working set
+        db.cursor.execute("UPDATE settlement_ledger SET created_at = datetime('now', '-30 days') "
+                          "WHERE id <= ?", (rows - rows // 20,))
+        db.conn.commit()
+        db.close()
+        
+        for label, days in (("file", None), ("working set (7 days)", 7)):
+            start = time.perf_counter()
+            db = SettlementLedgerDB(path, working_set_days=days)
+            opened = time.perf_counter() - start
+            try:
+                start = time.perf_counter()
+                for i in range(searches):
+                    db.search_by_name(f"Customer {i % 500}")
+                searched = time.perf_counter() - start
+                start = time.perf_counter()
+                for i in range(writes):
+                    db.add_entry(f"Walk-in {i}", float(i))
+                written = time.perf_counter() - start
+                start = time.perf_counter()
+                db.flush()
+                flushed = time.perf_counter() - start
+            finally:
+                db.close()
+            print(f"  {label:<22} open {opened:7.3f}s  search {searched:7.3f}s  "
+                  f"write {written:7.3f}s  flush {flushed:7.3f}s")
+
+
+BENCHMARKS = {
+    'update_entry': bench_update_entry,
+    'totals': bench_totals,
+    'report': bench_report,
+    'snapshot': bench_snapshot,
+    'lock_contention': bench_lock_contention,
+    'upsert': bench_upsert,
+    'working_set': bench_working_set,
+}
+
+
+def main(argv=None):
+    """Run the selected benchmarks (all by default)"""
+    parser = argparse.ArgumentParser(description="Daily Settlement Ledger benchmarks")
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
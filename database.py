@@ -2,49 +2,1259 @@
 Database module for Daily Settlement Ledger
 Handles all SQLite database operations
 """
+import logging
+import os
+import queue
+import random
 import sqlite3
-from typing import Optional, List, Tuple
-from datetime import datetime
+import threading
+import time as clock
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, Optional, List, Tuple, Union
+from datetime import date, datetime, time, timedelta, timezone
+
+from migrations import (Migration, MIGRATION_CHUNK_SIZE, chunk_progress, copy_in_chunks,
+                        finish_chunks, run_migrations)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Asia/Manila has no daylight saving time, so a fixed offset is exact
+MANILA_TZ = timezone(timedelta(hours=8), "Asia/Manila")
+
+# Timestamp format written by SQLite's CURRENT_TIMESTAMP (always UTC)
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+AMOUNT_COLUMNS = ("previous_balance", "previous_total", "seller_1", "seller_2",
+                  "seller_3", "seller_4", "today_total", "today_balance")
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+ENTRY_COLUMNS = ("id", "name") + AMOUNT_COLUMNS + TIMESTAMP_COLUMNS
+SORTABLE_COLUMNS = ENTRY_COLUMNS
+EDITABLE_COLUMNS = ("name",) + AMOUNT_COLUMNS
+SELLER_COLUMNS = ("seller_1", "seller_2", "seller_3", "seller_4")
+NAME_SUMMARY_AMOUNTS = ("seller_total", "today_total_sum", "last_today_total", "last_today_balance")
+
+# Money storage modes: REAL columns (the original schema) or exact integer centavos
+MONEY_REAL = "real"
+MONEY_CENTS = "cents"
+CENTS_PER_PESO = 100
+
+# Size of the per-connection prepared statement cache. sqlite3 defaults to 128,
+# fewer than the 512 possible update_entry statements plus the fixed queries
+DEFAULT_CACHED_STATEMENTS = 1024
+
+# Lock handling for several processes (CLI, GUI, server) sharing one file.
+# SQLite's busy handler waits up to DEFAULT_BUSY_TIMEOUT seconds for a lock;
+# if that still fails, beginning or committing a write is retried with
+# exponential backoff and full jitter, so colliding writers spread out.
+DEFAULT_BUSY_TIMEOUT = 5.0
+DEFAULT_LOCK_RETRIES = 4
+LOCK_RETRY_BASE_DELAY = 0.05
+LOCK_RETRY_MAX_DELAY = 2.0
+
+# Background maintenance (MaintenanceScheduler): a pass runs once no
+# connection has written for MAINTENANCE_IDLE_SECONDS, at most every
+# MAINTENANCE_INTERVAL seconds, and stops after MAINTENANCE_BUDGET seconds.
+# Maintenance gives up on a lock after MAINTENANCE_BUSY_TIMEOUT rather than
+# make a writer wait
+MAINTENANCE_IDLE_SECONDS = 30.0
+MAINTENANCE_INTERVAL = 6 * 3600.0
+MAINTENANCE_BUDGET = 0.5
+MAINTENANCE_POLL_SECONDS = 5.0
+MAINTENANCE_BUSY_TIMEOUT = 0.05
+# Rows ANALYZE samples per index (PRAGMA analysis_limit), and free pages
+# released per incremental vacuum step
+ANALYSIS_LIMIT = 1000
+VACUUM_PAGES_PER_STEP = 256
+# PRAGMA auto_vacuum value of incremental mode
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Settlement date of an entry: the Manila calendar day of created_at. The
+# optional natural key is a UNIQUE index on (name, this expression); upserts
+# must name the same expression as their conflict target
+SETTLEMENT_DATE_SQL = "date(created_at, '+8 hours')"
+NATURAL_KEY_INDEX = "idx_settlement_ledger_name_day"
+
+# Sync change tracking: the time of a change, with milliseconds, in UTC
+SYNC_CHANGED_AT_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Working-set mode: the last N days are copied into an in-memory database,
+# named so that other connections in this process can read it (memdb VFS).
+# Writes are queued and written through to the file in commit order, up to
+# WRITE_THROUGH_BATCH queued transactions per file transaction
+WORKING_SET_URI = "file:/settlement-ledger-{}?vfs=memdb"
+WRITE_THROUGH_BATCH = 64
+
+# Ids per statement for batch operations; stays below SQLite's default
+# 999 bound-parameter limit on older builds
+BATCH_CHUNK_SIZE = 500
+
+SELECT_ENTRIES = """
+    SELECT id, name, previous_balance, previous_total, seller_1, seller_2,
+           seller_3, seller_4, today_total, today_balance, created_at, updated_at
+    FROM settlement_ledger
+"""
+
+# Amounts left empty keep their stored value, so an upsert never wipes what
+# another write (e.g. close_day's carried balances) filled in
+UPSERT_ENTRY = f"""
+    INSERT INTO settlement_ledger (name, {", ".join(AMOUNT_COLUMNS)}, created_at, updated_at)
+    VALUES (?, {", ".join("?" * len(AMOUNT_COLUMNS))}, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+    ON CONFLICT (name, {SETTLEMENT_DATE_SQL}) DO UPDATE SET
+        {", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in AMOUNT_COLUMNS)},
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+DateLike = Union[date, datetime, str]
+
+
+def _parse_date_text(text: str) -> Union[date, datetime]:
+    """Parse "YYYY-MM-DD" to a date, or "YYYY-MM-DD HH:MM[:SS]" to a datetime"""
+    text = text.strip().replace("T", " ")
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M", SQLITE_TIMESTAMP_FORMAT):
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.date() if fmt == "%Y-%m-%d" else parsed
+    raise ValueError(f"Invalid date: {text!r} (expected YYYY-MM-DD or YYYY-MM-DD HH:MM)")
+
+
+def _to_utc_timestamp(value: DateLike, end: bool = False) -> str:
+    """
+    Convert a date boundary to a UTC timestamp string comparable with created_at/updated_at
+    
+    Dates (and "YYYY-MM-DD" strings) are Manila calendar days; an end boundary
+    moves to the start of the following day so whole days are included.
+    Naive datetimes are taken as Manila local time.
+    
+    Args:
+        value: A date, datetime or ISO formatted string
+        end: True if the value is the (exclusive) upper boundary of a range
+    
+    Returns:
+        A "YYYY-MM-DD HH:MM:SS" UTC timestamp string
+    """
+    if isinstance(value, str):
+        value = _parse_date_text(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end else value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=MANILA_TZ)
+    return value.astimezone(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+
+
+class LedgerQuery:
+    """
+    Composable filter over the settlement_ledger table
+    
+    Every method returns a new query, so a base filter can be shared and
+    extended. Predicates are compiled in a fixed column order, which keeps the
+    number of distinct SQL strings small enough for SQLite's statement cache.
+    """
+    
+    def __init__(self):
+        self._name = None
+        self._ranges = {}
+        self._nulls = {}
+        # Same default order as get_all_entries: most recently updated first
+        self._order = ("updated_at", True)
+    
+    def _copy(self) -> "LedgerQuery":
+        query = LedgerQuery()
+        query._name = self._name
+        query._ranges = dict(self._ranges)
+        query._nulls = dict(self._nulls)
+        query._order = self._order
+        return query
+    
+    def _with_range(self, column: str, low, high) -> "LedgerQuery":
+        query = self._copy()
+        if low is None and high is None:
+            query._ranges.pop(column, None)
+        else:
+            query._ranges[column] = (low, high)
+        return query
+    
+    def name_contains(self, text: Optional[str]) -> "LedgerQuery":
+        """Match names containing text (case-insensitive); None or "" removes the filter"""
+        query = self._copy()
+        query._name = text or None
+        return query
+    
+    def created_between(self, start: Optional[DateLike] = None,
+                        end: Optional[DateLike] = None) -> "LedgerQuery":
+        """
+        Match entries created in [start, end)
+        
+        Dates are Manila calendar days and an end date is inclusive of that day.
+        """
+        return self._with_range(
+            "created_at",
+            _to_utc_timestamp(start) if start is not None else None,
+            _to_utc_timestamp(end, end=True) if end is not None else None)
+    
+    def updated_between(self, start: Optional[DateLike] = None,
+                        end: Optional[DateLike] = None) -> "LedgerQuery":
+        """Match entries last updated in [start, end); see created_between"""
+        return self._with_range(
+            "updated_at",
+            _to_utc_timestamp(start) if start is not None else None,
+            _to_utc_timestamp(end, end=True) if end is not None else None)
+    
+    def created_on(self, day: DateLike) -> "LedgerQuery":
+        """Match entries created on a Manila calendar day"""
+        return self.created_between(day, day)
+    
+    def amount_between(self, column: str, minimum: Optional[float] = None,
+                       maximum: Optional[float] = None) -> "LedgerQuery":
+        """Match entries whose amount column lies within [minimum, maximum]"""
+        if column not in AMOUNT_COLUMNS:
+            raise ValueError(f"Unknown amount column: {column}")
+        return self._with_range(column, minimum, maximum)
+    
+    def is_null(self, column: str, null: bool = True) -> "LedgerQuery":
+        """Match entries where an amount column is NULL (or NOT NULL when null is False)"""
+        if column not in AMOUNT_COLUMNS:
+            raise ValueError(f"Unknown amount column: {column}")
+        query = self._copy()
+        query._nulls[column] = null
+        return query
+    
+    def not_null(self, column: str) -> "LedgerQuery":
+        """Match entries where an amount column has a value"""
+        return self.is_null(column, null=False)
+    
+    def order_by(self, column: str, descending: bool = False) -> "LedgerQuery":
+        """
+        Sort by a column; ties are broken by id so the order is total and stable
+        
+        Args:
+            column: One of SORTABLE_COLUMNS
+            descending: True for largest first (NULLs sort last), False for smallest first (NULLs first)
+        """
+        if column not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by column: {column}")
+        query = self._copy()
+        query._order = (column, descending)
+        return query
+    
+    @property
+    def ordering(self) -> Tuple[str, bool]:
+        """The (column, descending) sort order"""
+        return self._order
+    
+    def sort_key(self, entry: Tuple) -> Tuple:
+        """The keyset pagination key of a result row, to pass as `after` for the next page"""
+        return (entry[ENTRY_COLUMNS.index(self._order[0])], entry[0])
+    
+    def shape(self) -> Tuple:
+        """The parameter-independent structure of this query, used as the SQL cache key"""
+        shape = []
+        if self._name is not None:
+            shape.append(("name", "like"))
+        for column in TIMESTAMP_COLUMNS + AMOUNT_COLUMNS:
+            if column in self._ranges:
+                low, high = self._ranges[column]
+                shape.append((column, "range", low is not None, high is not None))
+            if column in self._nulls:
+                shape.append((column, "null", self._nulls[column]))
+        return tuple(shape)
+    
+    def parameters(self, amount_to_storage=None) -> List:
+        """
+        The parameters matching the placeholders of the compiled WHERE clause
+        
+        Args:
+            amount_to_storage: Optional function converting amount bounds to their stored form
+        """
+        params = []
+        if self._name is not None:
+            params.append(f"%{self._name}%")
+        for column in TIMESTAMP_COLUMNS + AMOUNT_COLUMNS:
+            if column in self._ranges:
+                convert = amount_to_storage if amount_to_storage and column in AMOUNT_COLUMNS else None
+                params.extend(convert(bound) if convert else bound
+                              for bound in self._ranges[column] if bound is not None)
+        return params
+    
+    def compile(self) -> Tuple[str, List]:
+        """
+        Compile the filter to a WHERE clause
+        
+        Returns:
+            A (where_clause, params) tuple; the clause is "" when there is no filter
+        """
+        conditions = _compile_conditions(self.shape())
+        return ("WHERE " + conditions if conditions else ""), self.parameters()
+
+
+@lru_cache(maxsize=256)
+def _compile_conditions(shape: Tuple) -> str:
+    """Build the AND-ed filter conditions for a query shape (cached per shape)"""
+    conditions = []
+    for predicate in shape:
+        column, kind = predicate[0], predicate[1]
+        if kind == "like":
+            conditions.append(f"{column} LIKE ?")
+        elif kind == "range":
+            has_low, has_high = predicate[2], predicate[3]
+            # Timestamps use half-open ranges so whole days never overlap
+            upper = "<" if column in TIMESTAMP_COLUMNS else "<="
+            if has_low:
+                conditions.append(f"{column} >= ?")
+            if has_high:
+                conditions.append(f"{column} {upper} ?")
+        elif kind == "null":
+            conditions.append(f"{column} IS NULL" if predicate[2] else f"{column} IS NOT NULL")
+    return " AND ".join(conditions)
+
+
+def _real_to_cents(amount: Optional[float]) -> Optional[int]:
+    """Round a peso amount to integer centavos, half up on its decimal text"""
+    if amount is None:
+        return None
+    # Go through the decimal text so 0.29 becomes 29, not 28.999...
+    cents = Decimal(repr(float(amount))) * CENTS_PER_PESO
+    return int(cents.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _register_functions(conn: sqlite3.Connection):
+    """Add the SQL functions the ledger's triggers call; every connection that writes entries needs them"""
+    # Used by the cents conversion, including the triggers that mirror
+    # writes into the new table while a conversion is in progress
+    conn.create_function("to_cents", 1, _real_to_cents)
+
+
+def _seller_sum_sql(prefix: str) -> str:
+    """SQL adding the four seller amounts of a row, treating NULL as zero"""
+    return " + ".join(f"COALESCE({prefix}{column}, 0)" for column in SELLER_COLUMNS)
+
+
+def _order_clause(column: str, descending: bool) -> str:
+    """ORDER BY terms for a sort column, with id as the tie-breaker"""
+    direction = "DESC" if descending else "ASC"
+    return f"id {direction}" if column == "id" else f"{column} {direction}, id {direction}"
+
+
+def _keyset_segments(column: str, descending: bool, after: Optional[Tuple]) -> List[Tuple[str, List, str]]:
+    """
+    Split a keyset page into index-friendly (condition, params, order) queries
+    
+    SQLite sorts NULLs first ascending and last descending. Rows with a value
+    and rows with NULL are read by separate queries so each one is a plain
+    range scan on the column's index instead of an OR that defeats it.
+    """
+    direction = "DESC" if descending else "ASC"
+    op = "<" if descending else ">"
+    if column == "id":
+        if after is None:
+            return [("", [], f"id {direction}")]
+        return [(f"id {op} ?", [after[1]], f"id {direction}")]
+    
+    def value_segment(continued: bool):
+        if not continued:
+            return (f"{column} IS NOT NULL", [], f"{column} {direction}, id {direction}")
+        value, last_id = after
+        return (f"{column} {op}= ? AND ({column} {op} ? OR id {op} ?)", [value, value, last_id],
+                f"{column} {direction}, id {direction}")
+    
+    def null_segment(continued: bool):
+        if not continued:
+            return (f"{column} IS NULL", [], f"id {direction}")
+        return (f"{column} IS NULL AND id {op} ?", [after[1]], f"id {direction}")
+    
+    if after is None:
+        segments = [value_segment(False), null_segment(False)]
+        return segments if descending else segments[::-1]
+    if after[0] is None:
+        return [null_segment(True)] if descending else [null_segment(True), value_segment(False)]
+    return [value_segment(True), null_segment(False)] if descending else [value_segment(True)]
 
 
 class SettlementLedgerDB:
     """Database handler for the Daily Settlement Ledger"""
     
-    def __init__(self, db_path: str = "settlement_ledger.db"):
+    def __init__(self, db_path: str = "settlement_ledger.db",
+                 cached_statements: int = DEFAULT_CACHED_STATEMENTS,
+                 money_storage: Optional[str] = None,
+                 check_same_thread: bool = True,
+                 migration_progress=None,
+                 seller_table: bool = False,
+                 natural_key: bool = False,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+                 lock_retries: int = DEFAULT_LOCK_RETRIES,
+                 working_set_days: Optional[int] = None):
         """
         Initialize the database connection
         
         Args:
             db_path: Path to the SQLite database file
+            cached_statements: Number of prepared statements kept per connection
+            money_storage: MONEY_REAL or MONEY_CENTS; None keeps the file's current mode
+                           (REAL for new files). MONEY_CENTS converts an existing REAL file.
+            check_same_thread: False lets the instance be handed between threads;
+                               callers must then ensure only one thread uses it at a time
+            migration_progress: Optional callback(description, done, total) for schema
+                                migrations and the cents conversion run while opening
+            seller_table: True adds the normalized settlement_seller table to the file
+                          (see enable_seller_table); False keeps the file's current setting
+            natural_key: True makes (name, settlement date) unique in the file
+                         (see enable_natural_key); False keeps the file's current setting
+            busy_timeout: Seconds SQLite waits for another connection's lock
+            lock_retries: Further attempts, with backoff, to begin or commit a write
+                          once busy_timeout has run out
+            working_set_days: Serve reads from an in-memory copy of the entries
+                              created in the last N PH days (see _load_working_set);
+                              None works on the file directly
         """
+        if money_storage not in (None, MONEY_REAL, MONEY_CENTS):
+            raise ValueError(f"Unknown money storage mode: {money_storage}")
         self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.check_same_thread = check_same_thread
+        self.busy_timeout = busy_timeout
+        self.lock_retries = lock_retries
+        self._lock_stats = {"writes": 0, "retries": 0, "failures": 0,
+                            "wait_seconds": 0.0, "max_wait_seconds": 0.0}
         self.conn = None
         self.cursor = None
-        self._initialize_database()
+        self._transaction_depth = 0
+        # PRAGMA schema_version when the settings below were last read (see _check_schema)
+        self._schema_cookie = None
+        self.money_storage = MONEY_REAL
+        self.seller_table = False
+        self.natural_key = False
+        self.sync_enabled = False
+        self.working_set_days = None
+        self.working_set_start = None
+        self.read_path = db_path
+        self._write_through = None
+        self._initialize_database(money_storage, migration_progress)
+        if seller_table and not self.seller_table:
+            self.enable_seller_table()
+        if natural_key and not self.natural_key:
+            self.enable_natural_key()
+        if working_set_days is not None:
+            self._load_working_set(working_set_days)
     
-    def _initialize_database(self):
-        """Initialize the database and create the table if it doesn't exist"""
-        self.conn = sqlite3.connect(self.db_path)
+    def _initialize_database(self, money_storage: Optional[str] = None, progress=None):
+        """Open the database and bring its schema up to date"""
+        # A "file:" URI is another instance's read_path (its working set)
+        self.conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                    cached_statements=self.cached_statements,
+                                    check_same_thread=self.check_same_thread,
+                                    uri=self.db_path.startswith("file:"))
         self.cursor = self.conn.cursor()
+        _register_functions(self.conn)
         
-        # Create the settlement_ledger table
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settlement_ledger (
+        # A new file is created directly in the requested mode, and with
+        # incremental auto-vacuum (only settable before the first table exists)
+        if self._table_exists("settlement_ledger"):
+            self.money_storage = self._detect_money_storage()
+        else:
+            self.money_storage = money_storage or MONEY_REAL
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        run_migrations(self, LEDGER_MIGRATIONS, progress)
+        self._read_schema_settings()
+        
+        if money_storage == MONEY_CENTS and self.money_storage == MONEY_REAL:
+            self.migrate_to_cents(progress)
+        elif money_storage == MONEY_REAL and self.money_storage == MONEY_CENTS:
+            raise ValueError("This ledger stores integer centavos and cannot be opened in REAL mode")
+    
+    def _table_exists(self, table: str) -> bool:
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return self.cursor.fetchone() is not None
+    
+    def _index_exists(self, index: str) -> bool:
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+        return self.cursor.fetchone() is not None
+    
+    def _read_schema_settings(self):
+        """Set seller_table, natural_key and sync_enabled from the schema"""
+        self.seller_table = self._table_exists("settlement_seller")
+        self.natural_key = self._index_exists(NATURAL_KEY_INDEX)
+        self.sync_enabled = self._table_exists("sync_row")
+        self._schema_cookie = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+    
+    def _check_schema(self):
+        """
+        Re-read the schema-dependent settings if another connection changed the schema
+        
+        Another program may have converted the file to cents or enabled a
+        feature since this connection read them; writing pesos into centavo
+        columns would be off by a factor of 100. PRAGMA schema_version changes
+        with every schema change, so the usual check is one cheap read.
+        Called at the start of every write transaction (under the write lock,
+        so the schema cannot change before the commit) and of the read methods
+        that convert amounts.
+        """
+        cookie = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+        if cookie != self._schema_cookie:
+            if self._table_exists("settlement_ledger"):
+                self.money_storage = self._detect_money_storage()
+            self._read_schema_settings()
+    
+    @property
+    def schema_version(self) -> int:
+        """The version of the last applied schema migration"""
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+    
+    def _create_ledger_table(self, table: str, money_storage: str):
+        """Create a ledger table with REAL or INTEGER (centavo) amount columns"""
+        amount_type = "INTEGER" if money_storage == MONEY_CENTS else "REAL"
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
-                previous_balance REAL,
-                previous_total REAL,
-                seller_1 REAL,
-                seller_2 REAL,
-                seller_3 REAL,
-                seller_4 REAL,
-                today_total REAL,
-                today_balance REAL,
+                previous_balance {amount_type},
+                previous_total {amount_type},
+                seller_1 {amount_type},
+                seller_2 {amount_type},
+                seller_3 {amount_type},
+                seller_4 {amount_type},
+                today_total {amount_type},
+                today_balance {amount_type},
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        self.conn.commit()
+    
+    def _detect_money_storage(self) -> str:
+        """Read the money storage mode from the declared type of the amount columns"""
+        self.cursor.execute("PRAGMA table_info(settlement_ledger)")
+        types = {row[1]: row[2].upper() for row in self.cursor.fetchall()}
+        return MONEY_CENTS if types.get("previous_balance") == "INTEGER" else MONEY_REAL
+    
+    def _create_indexes(self):
+        """Create the filter and sort indexes"""
+        # Indexes for date-range filters
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_settlement_ledger_created_at
+            ON settlement_ledger (created_at)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_settlement_ledger_updated_at
+            ON settlement_ledger (updated_at)
+        """)
+        
+        # Indexes for sorting; each implicitly ends in id, so ORDER BY column, id
+        # and keyset pagination are served straight from the index
+        for column in ("name",) + AMOUNT_COLUMNS:
+            self.cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_settlement_ledger_{column}
+                ON settlement_ledger ({column})
+            """)
+    
+    def _create_name_latest(self):
+        """
+        Create the per-name summary table and the triggers that maintain it
+        
+        name_latest holds, for every name, the latest entry id, the number of
+        entries, running totals and the latest balance. Triggers update it by
+        delta on every insert, update and delete, so reading it is a primary
+        key lookup. A new table is filled from the existing entries.
+        """
+        exists = self._table_exists("name_latest")
+        
+        amount_type = "INTEGER" if self.money_storage == MONEY_CENTS else "REAL"
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS name_latest (
+                name TEXT PRIMARY KEY,
+                latest_id INTEGER NOT NULL,
+                entry_count INTEGER NOT NULL,
+                seller_total {amount_type} NOT NULL,
+                today_total_sum {amount_type} NOT NULL,
+                last_today_total {amount_type},
+                last_today_balance {amount_type}
+            )
+        """)
+        if not exists:
+            self.cursor.execute(f"""
+                INSERT INTO name_latest
+                SELECT totals.name, totals.latest_id, totals.entry_count, totals.seller_total,
+                       totals.today_total_sum, latest.today_total, latest.today_balance
+                FROM (SELECT name, MAX(id) AS latest_id, COUNT(*) AS entry_count,
+                             SUM({_seller_sum_sql("")}) AS seller_total,
+                             SUM(COALESCE(today_total, 0)) AS today_total_sum
+                      FROM settlement_ledger GROUP BY name) AS totals
+                JOIN settlement_ledger AS latest ON latest.id = totals.latest_id
+            """)
+        
+        # A working set holds only recent entries; when none of a name's are
+        # left there, its latest-entry fields keep their values from the file
+        remove_old = f"""
+            UPDATE name_latest
+            SET entry_count = entry_count - 1,
+                seller_total = seller_total - ({_seller_sum_sql("OLD.")}),
+                today_total_sum = today_total_sum - COALESCE(OLD.today_total, 0)
+            WHERE name = OLD.name;
+            DELETE FROM name_latest WHERE name = OLD.name AND entry_count <= 0;
+            UPDATE name_latest
+            SET latest_id = (SELECT MAX(id) FROM settlement_ledger WHERE name = OLD.name),
+                last_today_total = (SELECT today_total FROM settlement_ledger
+                                    WHERE id = (SELECT MAX(id) FROM settlement_ledger WHERE name = OLD.name)),
+                last_today_balance = (SELECT today_balance FROM settlement_ledger
+                                      WHERE id = (SELECT MAX(id) FROM settlement_ledger WHERE name = OLD.name))
+            WHERE name = OLD.name AND latest_id = OLD.id
+              AND EXISTS (SELECT 1 FROM settlement_ledger WHERE name = OLD.name);
+        """
+        add_new = f"""
+            INSERT INTO name_latest (name, latest_id, entry_count, seller_total, today_total_sum,
+                                     last_today_total, last_today_balance)
+            VALUES (NEW.name, NEW.id, 1, {_seller_sum_sql("NEW.")}, COALESCE(NEW.today_total, 0),
+                    NEW.today_total, NEW.today_balance)
+            ON CONFLICT (name) DO UPDATE SET
+                entry_count = entry_count + 1,
+                seller_total = seller_total + excluded.seller_total,
+                today_total_sum = today_total_sum + excluded.today_total_sum,
+                last_today_total = CASE WHEN excluded.latest_id > latest_id
+                                        THEN excluded.last_today_total ELSE last_today_total END,
+                last_today_balance = CASE WHEN excluded.latest_id > latest_id
+                                          THEN excluded.last_today_balance ELSE last_today_balance END,
+                latest_id = MAX(latest_id, excluded.latest_id);
+        """
+        watched = ", ".join(EDITABLE_COLUMNS)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS name_latest_insert AFTER INSERT ON settlement_ledger
+            BEGIN {add_new} END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS name_latest_update AFTER UPDATE OF {watched} ON settlement_ledger
+            BEGIN {remove_old} {add_new} END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS name_latest_delete AFTER DELETE ON settlement_ledger
+            BEGIN {remove_old} END
+        """)
+    
+    def _create_seller_table(self):
+        """
+        Create the settlement_seller child table, its pivot view and the triggers
+        that mirror seller_1..seller_4 into it
+        
+        Sellers 1-4 stay in their settlement_ledger columns, which remain the
+        source of truth for the tuple-shaped API; the child table repeats them
+        as (entry_id, seller_no, amount) rows and also holds sellers 5 and up.
+        """
+        amount_type = "INTEGER" if self.money_storage == MONEY_CENTS else "REAL"
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS settlement_seller (
+                entry_id INTEGER NOT NULL,
+                seller_no INTEGER NOT NULL CHECK (seller_no >= 1),
+                amount {amount_type} NOT NULL,
+                PRIMARY KEY (entry_id, seller_no)
+            ) WITHOUT ROWID
+        """)
+        # Per-seller range scans: WHERE seller_no = ? AND amount BETWEEN ? AND ?
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_settlement_seller_amount
+            ON settlement_seller (seller_no, amount)
+        """)
+        pivot = ",\n".join(f"MAX(CASE WHEN seller_no = {n} THEN amount END) AS {column}"
+                            for n, column in enumerate(SELLER_COLUMNS, start=1))
+        # Rows are stored in (entry_id, seller_no) order, so the GROUP BY streams
+        self.cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS settlement_seller_pivot AS
+            SELECT entry_id, {pivot},
+                   COUNT(*) AS seller_count, SUM(amount) AS seller_total
+            FROM settlement_seller
+            GROUP BY entry_id
+        """)
+        
+        # An upsert rather than INSERT OR REPLACE: a trigger's OR REPLACE is
+        # overridden by the conflict handling of an outer upsert (upsert_entry)
+        def upsert(n, column):
+            return f"""
+                INSERT INTO settlement_seller (entry_id, seller_no, amount)
+                SELECT NEW.id, {n}, NEW.{column} WHERE NEW.{column} IS NOT NULL
+                ON CONFLICT (entry_id, seller_no) DO UPDATE SET amount = excluded.amount;"""
+        sellers = list(enumerate(SELLER_COLUMNS, start=1))
+        insert = "".join(upsert(n, column) for n, column in sellers)
+        update = "".join(f"""
+                DELETE FROM settlement_seller
+                WHERE entry_id = NEW.id AND seller_no = {n} AND NEW.{column} IS NULL;""" + upsert(n, column)
+                         for n, column in sellers)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS settlement_seller_insert AFTER INSERT ON settlement_ledger
+            BEGIN {insert} END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS settlement_seller_update
+            AFTER UPDATE OF {", ".join(SELLER_COLUMNS)} ON settlement_ledger
+            BEGIN {update} END
+        """)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS settlement_seller_delete AFTER DELETE ON settlement_ledger
+            BEGIN
+                DELETE FROM settlement_seller WHERE entry_id = OLD.id;
+            END
+        """)
+    
+    def _recreate_seller_triggers(self):
+        """Replace the seller table triggers of an existing file with the current ones"""
+        if not self._table_exists("settlement_seller"):
+            return
+        for trigger in ("settlement_seller_insert", "settlement_seller_update"):
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        self._create_seller_table()
+    
+    def enable_seller_table(self):
+        """
+        Switch the ledger to normalized seller storage
+        
+        Creates settlement_seller, fills it from the seller columns of the
+        existing entries and keeps it in sync from then on. The setting is
+        stored in the file. Afterwards per-seller queries use the
+        (seller_no, amount) index, and sellers beyond the fourth can be stored
+        with set_seller_amount.
+        """
+        self._require_file("enable_seller_table()")
+        if self._table_exists("settlement_seller"):
+            self.seller_table = True
+            return
+        with self.transaction():
+            self._create_seller_table()
+            for n, column in enumerate(SELLER_COLUMNS, start=1):
+                self.cursor.execute(f"""
+                    INSERT INTO settlement_seller (entry_id, seller_no, amount)
+                    SELECT id, {n}, {column} FROM settlement_ledger WHERE {column} IS NOT NULL
+                """)
+        self.seller_table = True
+    
+    def _create_natural_key_index(self):
+        self.cursor.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {NATURAL_KEY_INDEX}
+            ON settlement_ledger (name, {SETTLEMENT_DATE_SQL})
+        """)
+    
+    def enable_natural_key(self):
+        """
+        Allow at most one entry per name and Manila settlement date
+        
+        Creates a UNIQUE index on (name, date(created_at, '+8 hours')), which
+        upsert_entry and upsert_entries use as their conflict target. Plain
+        inserts of a second entry for the same name and day fail from then on.
+        The setting is stored in the file.
+        
+        Raises:
+            ValueError: If the ledger already holds such duplicates
+        """
+        self._require_file("enable_natural_key()")
+        if self._index_exists(NATURAL_KEY_INDEX):
+            self.natural_key = True
+            return
+        with self.transaction():
+            self.cursor.execute(f"""
+                SELECT COUNT(*) FROM (SELECT 1 FROM settlement_ledger
+                                      GROUP BY name, {SETTLEMENT_DATE_SQL} HAVING COUNT(*) > 1)
+            """)
+            duplicates = self.cursor.fetchone()[0]
+            if duplicates:
+                raise ValueError(f"Found {duplicates} names with more than one entry on the same day; "
+                                 f"merge or delete them before enabling the natural key")
+            self._create_natural_key_index()
+        self.natural_key = True
+    
+    def _create_sync_triggers(self):
+        """
+        Create the triggers that record every change to an entry in sync_row
+        
+        Each write stamps the entry's sync_row with this station as origin,
+        the time of the change and the next sequence number; a delete keeps
+        the row as a tombstone (entry_id NULL) so the delete can be sent on.
+        """
+        station = "(SELECT value FROM sync_meta WHERE key = 'station')"
+        next_seq = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM sync_row)"
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS sync_row_insert AFTER INSERT ON settlement_ledger
+            BEGIN
+                INSERT INTO sync_row (uid, entry_id, origin, changed_at, deleted, seq)
+                VALUES ({station} || ':' || NEW.id, NEW.id, {station}, {SYNC_CHANGED_AT_SQL}, 0, {next_seq});
+            END
+        """)
+        # Any column: set_seller_amount only touches updated_at when it changes
+        # seller 5 or up, and created_at may be corrected
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS sync_row_update AFTER UPDATE ON settlement_ledger
+            BEGIN
+                UPDATE sync_row SET origin = {station}, changed_at = {SYNC_CHANGED_AT_SQL}, seq = {next_seq}
+                WHERE entry_id = NEW.id;
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS sync_row_delete AFTER DELETE ON settlement_ledger
+            BEGIN
+                UPDATE sync_row SET entry_id = NULL, deleted = 1, origin = {station},
+                                    changed_at = {SYNC_CHANGED_AT_SQL}, seq = {next_seq}
+                WHERE entry_id = OLD.id;
+            END
+        """)
+    
+    def _create_sync_rejected(self):
+        """Create sync_rejected, which keeps received changes that could not be applied for a retry"""
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_rejected (
+                uid TEXT PRIMARY KEY,
+                origin TEXT NOT NULL,
+                changed_at TEXT NOT NULL,
+                change TEXT NOT NULL
+            )
+        """)
+    
+    def _upgrade_sync(self):
+        """Bring the sync objects of an existing file up to date"""
+        if not self._table_exists("sync_row"):
+            return
+        self.cursor.execute("DROP TRIGGER IF EXISTS sync_row_update")
+        self._create_sync_triggers()
+        self._create_sync_rejected()
+    
+    def enable_sync(self, station: Optional[str] = None):
+        """
+        Start tracking changes for sync with other stations (see sync.py)
+        
+        Creates sync_row, which gives every entry a global uid
+        ("<station>:<local id>") and records the origin, time and sequence
+        number of its latest change, and fills it for the existing entries.
+        Triggers keep it current from then on. The setting and the station
+        name are stored in the file.
+        
+        Args:
+            station: This station's name, unique among the synced stations
+                     (default: a random one); ignored if sync is already enabled
+        """
+        self._require_file("enable_sync()")
+        if self._table_exists("sync_row"):
+            self.sync_enabled = True
+            return
+        station = station or uuid.uuid4().hex
+        if ":" in station:
+            raise ValueError("A station name cannot contain ':'")
+        with self.transaction():
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_meta (
+                    key TEXT PRIMARY KEY,
+                    value NOT NULL
+                )
+            """)
+            self.cursor.execute("INSERT INTO sync_meta (key, value) VALUES ('station', ?)", (station,))
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_row (
+                    row_no INTEGER PRIMARY KEY,
+                    uid TEXT NOT NULL UNIQUE,
+                    entry_id INTEGER UNIQUE,
+                    origin TEXT NOT NULL,
+                    changed_at TEXT NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    seq INTEGER NOT NULL
+                )
+            """)
+            # Exports read the rows changed after a sequence number
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_row_seq ON sync_row (seq)")
+            # Per other station: the last sequence number received from it and
+            # the last one of ours exported for it
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_peer (
+                    station TEXT PRIMARY KEY,
+                    received_seq INTEGER NOT NULL DEFAULT 0,
+                    sent_seq INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._create_sync_rejected()
+            self.cursor.execute("""
+                INSERT INTO sync_row (uid, entry_id, origin, changed_at, deleted, seq)
+                SELECT ? || ':' || id, id, ?,
+                       strftime('%Y-%m-%d %H:%M:%f', COALESCE(updated_at, created_at)), 0, id
+                FROM settlement_ledger
+            """, (station, station))
+            self._create_sync_triggers()
+        self.sync_enabled = True
+    
+    @property
+    def sync_station(self) -> Optional[str]:
+        """This station's sync name, or None if sync is not enabled"""
+        if not self.sync_enabled:
+            return None
+        self.cursor.execute("SELECT value FROM sync_meta WHERE key = 'station'")
+        return self.cursor.fetchone()[0]
+    
+    def _require_file(self, operation: str):
+        if self.working_set_days is not None:
+            raise ValueError(f"{operation} needs the ledger file; open it without a working set")
+    
+    def _load_working_set(self, days: int):
+        """
+        Move this instance onto an in-memory copy of the last `days` PH days
+        
+        The file is copied with the backup API and the older entries are
+        dropped from the copy. name_latest keeps its whole-ledger values, so
+        balances and running totals stay right; lists, searches and history
+        see only the working set, and close_day refuses days before it.
+        Reads never touch the file again.
+        
+        Each committed transaction's changed rows are queued for WriteThrough,
+        which writes them to the file in commit order on its own thread, so a
+        write costs no more than an in-memory one. A crash loses only what is
+        still queued (see flush). Other programs' writes to the file are not
+        seen, and would collide with this instance's ids, so while a working
+        set is open it should be the only writer.
+        
+        read_path names the copy; other connections in this process (e.g. a
+        loader thread) can open SettlementLedgerDB(read_path) to read it.
+        """
+        if days < 1:
+            raise ValueError("working_set_days must be at least 1")
+        read_path = WORKING_SET_URI.format(uuid.uuid4().hex)
+        memory = sqlite3.connect(read_path, uri=True, timeout=self.busy_timeout,
+                                 cached_statements=self.cached_statements,
+                                 check_same_thread=self.check_same_thread)
+        try:
+            _register_functions(memory)
+            self.conn.backup(memory)
+        except BaseException:
+            memory.close()
+            raise
+        self.conn.close()
+        self.conn, self.cursor = memory, memory.cursor()
+        
+        first_day = datetime.now(MANILA_TZ).date() - timedelta(days=days - 1)
+        with self.transaction():
+            # Trim without the name_latest delete trigger, so the summaries keep
+            # counting the dropped entries; the triggers come back with the
+            # working-set guard (see _create_name_latest). Change tracking for
+            # sync belongs to the file and is not kept in the copy.
+            for trigger in ("name_latest_update", "name_latest_delete",
+                            "sync_row_insert", "sync_row_update", "sync_row_delete"):
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            for table in ("sync_row", "sync_peer", "sync_meta", "sync_rejected"):
+                self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            # So is an unfinished cents conversion: migrate_to_cents resumes it
+            # on the file, and the write-through keeps the file's copy current
+            for event in ("insert", "update", "delete"):
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS settlement_ledger_cents_{event}")
+            self.cursor.execute("DROP TABLE IF EXISTS settlement_ledger_cents")
+            # Dropping most of the rows is much faster without the indexes;
+            # they are rebuilt from the rows that remain
+            self.cursor.execute("""
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'index' AND tbl_name = 'settlement_ledger' AND sql IS NOT NULL
+            """)
+            indexes = self.cursor.fetchall()
+            for index, _ in indexes:
+                self.cursor.execute(f"DROP INDEX {index}")
+            self.cursor.execute("DELETE FROM settlement_ledger WHERE created_at < ?",
+                                (_to_utc_timestamp(first_day),))
+            for _, sql in indexes:
+                self.cursor.execute(sql)
+            self._create_name_latest()
+            self._create_write_log()
+        # Give the dropped rows' pages back
+        self.cursor.execute("VACUUM")
+        self.sync_enabled = False
+        self.working_set_days = days
+        self.working_set_start = first_day
+        self.read_path = read_path
+        self._write_through = WriteThrough(self.db_path, self.busy_timeout)
+        self._write_through.start()
+    
+    def _create_write_log(self):
+        """
+        Create the TEMP tables and triggers that note which rows a working-set
+        transaction changes; _take_writes reads them at commit
+        """
+        self.cursor.execute("""
+            CREATE TEMP TABLE write_log (
+                entry_id INTEGER PRIMARY KEY,
+                inserted INTEGER NOT NULL
+            )
+        """)
+        for event, row, inserted in (("INSERT", "NEW", 1), ("UPDATE", "NEW", 0), ("DELETE", "OLD", 0)):
+            self.cursor.execute(f"""
+                CREATE TEMP TRIGGER write_log_{event.lower()} AFTER {event} ON main.settlement_ledger
+                BEGIN
+                    INSERT OR IGNORE INTO write_log (entry_id, inserted) VALUES ({row}.id, {inserted});
+                END
+            """)
+        if not self.seller_table:
+            return
+        # Sellers 5 and up are written to settlement_seller directly
+        self.cursor.execute("""
+            CREATE TEMP TABLE write_log_seller (
+                entry_id INTEGER NOT NULL,
+                seller_no INTEGER NOT NULL,
+                PRIMARY KEY (entry_id, seller_no)
+            ) WITHOUT ROWID
+        """)
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            self.cursor.execute(f"""
+                CREATE TEMP TRIGGER write_log_seller_{event.lower()} AFTER {event} ON main.settlement_seller
+                BEGIN
+                    INSERT OR IGNORE INTO write_log_seller (entry_id, seller_no)
+                    VALUES ({row}.entry_id, {row}.seller_no);
+                END
+            """)
+    
+    def _take_writes(self) -> Optional[Tuple[List, List]]:
+        """
+        The rows changed by the transaction about to commit, in their final
+        form; clears the write log. None if nothing changed.
+        
+        Returns:
+            (entries, sellers): entries as (entry_id, inserted, row or None
+            if deleted) with the row in ENTRY_COLUMNS order, sellers as
+            (entry_id, seller_no, amount or None if removed)
+        """
+        # Its own cursor: callers read cursor.rowcount after the commit
+        cursor = self.conn.cursor()
+        columns = ", ".join(f"entry.{column}" for column in ENTRY_COLUMNS)
+        cursor.execute(f"""
+            SELECT log.entry_id, log.inserted, {columns}
+            FROM write_log AS log
+            LEFT JOIN settlement_ledger AS entry ON entry.id = log.entry_id
+            ORDER BY log.entry_id
+        """)
+        entries = [(row[0], row[1], row[2:] if row[2] is not None else None)
+                   for row in cursor.fetchall()]
+        sellers = []
+        if self.seller_table:
+            cursor.execute("""
+                SELECT log.entry_id, log.seller_no, seller.amount
+                FROM write_log_seller AS log
+                LEFT JOIN settlement_seller AS seller
+                       ON seller.entry_id = log.entry_id AND seller.seller_no = log.seller_no
+            """)
+            sellers = cursor.fetchall()
+            cursor.execute("DELETE FROM write_log_seller")
+        cursor.execute("DELETE FROM write_log")
+        return (entries, sellers) if entries or sellers else None
+    
+    def flush(self):
+        """
+        Wait until every committed write is in the file (working-set mode only;
+        otherwise writes are there already)
+        
+        Raises:
+            WriteThroughError: Writing to the file failed
+        """
+        if self._write_through:
+            self._write_through.flush()
+    
+    def migrate_to_cents(self, progress=None, chunk_size: int = MIGRATION_CHUNK_SIZE):
+        """
+        Convert a REAL ledger to exact integer centavo storage
+        
+        Rows are copied into a new table in chunks, each in its own short
+        transaction, while triggers mirror concurrent writes into it, so other
+        connections can keep writing. Connections opened before the swap see
+        the schema change at their next transaction or read (see
+        _check_schema) and switch to centavos. An interrupted conversion resumes from
+        the last copied chunk on the next call. The final swap runs in one
+        transaction. Amounts are rounded to the nearest centavo; ids,
+        timestamps and the AUTOINCREMENT counter are kept.
+        
+        Args:
+            progress: Optional callback(description, done, total)
+            chunk_size: Rows copied per transaction
+        """
+        self._require_file("migrate_to_cents()")
+        if self._detect_money_storage() == MONEY_CENTS:
+            self.money_storage = MONEY_CENTS
+            return
+        
+        # Convert with the same decimal rounding as _to_storage so migrated and
+        # newly written amounts agree (SQL ROUND(1.005 * 100) would give 100)
+        def converted(prefix):
+            amounts = [f"to_cents({prefix}{column})" for column in AMOUNT_COLUMNS]
+            return ", ".join([f"{prefix}id", f"{prefix}name"] + amounts +
+                             [f"{prefix}{column}" for column in TIMESTAMP_COLUMNS])
+        
+        mirrored = ", ".join(f"{column} = excluded.{column}" for column in ENTRY_COLUMNS[1:])
+        
+        task = "settlement_ledger_cents"
+        if chunk_progress(self.conn, task) is None:
+            with self.transaction():
+                self.cursor.execute("DROP TABLE IF EXISTS settlement_ledger_cents")
+                self._create_ledger_table("settlement_ledger_cents", MONEY_CENTS)
+                for event in ("INSERT", "UPDATE"):
+                    self.cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS settlement_ledger_cents_{event.lower()}
+                        AFTER {event} ON settlement_ledger
+                        BEGIN
+                            INSERT INTO settlement_ledger_cents VALUES ({converted("NEW.")})
+                            ON CONFLICT (id) DO UPDATE SET {mirrored};
+                        END
+                    """)
+                self.cursor.execute("""
+                    CREATE TRIGGER IF NOT EXISTS settlement_ledger_cents_delete
+                    AFTER DELETE ON settlement_ledger
+                    BEGIN
+                        DELETE FROM settlement_ledger_cents WHERE id = OLD.id;
+                    END
+                """)
+        copy_in_chunks(self.conn, task, "settlement_ledger", "settlement_ledger_cents", converted(""),
+                       chunk_size, progress, "Convert amounts to centavos")
+        
+        try:
+            with self.transaction():
+                self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'settlement_ledger'")
+                sequence = self.cursor.fetchone()
+                # Also drops the mirror triggers, the name_latest triggers and the indexes
+                self.cursor.execute("DROP TABLE settlement_ledger")
+                self.cursor.execute("ALTER TABLE settlement_ledger_cents RENAME TO settlement_ledger")
+                if sequence:
+                    self.cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'settlement_ledger'",
+                                        sequence)
+                finish_chunks(self.conn, task)
+                self._create_indexes()
+                if self.natural_key:
+                    self._create_natural_key_index()
+                if self.sync_enabled:
+                    self._create_sync_triggers()
+                # Running totals change scale too; rebuild them along with the triggers
+                # that went away with the old table
+                self.cursor.execute("DROP TABLE IF EXISTS name_latest")
+                self.money_storage = MONEY_CENTS
+                self._create_name_latest()
+                if self.seller_table:
+                    # Rebuild with INTEGER amounts, keeping sellers 5 and up
+                    self.cursor.execute("DROP VIEW settlement_seller_pivot")
+                    self.cursor.execute("DROP INDEX idx_settlement_seller_amount")
+                    self.cursor.execute("ALTER TABLE settlement_seller RENAME TO settlement_seller_real")
+                    self._create_seller_table()
+                    self.cursor.execute("""
+                        INSERT INTO settlement_seller (entry_id, seller_no, amount)
+                        SELECT entry_id, seller_no, to_cents(amount) FROM settlement_seller_real
+                    """)
+                    self.cursor.execute("DROP TABLE settlement_seller_real")
+        except BaseException:
+            self.money_storage = MONEY_REAL
+            raise
+    
+    def _to_storage(self, amount: Optional[float]):
+        """Convert an API amount to its stored form (centavos in cents mode)"""
+        if amount is None or self.money_storage == MONEY_REAL:
+            return amount
+        return _real_to_cents(amount)
+    
+    def _from_storage(self, amount) -> Optional[float]:
+        """Convert a stored amount back to pesos"""
+        if amount is None or self.money_storage == MONEY_REAL:
+            return amount
+        return amount / CENTS_PER_PESO
+    
+    def _entry_to_storage(self, values: Tuple) -> Tuple:
+        """Convert the amount values of an entry for storage"""
+        if self.money_storage == MONEY_REAL:
+            return values
+        return tuple(self._to_storage(value) for value in values)
+    
+    def _entry_from_storage(self, entry: Optional[Tuple]) -> Optional[Tuple]:
+        """Convert a stored entry row to the API form (amounts in pesos)"""
+        if entry is None or self.money_storage == MONEY_REAL:
+            return entry
+        return entry[:2] + tuple(None if value is None else value / CENTS_PER_PESO
+                                 for value in entry[2:10]) + entry[10:]
+    
+    def _entries_from_storage(self, entries: List[Tuple]) -> List[Tuple]:
+        """Convert stored entry rows to the API form"""
+        if self.money_storage == MONEY_REAL:
+            return entries
+        return [self._entry_from_storage(entry) for entry in entries]
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group several write operations into one transaction
+        
+        Writes inside the block are committed together when it exits, or rolled
+        back if it raises. Blocks may be nested; only the outermost one commits.
+        Amounts should be converted with _to_storage inside the block, once
+        _check_schema has confirmed the storage mode.
+        """
+        if self._transaction_depth == 0 and self._write_through:
+            # Stop accepting writes the file will not get
+            self._write_through.check()
+        if self._transaction_depth == 0 and not self.conn.in_transaction:
+            # Take the write lock up front: a deferred transaction that upgrades
+            # from reading to writing can fail without waiting. An explicit
+            # BEGIN also covers schema changes, which sqlite3 would autocommit.
+            self._retry_locked(lambda: self.conn.execute("BEGIN IMMEDIATE"))
+            try:
+                self._check_schema()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            try:
+                writes = self._take_writes() if self._write_through else None
+                self._retry_locked(self.conn.commit)
+            except BaseException:
+                self.conn.rollback()
+                raise
+            if writes:
+                self._write_through.put(writes)
+    
+    def _retry_locked(self, operation):
+        """
+        Run a lock-taking operation (BEGIN or COMMIT), retrying while the database is locked
+        
+        Each attempt already waits up to busy_timeout inside SQLite; between
+        attempts the delay doubles from LOCK_RETRY_BASE_DELAY up to
+        LOCK_RETRY_MAX_DELAY, with full jitter. The time spent is recorded in
+        lock_metrics().
+        """
+        stats = self._lock_stats
+        delay = LOCK_RETRY_BASE_DELAY
+        start = clock.perf_counter()
+        try:
+            for attempt in range(self.lock_retries + 1):
+                try:
+                    return operation()
+                except sqlite3.OperationalError as e:
+                    if "database is locked" not in str(e) or attempt == self.lock_retries:
+                        if "database is locked" in str(e):
+                            stats["failures"] += 1
+                        raise
+                stats["retries"] += 1
+                clock.sleep(random.uniform(0, delay))
+                delay = min(delay * 2, LOCK_RETRY_MAX_DELAY)
+        finally:
+            waited = clock.perf_counter() - start
+            stats["writes"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+    
+    def set_busy_timeout(self, seconds: float):
+        """Change how long SQLite waits for another connection's lock"""
+        self.cursor.execute(f"PRAGMA busy_timeout = {int(seconds * 1000)}")
+        self.busy_timeout = seconds
+    
+    def lock_metrics(self) -> dict:
+        """
+        Lock statistics for this connection's write transactions
+        
+        Returns:
+            A dict with the number of lock operations (writes: each BEGIN and
+            COMMIT), retries after a timed-out wait, failures that were given
+            up on, and the total and longest time spent waiting in seconds
+        """
+        return dict(self._lock_stats)
     
     def add_entry(self, name: str, previous_balance: Optional[float] = None,
                   previous_total: Optional[float] = None,
@@ -71,16 +1281,78 @@ class SettlementLedgerDB:
         Returns:
             The ID of the inserted entry
         """
-        self.cursor.execute("""
-            INSERT INTO settlement_ledger 
-            (name, previous_balance, previous_total, seller_1, seller_2, 
-             seller_3, seller_4, today_total, today_balance, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (name, previous_balance, previous_total, seller_1, seller_2,
-              seller_3, seller_4, today_total, today_balance))
-        self.conn.commit()
+        with self.transaction():
+            self.cursor.execute("""
+                INSERT INTO settlement_ledger 
+                (name, previous_balance, previous_total, seller_1, seller_2, 
+                 seller_3, seller_4, today_total, today_balance, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (name,) + self._entry_to_storage((previous_balance, previous_total, seller_1, seller_2,
+                                                    seller_3, seller_4, today_total, today_balance)))
         return self.cursor.lastrowid
     
+    def _require_natural_key(self):
+        if not self.natural_key:
+            raise ValueError("The natural key is not enabled for this ledger")
+    
+    def _upsert_values(self, name: str, day: Optional[DateLike], amounts: Tuple) -> Tuple:
+        created_at = _to_utc_timestamp(day) if day is not None else None
+        return (name,) + self._entry_to_storage(amounts) + (created_at,)
+    
+    def upsert_entry(self, name: str, day: Optional[DateLike] = None,
+                     previous_balance: Optional[float] = None,
+                     previous_total: Optional[float] = None,
+                     seller_1: Optional[float] = None,
+                     seller_2: Optional[float] = None,
+                     seller_3: Optional[float] = None,
+                     seller_4: Optional[float] = None,
+                     today_total: Optional[float] = None,
+                     today_balance: Optional[float] = None) -> int:
+        """
+        Add the entry for a name and settlement date, or update it if it exists
+        
+        One INSERT ... ON CONFLICT DO UPDATE statement, so repeating the call
+        (e.g. re-running an import) updates the same row instead of adding a
+        duplicate. Amounts given replace the stored ones; amounts left None
+        keep the stored value. Needs the natural key (see enable_natural_key).
+        
+        Args:
+            name: Name of the entry
+            day: Manila settlement date (default: today); a new entry is
+                 created at the start of that day
+            previous_balance ... today_balance: Amounts (nullable)
+        
+        Returns:
+            The ID of the inserted or updated entry
+        """
+        self._require_natural_key()
+        amounts = (previous_balance, previous_total, seller_1, seller_2,
+                   seller_3, seller_4, today_total, today_balance)
+        with self.transaction():
+            self.cursor.execute(UPSERT_ENTRY + " RETURNING id", self._upsert_values(name, day, amounts))
+            entry_id = self.cursor.fetchone()[0]
+        return entry_id
+    
+    def upsert_entries(self, entries: Iterable[dict]) -> int:
+        """
+        Upsert many entries in one transaction (see upsert_entry)
+        
+        Args:
+            entries: Dicts with a name, an optional "date" (settlement date)
+                     and any of the amount columns
+        
+        Returns:
+            The number of entries inserted or updated
+        """
+        self._require_natural_key()
+        rows = (self._upsert_values(entry["name"], entry.get("date"),
+                                    tuple(entry.get(column) for column in AMOUNT_COLUMNS))
+                for entry in entries)
+        with self.transaction():
+            self.cursor.executemany(UPSERT_ENTRY, rows)
+            count = self.cursor.rowcount
+        return count
+    
     def get_entry(self, entry_id: int) -> Optional[Tuple]:
         """
         Get a single entry by ID
@@ -91,13 +1363,14 @@ class SettlementLedgerDB:
         Returns:
             A tuple containing the entry data, or None if not found
         """
+        self._check_schema()
         self.cursor.execute("""
             SELECT id, name, previous_balance, previous_total, seller_1, seller_2,
                    seller_3, seller_4, today_total, today_balance, created_at, updated_at
             FROM settlement_ledger
             WHERE id = ?
         """, (entry_id,))
-        return self.cursor.fetchone()
+        return self._entry_from_storage(self.cursor.fetchone())
     
     def get_all_entries(self) -> List[Tuple]:
         """
@@ -106,13 +1379,14 @@ class SettlementLedgerDB:
         Returns:
             A list of tuples containing all entries
         """
+        self._check_schema()
         self.cursor.execute("""
             SELECT id, name, previous_balance, previous_total, seller_1, seller_2,
                    seller_3, seller_4, today_total, today_balance, created_at, updated_at
             FROM settlement_ledger
             ORDER BY updated_at DESC
         """)
-        return self.cursor.fetchall()
+        return self._entries_from_storage(self.cursor.fetchall())
     
     def update_entry(self, entry_id: int, name: Optional[str] = None,
                      previous_balance: Optional[float] = None,
@@ -141,47 +1415,22 @@ class SettlementLedgerDB:
         Returns:
             True if update was successful, False otherwise
         """
-        # Build dynamic update query based on provided fields
-        updates = []
-        params = []
+        values = (name, previous_balance, previous_total, seller_1, seller_2,
+                  seller_3, seller_4, today_total, today_balance)
         
-        if name is not None:
-            updates.append("name = ?")
-            params.append(name)
-        if previous_balance is not None:
-            updates.append("previous_balance = ?")
-            params.append(previous_balance)
-        if previous_total is not None:
-            updates.append("previous_total = ?")
-            params.append(previous_total)
-        if seller_1 is not None:
-            updates.append("seller_1 = ?")
-            params.append(seller_1)
-        if seller_2 is not None:
-            updates.append("seller_2 = ?")
-            params.append(seller_2)
-        if seller_3 is not None:
-            updates.append("seller_3 = ?")
-            params.append(seller_3)
-        if seller_4 is not None:
-            updates.append("seller_4 = ?")
-            params.append(seller_4)
-        if today_total is not None:
-            updates.append("today_total = ?")
-            params.append(today_total)
-        if today_balance is not None:
-            updates.append("today_balance = ?")
-            params.append(today_balance)
-        
-        if not updates:
+        # Only the given columns are assigned, so SQLite leaves the indexes of
+        # the others alone. Each combination of fields gives one SQL string,
+        # which the connection's statement cache prepares once
+        fields = [(column, value) for column, value in zip(EDITABLE_COLUMNS, values) if value is not None]
+        if not fields:
             return False
         
+        updates = [f"{column} = ?" for column, _ in fields]
         updates.append("updated_at = CURRENT_TIMESTAMP")
-        params.append(entry_id)
-        
-        query = f"UPDATE settlement_ledger SET {', '.join(updates)} WHERE id = ?"
-        self.cursor.execute(query, params)
-        self.conn.commit()
+        with self.transaction():
+            params = [value if column == "name" else self._to_storage(value) for column, value in fields]
+            params.append(entry_id)
+            self.cursor.execute(f"UPDATE settlement_ledger SET {', '.join(updates)} WHERE id = ?", params)
         return self.cursor.rowcount > 0
     
     def update_entry_complete(self, entry_id: int, name: str,
@@ -212,22 +1461,22 @@ class SettlementLedgerDB:
         Returns:
             True if update was successful, False otherwise
         """
-        self.cursor.execute("""
-            UPDATE settlement_ledger 
-            SET name = ?, 
-                previous_balance = ?,
-                previous_total = ?,
-                seller_1 = ?,
-                seller_2 = ?,
-                seller_3 = ?,
-                seller_4 = ?,
-                today_total = ?,
-                today_balance = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (name, previous_balance, previous_total, seller_1, seller_2,
-              seller_3, seller_4, today_total, today_balance, entry_id))
-        self.conn.commit()
+        with self.transaction():
+            self.cursor.execute("""
+                UPDATE settlement_ledger 
+                SET name = ?, 
+                    previous_balance = ?,
+                    previous_total = ?,
+                    seller_1 = ?,
+                    seller_2 = ?,
+                    seller_3 = ?,
+                    seller_4 = ?,
+                    today_total = ?,
+                    today_balance = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (name,) + self._entry_to_storage((previous_balance, previous_total, seller_1, seller_2,
+                                                    seller_3, seller_4, today_total, today_balance)) + (entry_id,))
         return self.cursor.rowcount > 0
     
     def delete_entry(self, entry_id: int) -> bool:
@@ -240,10 +1489,71 @@ class SettlementLedgerDB:
         Returns:
             True if deletion was successful, False otherwise
         """
-        self.cursor.execute("DELETE FROM settlement_ledger WHERE id = ?", (entry_id,))
-        self.conn.commit()
+        with self.transaction():
+            self.cursor.execute("DELETE FROM settlement_ledger WHERE id = ?", (entry_id,))
         return self.cursor.rowcount > 0
     
+    def delete_entries(self, entry_ids: Iterable[int]) -> int:
+        """
+        Delete many entries in one transaction
+        
+        Args:
+            entry_ids: The IDs of the entries to delete
+        
+        Returns:
+            The number of entries deleted
+        """
+        ids = list(dict.fromkeys(entry_ids))
+        deleted = 0
+        with self.transaction():
+            for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+                chunk = ids[start:start + BATCH_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                self.cursor.execute(f"DELETE FROM settlement_ledger WHERE id IN ({placeholders})", chunk)
+                deleted += self.cursor.rowcount
+        return deleted
+    
+    def update_entries(self, entry_ids: Iterable[int], **fields) -> int:
+        """
+        Set the same field values on many entries in one transaction
+        
+        Unlike update_entry, a field passed as None is cleared (set to NULL).
+        
+        Args:
+            entry_ids: The IDs of the entries to update
+            **fields: Column values to set (name or any amount column)
+        
+        Returns:
+            The number of entries updated
+        """
+        unknown = set(fields) - set(EDITABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if "name" in fields and not fields["name"]:
+            raise ValueError("Name cannot be empty")
+        if not fields:
+            return 0
+        
+        # Keep a fixed column order so repeated calls produce the same SQL
+        columns = [column for column in EDITABLE_COLUMNS if column in fields]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        
+        ids = list(dict.fromkeys(entry_ids))
+        updated = 0
+        with self.transaction():
+            values = [fields[column] if column == "name" else self._to_storage(fields[column])
+                      for column in columns]
+            for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+                chunk = ids[start:start + BATCH_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                self.cursor.execute(f"""
+                    UPDATE settlement_ledger
+                    SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN ({placeholders})
+                """, values + chunk)
+                updated += self.cursor.rowcount
+        return updated
+    
     def search_by_name(self, name: str) -> List[Tuple]:
         """
         Search for entries by name (case-insensitive partial match)
@@ -254,6 +1564,7 @@ class SettlementLedgerDB:
         Returns:
             A list of tuples containing matching entries
         """
+        self._check_schema()
         self.cursor.execute("""
             SELECT id, name, previous_balance, previous_total, seller_1, seller_2,
                    seller_3, seller_4, today_total, today_balance, created_at, updated_at
@@ -261,10 +1572,735 @@ class SettlementLedgerDB:
             WHERE name LIKE ?
             ORDER BY updated_at DESC
         """, (f"%{name}%",))
-        return self.cursor.fetchall()
+        return self._entries_from_storage(self.cursor.fetchall())
+    
+    def find_entries(self, query: Optional[LedgerQuery] = None,
+                     limit: Optional[int] = None,
+                     after: Optional[Tuple] = None) -> List[Tuple]:
+        """
+        Find entries matching a composable filter, in the query's sort order
+        
+        Args:
+            query: A LedgerQuery (None returns all entries)
+            limit: Maximum number of rows to return (None for no limit)
+            after: Sort key of the last row of the previous page (query.sort_key(row)),
+                   or None for the first page
+        
+        Returns:
+            A list of tuples containing matching entries
+        """
+        self._check_schema()
+        query = query or LedgerQuery()
+        column, descending = query.ordering
+        conditions = _compile_conditions(query.shape())
+        params = query.parameters(self._to_storage)
+        if after is not None and column in AMOUNT_COLUMNS:
+            after = (self._to_storage(after[0]), after[1])
+        
+        if limit is None and after is None:
+            where = f"WHERE {conditions}" if conditions else ""
+            self.cursor.execute(f"{SELECT_ENTRIES} {where} ORDER BY {_order_clause(column, descending)}",
+                                params)
+            return self._entries_from_storage(self.cursor.fetchall())
+        
+        entries = []
+        for segment, segment_params, order in _keyset_segments(column, descending, after):
+            where = " AND ".join(part for part in (conditions, segment) if part)
+            sql = f"{SELECT_ENTRIES} {'WHERE ' + where if where else ''} ORDER BY {order}"
+            if limit is None:
+                self.cursor.execute(sql, params + segment_params)
+            else:
+                self.cursor.execute(f"{sql} LIMIT ?", params + segment_params + [limit - len(entries)])
+            entries.extend(self.cursor.fetchall())
+            if limit is not None and len(entries) >= limit:
+                break
+        return self._entries_from_storage(entries)
+    
+    def iter_entries(self, query: Optional[LedgerQuery] = None,
+                     page_size: int = 1000) -> Iterator[Tuple]:
+        """
+        Iterate over matching entries page by page using keyset pagination
+        
+        Each page is an index range scan starting after the previous page's last
+        row, so the cost per page does not grow with the position in the result.
+        
+        Args:
+            query: A LedgerQuery (None iterates all entries)
+            page_size: Number of rows fetched per query
+        
+        Yields:
+            Entry tuples in the query's sort order
+        """
+        query = query or LedgerQuery()
+        after = None
+        while True:
+            page = self.find_entries(query, page_size, after)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = query.sort_key(page[-1])
+    
+    def get_name_summary(self, name: str) -> Optional[dict]:
+        """
+        Get the running summary for a name (exact match) from the name_latest index
+        
+        Args:
+            name: The entry name
+        
+        Returns:
+            A dict with name, latest_id, entry_count, seller_total, today_total_sum,
+            last_today_total and last_today_balance, or None if the name has no entries
+        """
+        self._check_schema()
+        self.cursor.execute("""
+            SELECT name, latest_id, entry_count, seller_total, today_total_sum,
+                   last_today_total, last_today_balance
+            FROM name_latest
+            WHERE name = ?
+        """, (name,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        summary = dict(zip(("name", "latest_id", "entry_count"), row[:3]))
+        for key, value in zip(NAME_SUMMARY_AMOUNTS, row[3:]):
+            summary[key] = self._from_storage(value)
+        return summary
+    
+    def get_current_balance(self, name: str) -> Optional[float]:
+        """
+        Get today's balance of the latest entry for a name (exact match)
+        
+        While that entry's today_balance is empty, e.g. right after close_day
+        carried the balance forward, its previous_balance is the balance.
+        
+        Returns:
+            The balance, or None if the name has no entries or both are empty
+        """
+        self._check_schema()
+        self.cursor.execute("""
+            SELECT COALESCE(summary.last_today_balance, latest.previous_balance)
+            FROM name_latest AS summary
+            LEFT JOIN settlement_ledger AS latest ON latest.id = summary.latest_id
+            WHERE summary.name = ?
+        """, (name,))
+        row = self.cursor.fetchone()
+        return self._from_storage(row[0]) if row else None
+    
+    def iter_names(self) -> Iterator[str]:
+        """
+        Yield every distinct name, in SQLite's (binary) order
+        
+        Reads the name_latest primary key index, which holds each name once,
+        instead of a DISTINCT over the whole ledger.
+        """
+        cursor = self.conn.execute("SELECT name FROM name_latest ORDER BY name")
+        try:
+            for (name,) in cursor:
+                yield name
+        finally:
+            cursor.close()
+    
+    def get_name_history(self, name: str, limit: Optional[int] = None) -> List[Tuple]:
+        """
+        Get the entries for a name (exact match), newest first, using the name index
+        
+        Args:
+            name: The entry name
+            limit: Maximum number of entries (None for all)
+        
+        Returns:
+            A list of tuples containing the entries
+        """
+        self._check_schema()
+        self.cursor.execute(f"""
+            {SELECT_ENTRIES}
+            WHERE name = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (name, -1 if limit is None else limit))
+        return self._entries_from_storage(self.cursor.fetchall())
+    
+    def close_day(self, day: Optional[DateLike] = None) -> int:
+        """
+        Open the next day's ledger from the latest entry per name on a Manila calendar day
+        
+        Every name with an entry on `day` gets one new entry created at the
+        start of the following day, with previous_balance and previous_total
+        taken from that name's latest entry's today_balance and today_total.
+        All rows are built by a single INSERT ... SELECT in one transaction.
+        Names that already have an entry on the following day are skipped, so
+        closing the same day again carries nothing forward twice.
+        
+        Args:
+            day: The day to close (default: today in Manila)
+        
+        Returns:
+            The number of entries carried forward
+        
+        Raises:
+            ValueError: day is before the working set (working-set mode)
+        """
+        if day is None:
+            day = datetime.now(MANILA_TZ).date()
+        elif isinstance(day, str):
+            day = _parse_date_text(day)
+        if isinstance(day, datetime):
+            day = day.date()
+        if self.working_set_start is not None and day < self.working_set_start:
+            raise ValueError(f"Closing {day.isoformat()} needs the ledger file; "
+                             f"the working set starts on {self.working_set_start.isoformat()}")
+        next_day = day + timedelta(days=1)
+        day_start, next_start, next_end = (_to_utc_timestamp(day), _to_utc_timestamp(next_day),
+                                           _to_utc_timestamp(next_day, end=True))
+        with self.transaction():
+            self.cursor.execute("""
+                INSERT INTO settlement_ledger
+                (name, previous_balance, previous_total, created_at, updated_at)
+                SELECT latest.name, latest.today_balance, latest.today_total, ?, CURRENT_TIMESTAMP
+                FROM settlement_ledger AS latest
+                WHERE latest.id IN (SELECT MAX(id) FROM settlement_ledger
+                                    WHERE created_at >= ? AND created_at < ?
+                                    GROUP BY name)
+                  AND NOT EXISTS (SELECT 1 FROM settlement_ledger AS opened
+                                  WHERE opened.name = latest.name
+                                    AND opened.created_at >= ? AND opened.created_at < ?)
+                ORDER BY latest.name
+            """, (next_start, day_start, next_start, next_start, next_end))
+        return self.cursor.rowcount
+    
+    def _require_seller_table(self):
+        if not self.seller_table:
+            raise ValueError("The seller table is not enabled for this ledger")
+    
+    def set_seller_amount(self, entry_id: int, seller_no: int, amount: Optional[float]) -> bool:
+        """
+        Set (or clear, with None) one seller's amount on an entry
+        
+        Sellers 1-4 are the seller_1..seller_4 columns. Sellers 5 and up are
+        only stored in the seller table, which must be enabled.
+        
+        Returns:
+            True if the entry exists, False otherwise
+        """
+        if seller_no < 1:
+            raise ValueError(f"Invalid seller number: {seller_no}")
+        if seller_no <= len(SELLER_COLUMNS):
+            return self.update_entries([entry_id], **{SELLER_COLUMNS[seller_no - 1]: amount}) > 0
+        
+        self._require_seller_table()
+        with self.transaction():
+            self.cursor.execute("UPDATE settlement_ledger SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                                (entry_id,))
+            if self.cursor.rowcount == 0:
+                return False
+            if amount is None:
+                self.cursor.execute("DELETE FROM settlement_seller WHERE entry_id = ? AND seller_no = ?",
+                                    (entry_id, seller_no))
+            else:
+                self.cursor.execute("""
+                    INSERT OR REPLACE INTO settlement_seller (entry_id, seller_no, amount)
+                    VALUES (?, ?, ?)
+                """, (entry_id, seller_no, self._to_storage(amount)))
+        return True
+    
+    def get_seller_amounts(self, entry_id: int) -> dict:
+        """
+        Get every seller amount of an entry from the seller table
+        
+        Returns:
+            A dict of seller number to amount (sellers without an amount are omitted)
+        """
+        self._check_schema()
+        self._require_seller_table()
+        self.cursor.execute("""
+            SELECT seller_no, amount FROM settlement_seller
+            WHERE entry_id = ?
+            ORDER BY seller_no
+        """, (entry_id,))
+        return {seller_no: self._from_storage(amount) for seller_no, amount in self.cursor.fetchall()}
+    
+    def find_by_seller(self, seller_no: int, minimum: Optional[float] = None,
+                       maximum: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple]:
+        """
+        Get the entries with an amount for a seller, smallest amount first
+        
+        Uses the (seller_no, amount) index of the seller table, so the range is
+        read directly instead of scanning a seller column.
+        
+        Args:
+            seller_no: The seller number (1 and up)
+            minimum: Smallest amount to include (None for no bound)
+            maximum: Largest amount to include (None for no bound)
+            limit: Maximum number of entries (None for all)
+        
+        Returns:
+            A list of tuples containing the entries
+        """
+        self._check_schema()
+        self._require_seller_table()
+        conditions = ["seller.seller_no = ?"]
+        params = [seller_no]
+        for bound, operator in ((minimum, ">="), (maximum, "<=")):
+            if bound is not None:
+                conditions.append(f"seller.amount {operator} ?")
+                params.append(self._to_storage(bound))
+        columns = ", ".join(f"entry.{column}" for column in ENTRY_COLUMNS)
+        self.cursor.execute(f"""
+            SELECT {columns}
+            FROM settlement_seller AS seller
+            JOIN settlement_ledger AS entry ON entry.id = seller.entry_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY seller.amount, seller.entry_id
+            LIMIT ?
+        """, params + [-1 if limit is None else limit])
+        return self._entries_from_storage(self.cursor.fetchall())
+    
+    def get_seller_totals(self) -> dict:
+        """
+        Sum the amounts of every seller, read from the seller table index
+        
+        Returns:
+            A dict of seller number to {"count": entries, "total": amount}
+        """
+        self._check_schema()
+        self._require_seller_table()
+        self.cursor.execute("""
+            SELECT seller_no, COUNT(*), SUM(amount)
+            FROM settlement_seller
+            GROUP BY seller_no
+            ORDER BY seller_no
+        """)
+        return {seller_no: {"count": count, "total": self._from_storage(total)}
+                for seller_no, count, total in self.cursor.fetchall()}
+    
+    def stream_entries(self, query: Optional[LedgerQuery] = None,
+                       batch_size: int = 1000) -> Iterator[Tuple]:
+        """
+        Stream matching entries from a single cursor in the query's sort order
+        
+        Rows are fetched batch_size at a time, so memory use stays constant for
+        any result size. The cursor is separate from self.cursor, but the caller
+        should not write to the ledger until the iteration is finished.
+        
+        Args:
+            query: A LedgerQuery (None streams all entries)
+            batch_size: Number of rows fetched from SQLite per batch
+        
+        Yields:
+            Entry tuples in the query's sort order
+        """
+        self._check_schema()
+        query = query or LedgerQuery()
+        column, descending = query.ordering
+        conditions = _compile_conditions(query.shape())
+        where = f"WHERE {conditions}" if conditions else ""
+        
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"{SELECT_ENTRIES} {where} ORDER BY {_order_clause(column, descending)}",
+                           query.parameters(self._to_storage))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from self._entries_from_storage(rows)
+        finally:
+            cursor.close()
+    
+    def get_totals(self, query: Optional[LedgerQuery] = None) -> dict:
+        """
+        Sum every amount column over the matching entries
+        
+        In cents mode the sums are exact integer SQL sums converted to pesos once.
+        
+        Args:
+            query: A LedgerQuery (None sums all entries)
+        
+        Returns:
+            A dict with "count" and the total of each amount column (None if all NULL)
+        """
+        self._check_schema()
+        query = query or LedgerQuery()
+        conditions = _compile_conditions(query.shape())
+        where = f"WHERE {conditions}" if conditions else ""
+        params = query.parameters(self._to_storage)
+        sums = ", ".join(f"SUM({column})" for column in AMOUNT_COLUMNS)
+        self.cursor.execute(f"SELECT COUNT(*), {sums} FROM settlement_ledger {where}", params)
+        row = self.cursor.fetchone()
+        totals = {"count": row[0]}
+        for column, total in zip(AMOUNT_COLUMNS, row[1:]):
+            totals[column] = self._from_storage(total)
+        return totals
+    
+    def vacuum(self):
+        """
+        Rebuild the database file, dropping all free pages and defragmenting it
+        
+        Also switches files created before incremental auto-vacuum to it, so
+        MaintenanceScheduler can release free pages from then on. VACUUM
+        holds an exclusive lock for the whole rebuild and needs free disk
+        space for a full copy, so this runs only when asked for.
+        
+        Returns:
+            A dict with the file size in bytes before and after
+        """
+        self._require_file("vacuum()")
+        if self._transaction_depth:
+            raise ValueError("vacuum() cannot run inside a transaction")
+        size_before = _database_size(self.db_path)
+        started = clock.monotonic()
+        self.conn.commit()
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._retry_locked(lambda: self.conn.execute("VACUUM"))
+        result = {"size_before": size_before, "size_after": _database_size(self.db_path)}
+        logger.info("Vacuum of %s: %d -> %d bytes in %.3fs", self.db_path, result["size_before"],
+                    result["size_after"], clock.monotonic() - started)
+        return result
     
     def close(self):
-        """Close the database connection"""
+        """Close the database connection (in working-set mode, once the queued writes are in the file)"""
+        if self._write_through:
+            self._write_through.stop()
+            self._write_through = None
         if self.conn:
             self.conn.close()
 
+
+# Schema history, applied in order by run_migrations and recorded in PRAGMA
+# user_version. Files created before versioning start at 0; their existing
+# objects are kept because each step only creates what is missing. Append
+# new steps here; never edit or renumber released ones.
+LEDGER_MIGRATIONS = (
+    Migration(1, "Create the settlement_ledger table",
+              lambda db: db._create_ledger_table("settlement_ledger", db.money_storage)),
+    Migration(2, "Add the filter and sort indexes",
+              lambda db: db._create_indexes()),
+    Migration(3, "Add the per-name running balance table",
+              lambda db: db._create_name_latest()),
+    Migration(4, "Let the seller table triggers run under upserts",
+              lambda db: db._recreate_seller_triggers()),
+    Migration(5, "Sync every entry change and keep rejected changes for a retry",
+              lambda db: db._upgrade_sync()),
+)
+
+
+def _database_size(db_path: str) -> int:
+    """Bytes used by the database file and its WAL, if any"""
+    return sum(os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path))
+
+
+def _pragma(conn: sqlite3.Connection, name: str):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def _maintenance_connection(db_path: str) -> sqlite3.Connection:
+    """A connection for maintenance work; it gives up on locks instead of waiting for writers"""
+    conn = sqlite3.connect(db_path, timeout=MAINTENANCE_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute(f"PRAGMA analysis_limit = {int(ANALYSIS_LIMIT)}")
+    return conn
+
+
+def _maintain(conn: sqlite3.Connection, db_path: str, budget: float,
+              should_stop: Optional[Callable[[], bool]] = None) -> dict:
+    """
+    One maintenance pass on conn within budget seconds; see run_maintenance
+    
+    A statement still running at the deadline (or once should_stop returns
+    True) is interrupted through the progress handler and rolled back.
+    """
+    started = clock.monotonic()
+    deadline = started + budget
+    
+    def out_of_time():
+        return clock.monotonic() >= deadline or bool(should_stop and should_stop())
+    
+    result = {"statistics": None, "checkpoint": None, "pages_freed": 0, "stopped": None,
+              "size_before": _database_size(db_path)}
+    conn.set_progress_handler(out_of_time, 1000)
+    try:
+        # Statistics for the query planner. A file that was never analyzed
+        # gets a full (sampled) ANALYZE; later passes let PRAGMA optimize
+        # re-analyze only the tables whose statistics are out of date
+        analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        if analyzed:
+            conn.execute("PRAGMA optimize")
+            result["statistics"] = "optimize"
+        else:
+            conn.execute("ANALYZE")
+            result["statistics"] = "analyze"
+        conn.commit()
+        
+        # PASSIVE copies what it can without waiting for readers or writers
+        if _pragma(conn, "journal_mode") == "wal" and not out_of_time():
+            _, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            result["checkpoint"] = {"log_frames": log_frames, "checkpointed": checkpointed}
+        
+        # Return free pages to the file system a few at a time, each step in
+        # its own short transaction so writers only ever wait for one step
+        if _pragma(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+            while not out_of_time():
+                free = _pragma(conn, "freelist_count")
+                if not free:
+                    break
+                # The pragma frees one page per step of the statement, and
+                # execute() steps only once; executescript() runs it to the end
+                conn.executescript(f"PRAGMA incremental_vacuum({min(free, VACUUM_PAGES_PER_STEP)});")
+                result["pages_freed"] += free - _pragma(conn, "freelist_count")
+    except sqlite3.OperationalError as e:
+        # Interrupted at the deadline, or another connection holds a lock:
+        # either way the database is busy enough to stop here
+        if conn.in_transaction:
+            conn.rollback()
+        result["stopped"] = str(e)
+    finally:
+        conn.set_progress_handler(None, 0)
+    
+    result["size_after"] = _database_size(db_path)
+    result["seconds"] = round(clock.monotonic() - started, 4)
+    logger.info("Maintenance of %s: statistics=%s, %d pages freed, %d -> %d bytes in %.3fs%s",
+                db_path, result["statistics"], result["pages_freed"], result["size_before"],
+                result["size_after"], result["seconds"],
+                f" (stopped: {result['stopped']})" if result["stopped"] else "")
+    return result
+
+
+def run_maintenance(db_path: str, budget: float = MAINTENANCE_BUDGET) -> dict:
+    """
+    Run one maintenance pass: update query planner statistics, checkpoint
+    the WAL (WAL mode only) and release free pages (incremental auto-vacuum only)
+    
+    Uses its own connection, which never waits long for another
+    connection's lock, and stops when budget seconds are used up.
+    
+    Args:
+        db_path: The database file
+        budget: Seconds the pass may take
+    
+    Returns:
+        A dict with the statistics command run ("analyze", "optimize" or
+        None), the checkpoint result, pages_freed, size_before/size_after in
+        bytes, seconds taken and, if the pass ended early, why (stopped)
+    """
+    conn = _maintenance_connection(db_path)
+    try:
+        return _maintain(conn, db_path, budget)
+    finally:
+        conn.close()
+
+
+class MaintenanceScheduler:
+    """
+    Runs run_maintenance passes on a background thread while the database is idle
+    
+    The thread polls PRAGMA data_version, which changes whenever any other
+    connection (in this process or another) commits. A pass starts only once
+    nothing has been written for idle_seconds, and at most once per interval.
+    Each pass is limited to budget seconds and gives up on locks at once, so
+    the GUI or a CLI writer never waits on it for long.
+    """
+    
+    def __init__(self, db_path: str, idle_seconds: float = MAINTENANCE_IDLE_SECONDS,
+                 interval: float = MAINTENANCE_INTERVAL, budget: float = MAINTENANCE_BUDGET,
+                 poll_seconds: float = MAINTENANCE_POLL_SECONDS):
+        self.db_path = db_path
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.budget = budget
+        self.poll_seconds = poll_seconds
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the background thread (once)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-maintenance", daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the thread, interrupting a pass in progress, and wait for it"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self):
+        try:
+            conn = _maintenance_connection(self.db_path)
+        except sqlite3.Error:
+            logger.exception("Maintenance disabled: cannot open %s", self.db_path)
+            return
+        try:
+            version = _pragma(conn, "data_version")
+            last_write = clock.monotonic()
+            last_pass = None
+            while not self._stop.wait(self.poll_seconds):
+                now = clock.monotonic()
+                current = _pragma(conn, "data_version")
+                if current != version:
+                    version, last_write = current, now
+                    continue
+                if now - last_write < self.idle_seconds:
+                    continue
+                if last_pass is not None and now - last_pass < self.interval:
+                    continue
+                self.last_result = _maintain(conn, self.db_path, self.budget, self._stop.is_set)
+                last_pass = clock.monotonic()
+                # This connection's own writes do not change its data_version
+                version = _pragma(conn, "data_version")
+        except sqlite3.Error:
+            logger.exception("Maintenance of %s stopped", self.db_path)
+        finally:
+            conn.close()
+
+
+class WriteThroughError(sqlite3.DatabaseError):
+    """A working set's changes could not be written to the database file"""
+
+
+class WriteThrough:
+    """
+    Writes a working set's committed changes to the database file on a background thread
+    
+    Jobs come from SettlementLedgerDB._take_writes, one per committed
+    transaction, and are written in the order they were queued. Whatever
+    has queued up meanwhile (up to WRITE_THROUGH_BATCH jobs) goes into one
+    file transaction, so a burst of small writes costs one disk sync. While
+    another connection holds the file's write lock the batch is retried
+    with backoff for as long as it takes. Any other failure stops the
+    writer; check() then raises it so no further writes are accepted.
+    """
+    
+    def __init__(self, db_path: str, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.error = None
+        self._jobs = queue.Queue()
+        self._thread = None
+    
+    def start(self):
+        """Start the background thread (once)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-write-through", daemon=True)
+            self._thread.start()
+    
+    def put(self, job: Tuple[List, List]):
+        self._jobs.put(job)
+    
+    @property
+    def pending(self) -> int:
+        """Jobs queued or being written"""
+        return self._jobs.unfinished_tasks
+    
+    def check(self):
+        """Raise WriteThroughError if writing to the file has failed"""
+        if self.error is not None:
+            raise WriteThroughError(f"Writing the working set to {self.db_path} failed: {self.error}")
+    
+    def flush(self):
+        """Wait until every queued job is written, then check()"""
+        self._jobs.join()
+        self.check()
+    
+    def stop(self):
+        """Write the jobs still queued, then stop the thread"""
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            _register_functions(conn)
+        except sqlite3.Error as e:
+            self.error = e
+            logger.error("Write-through disabled: cannot open %s: %s", self.db_path, e)
+        stopping = False
+        while not stopping:
+            jobs = [self._jobs.get()]
+            while jobs[-1] is not None and len(jobs) < WRITE_THROUGH_BATCH:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = jobs[-1] is None
+            batch = [job for job in jobs if job is not None]
+            try:
+                if batch and self.error is None:
+                    self._write(conn, batch)
+                elif batch:
+                    logger.error("Dropped %d queued writes to %s after an earlier failure",
+                                 len(batch), self.db_path)
+            except Exception as e:
+                self.error = e
+                logger.error("Writing the working set to %s failed: %s", self.db_path, e)
+            finally:
+                for _ in jobs:
+                    self._jobs.task_done()
+        if conn is not None:
+            conn.close()
+    
+    def _write(self, conn: sqlite3.Connection, batch: List):
+        """Write a batch of jobs in one transaction, waiting out other connections' locks"""
+        delay = LOCK_RETRY_BASE_DELAY
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for entries, sellers in batch:
+                    self._apply(conn, entries, sellers)
+                conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if "database is locked" not in str(e):
+                    raise
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            clock.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, LOCK_RETRY_MAX_DELAY)
+    
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, entries: List, sellers: List):
+        """
+        Bring the file's rows to the committed values of one transaction
+        
+        Rows go in by id, through the file's own triggers, so name_latest,
+        the seller table and sync tracking follow as for any other write.
+        A new entry is inserted rather than upserted: an id the file already
+        uses means another program wrote to it, and that must not be
+        overwritten.
+        """
+        insert = (f"INSERT INTO settlement_ledger ({', '.join(ENTRY_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * len(ENTRY_COLUMNS))})")
+        update = ("UPDATE settlement_ledger SET " +
+                  ", ".join(f"{column} = ?" for column in ENTRY_COLUMNS[1:]) + " WHERE id = ?")
+        conn.executemany("DELETE FROM settlement_ledger WHERE id = ?",
+                         [(entry_id,) for entry_id, _, row in entries if row is None])
+        writes = [(inserted, row) for _, inserted, row in entries if row is not None]
+        # Entries of one transaction can trade places in the natural key (the
+        # order they were written in is not kept), so a write that conflicts
+        # is tried again after the others
+        while writes:
+            conflicts = []
+            for inserted, row in writes:
+                try:
+                    if inserted or conn.execute(update, row[1:] + row[:1]).rowcount == 0:
+                        conn.execute(insert, row)
+                except sqlite3.IntegrityError as e:
+                    conflicts.append((inserted, row))
+                    error = e
+            if len(conflicts) == len(writes):
+                raise error
+            writes = conflicts
+        for entry_id, seller_no, amount in sellers:
+            if amount is None:
+                conn.execute("DELETE FROM settlement_seller WHERE entry_id = ? AND seller_no = ?",
+                             (entry_id, seller_no))
+            else:
+                conn.execute("INSERT OR REPLACE INTO settlement_seller (entry_id, seller_no, amount) "
+                             "VALUES (?, ?, ?)", (entry_id, seller_no, amount))
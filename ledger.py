@@ -2,8 +2,27 @@
 Daily Settlement Ledger - Main Application
 Provides a CLI interface for managing settlement ledger entries
 """
+import argparse
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
 import sys
-from database import SettlementLedgerDB
+from contextlib import contextmanager
+from itertools import chain, islice
+from database import (SettlementLedgerDB, LedgerQuery, AMOUNT_COLUMNS, EDITABLE_COLUMNS,
+                      ENTRY_COLUMNS, SORTABLE_COLUMNS, SELLER_COLUMNS, DEFAULT_BUSY_TIMEOUT,
+                      MAINTENANCE_BUDGET, run_maintenance)
+from migrations import MIGRATION_CHUNK_SIZE
+from reports import PARTITION_KINDS, REPORT_PAGE_ROWS, run_report, write_day_report
+from snapshot import backup_database, export_snapshot, import_snapshot
+from sync import (apply_changes, export_changes, mark_sent, read_changeset, rejected_changes,
+                  sent_token, sync_databases, write_changeset)
+
+OUTPUT_FORMATS = ('jsonl', 'csv', 'table')
+INPUT_FORMATS = ('jsonl', 'csv')
 
 
 def format_currency(value):
@@ -43,24 +62,117 @@ def display_entry(entry):
     print("="*60 + "\n")
 
 
-def display_all_entries(entries):
-    """Display all entries in a table format"""
-    if not entries:
-        print("\nNo entries found in the ledger.\n")
+# Table columns: (header, entry index, currency?)
+TABLE_COLUMNS = [
+    ('ID', 0, False),
+    ('Name', 1, False),
+    ('Prev Bal', 2, True),
+    ('Prev Total', 3, True),
+    ('S1', 4, True),
+    ('S2', 5, True),
+    ('S3', 6, True),
+    ('S4', 7, True),
+    ('Today Total', 8, True),
+    ('Today Bal', 9, True),
+]
+TABLE_SAMPLE_ROWS = 200     # rows used to size the columns
+TABLE_BLOCK_ROWS = 500      # rows written per stdout write
+TABLE_MAX_WIDTH = 40        # longer cells are cut with "..."
+
+
+def _table_cells(entry):
+    return [format_currency(entry[index]) if currency else str(entry[index])
+            for _, index, currency in TABLE_COLUMNS]
+
+
+def _table_line(cells, widths):
+    parts = []
+    for cell, width in zip(cells, widths):
+        if len(cell) > width:
+            cell = cell[:width - 3] + "..."
+        parts.append(f"{cell:<{width}}")
+    return " ".join(parts).rstrip()
+
+
+@contextmanager
+def open_pager(enabled=True):
+    """
+    Yield a stream that pages its output when stdout is a terminal
+    
+    Uses $PAGER, else "less" or "more"; falls back to stdout when paging is
+    disabled, stdout is redirected, or no pager can be started.
+    """
+    command = os.environ.get('PAGER') or ('less -FRSX' if shutil.which('less') else 'more')
+    if not enabled or not sys.stdout.isatty():
+        yield sys.stdout
+        return
+    try:
+        pager = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, universal_newlines=True)
+    except OSError:
+        yield sys.stdout
         return
+    try:
+        yield pager.stdin
+    except BrokenPipeError:
+        pass  # The user quit the pager early
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
+
+
+def display_all_entries(entries, stream=None, pager=False):
+    """
+    Display entries in a table format, streaming from any iterable of rows
     
-    print("\n" + "="*100)
-    print(f"{'ID':<5} {'Name':<20} {'Prev Bal':<12} {'Prev Total':<12} {'S1':<10} {'S2':<10} {'S3':<10} {'S4':<10} {'Today Total':<12} {'Today Bal':<12}")
-    print("-"*100)
+    Column widths come from the first TABLE_SAMPLE_ROWS rows, so output starts
+    before the rest has been read and memory use stays constant. Rows are
+    written in blocks of TABLE_BLOCK_ROWS lines.
     
-    for entry in entries:
-        entry_id, name, prev_bal, prev_total, seller1, seller2, seller3, seller4, today_total, today_bal, created_at, updated_at = entry
-        
-        print(f"{entry_id:<5} {name[:18]:<20} {format_currency(prev_bal):<12} {format_currency(prev_total):<12} "
-              f"{format_currency(seller1):<10} {format_currency(seller2):<10} {format_currency(seller3):<10} "
-              f"{format_currency(seller4):<10} {format_currency(today_total):<12} {format_currency(today_bal):<12}")
+    Returns:
+        The number of entries displayed
+    """
+    rows = iter(entries)
+    sample = [_table_cells(entry) for entry in islice(rows, TABLE_SAMPLE_ROWS)]
+    if not sample:
+        print("\nNo entries found in the ledger.\n", file=stream or sys.stdout)
+        return 0
+    
+    widths = [min(TABLE_MAX_WIDTH, max(len(header), *(len(cells[i]) for cells in sample)))
+              for i, (header, _, _) in enumerate(TABLE_COLUMNS)]
+    rows = chain(sample, (_table_cells(entry) for entry in rows))
+    if stream is not None:
+        return _write_table(stream, rows, widths)
+    
+    count = 0
+    with open_pager(pager) as out:
+        count = _write_table(out, rows, widths)
+    return count
+
+
+def _write_table(out, rows, widths):
+    """Write the table header and cell rows in blocks; returns the row count"""
+    rule_width = sum(widths) + len(widths) - 1
+    out.write("\n" + "=" * rule_width + "\n")
+    out.write(_table_line([header for header, _, _ in TABLE_COLUMNS], widths) + "\n")
+    out.write("-" * rule_width + "\n")
     
-    print("="*100 + "\n")
+    count = 0
+    block = []
+    for cells in rows:
+        block.append(_table_line(cells, widths))
+        count += 1
+        if len(block) >= TABLE_BLOCK_ROWS:
+            block.append("")
+            out.write("\n".join(block))
+            block = []
+    block.append("")
+    out.write("\n".join(block))
+    out.write("=" * rule_width + "\n\n")
+    out.flush()
+    return count
 
 
 def get_float_input(prompt, allow_empty=True):
@@ -172,10 +284,32 @@ def update_entry_menu(db):
         print("Please enter a valid ID number.")
 
 
+def parse_id_list(text):
+    """Parse "3", "1,2,5" or "10-20" (or a mix) into a list of IDs"""
+    ids = []
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            ids.extend(range(int(start), int(end) + 1))
+        else:
+            ids.append(int(part))
+    return ids
+
+
 def delete_entry_menu(db):
-    """Menu for deleting an entry"""
+    """Menu for deleting one or more entries"""
     try:
-        entry_id = int(input("\nEnter entry ID to delete: "))
+        entry_ids = parse_id_list(input("\nEnter entry ID(s) to delete (e.g. 5 or 1,2,10-20): "))
+        if not entry_ids:
+            print("Please enter a valid ID number.")
+            return
+        if len(entry_ids) > 1:
+            delete_entries_batch(db, entry_ids)
+            return
+        
+        entry_id = entry_ids[0]
         entry = db.get_entry(entry_id)
         if not entry:
             print("Entry not found!")
@@ -196,6 +330,16 @@ def delete_entry_menu(db):
         print("Please enter a valid ID number.")
 
 
+def delete_entries_batch(db, entry_ids):
+    """Confirm and delete several entries in one transaction"""
+    confirm = input(f"\nAre you sure you want to delete {len(entry_ids)} entries? (yes/no): ").strip().lower()
+    if confirm == 'yes':
+        deleted = db.delete_entries(entry_ids)
+        print(f"{deleted} entries deleted successfully!")
+    else:
+        print("Delete cancelled.")
+
+
 def search_entry_menu(db):
     """Menu for searching entries by name"""
     search_term = input("\nEnter name to search for: ").strip()
@@ -211,6 +355,47 @@ def search_entry_menu(db):
         print("\nNo matching entries found.")
 
 
+def filter_entries_menu(db):
+    """Menu for filtering entries by date range, amount range and empty fields"""
+    print("\n--- Filter Entries (press Enter to skip a filter) ---")
+    query = LedgerQuery()
+    try:
+        start = input("Created from (YYYY-MM-DD, PH time): ").strip()
+        end = input("Created to (YYYY-MM-DD, PH time): ").strip()
+        query = query.created_between(start or None, end or None)
+        
+        start = input("Updated from (YYYY-MM-DD, PH time): ").strip()
+        end = input("Updated to (YYYY-MM-DD, PH time): ").strip()
+        query = query.updated_between(start or None, end or None)
+    except ValueError as e:
+        print(f"Invalid date: {e}")
+        return
+    
+    print("\nAmount fields: " + ", ".join(AMOUNT_COLUMNS))
+    column = input("Amount field to filter on: ").strip()
+    if column:
+        if column not in AMOUNT_COLUMNS:
+            print("Unknown amount field.")
+            return
+        minimum = get_float_input("Minimum amount: ")
+        maximum = get_float_input("Maximum amount: ")
+        query = query.amount_between(column, minimum, maximum)
+    
+    column = input("Field that must be empty (NULL): ").strip()
+    if column:
+        if column not in AMOUNT_COLUMNS:
+            print("Unknown amount field.")
+            return
+        query = query.is_null(column)
+    
+    entries = db.find_entries(query)
+    if entries:
+        print(f"\nFound {len(entries)} matching entries:")
+        display_all_entries(entries)
+    else:
+        print("\nNo matching entries found.")
+
+
 def main_menu(db):
     """Display the main menu and handle user choices"""
     while True:
@@ -223,16 +408,16 @@ def main_menu(db):
         print("4. Update Entry")
         print("5. Delete Entry")
         print("6. Search Entries by Name")
-        print("7. Exit")
+        print("7. Filter Entries")
+        print("8. Exit")
         print("="*60)
         
-        choice = input("Select an option (1-7): ").strip()
+        choice = input("Select an option (1-8): ").strip()
         
         if choice == '1':
             add_entry_menu(db)
         elif choice == '2':
-            entries = db.get_all_entries()
-            display_all_entries(entries)
+            display_all_entries(db.stream_entries(), pager=True)
         elif choice == '3':
             view_entry_menu(db)
         elif choice == '4':
@@ -242,14 +427,734 @@ def main_menu(db):
         elif choice == '6':
             search_entry_menu(db)
         elif choice == '7':
+            filter_entries_menu(db)
+        elif choice == '8':
             print("\nThank you for using Daily Settlement Ledger!")
             break
         else:
-            print("\nInvalid option. Please select 1-7.")
+            print("\nInvalid option. Please select 1-8.")
+
+
+class CommandError(Exception):
+    """An error in a scripted command's arguments or input"""
+
+
+class RecordWriter:
+    """Write records to a stream as JSON lines or CSV rows, one at a time"""
+    
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self._csv = None
+    
+    def write(self, record):
+        if self.output_format == 'csv':
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.stream, fieldnames=list(record), lineterminator='\n')
+                self._csv.writeheader()
+            self._csv.writerow(record)
+        else:
+            self.stream.write(json.dumps(record) + '\n')
+
+
+def entry_to_record(entry):
+    """Convert an entry tuple to a dict keyed by column name"""
+    return dict(zip(ENTRY_COLUMNS, entry))
+
+
+def write_entries(entries, output_format, stream=None, pager=False):
+    """Write an iterable of entries as they arrive; returns the number written"""
+    if output_format == 'table':
+        return display_all_entries(entries, stream, pager)
+    
+    stream = stream or sys.stdout
+    writer = RecordWriter(stream, output_format)
+    count = 0
+    for entry in entries:
+        writer.write(entry_to_record(entry))
+        count += 1
+    return count
+
+
+def read_records(stream, input_format):
+    """Yield (line_number, record dict) from JSON lines or CSV with a header row"""
+    if input_format == 'csv':
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, {key.strip(): value for key, value in row.items() if key}
+        return
+    
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise CommandError(f"line {line_number}: invalid JSON ({e})")
+        if not isinstance(record, dict):
+            raise CommandError(f"line {line_number}: expected a JSON object")
+        yield line_number, record
+
+
+def record_fields(record, line_number):
+    """Extract editable fields from an input record; empty amounts become None"""
+    fields = {}
+    for column in EDITABLE_COLUMNS:
+        if column not in record:
+            continue
+        value = record[column]
+        if isinstance(value, str):
+            value = value.strip()
+        if column == 'name':
+            fields[column] = value
+        elif value is None or value == '':
+            fields[column] = None
+        else:
+            try:
+                fields[column] = float(value)
+            except (TypeError, ValueError):
+                raise CommandError(f"line {line_number}: {column} must be a number")
+    return fields
+
+
+def record_id(record, line_number):
+    """Extract the entry ID from an input record"""
+    try:
+        return int(record['id'])
+    except (KeyError, TypeError, ValueError):
+        raise CommandError(f"line {line_number}: a numeric id is required")
+
+
+def read_ids(stream, input_format):
+    """Yield entry IDs from stdin: bare numbers, JSON lines with an id, or CSV with an id column"""
+    if input_format == 'csv':
+        for line_number, record in read_records(stream, input_format):
+            yield record_id(record, line_number)
+        return
+    
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.isdigit():
+            yield int(line)
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise CommandError(f"line {line_number}: expected an ID or a JSON object")
+        yield record_id(record if isinstance(record, dict) else {}, line_number)
+
+
+def add_amount_arguments(parser):
+    """Add --previous-balance ... --today-balance options"""
+    for column in AMOUNT_COLUMNS:
+        parser.add_argument('--' + column.replace('_', '-'), dest=column, type=float, metavar='AMOUNT')
+
+
+def add_filter_arguments(parser):
+    """Add date, amount, empty-field, sort and limit options"""
+    parser.add_argument('--name', help="name contains text")
+    parser.add_argument('--created-from', metavar='DATE', help="created on/after (YYYY-MM-DD, PH time)")
+    parser.add_argument('--created-to', metavar='DATE', help="created on/before (YYYY-MM-DD, PH time)")
+    parser.add_argument('--updated-from', metavar='DATE', help="updated on/after (YYYY-MM-DD, PH time)")
+    parser.add_argument('--updated-to', metavar='DATE', help="updated on/before (YYYY-MM-DD, PH time)")
+    parser.add_argument('--min', nargs=2, action='append', default=[], metavar=('FIELD', 'AMOUNT'),
+                        help="amount field is at least AMOUNT")
+    parser.add_argument('--max', nargs=2, action='append', default=[], metavar=('FIELD', 'AMOUNT'),
+                        help="amount field is at most AMOUNT")
+    parser.add_argument('--null', action='append', default=[], choices=AMOUNT_COLUMNS, metavar='FIELD',
+                        help="amount field is empty")
+    parser.add_argument('--not-null', action='append', default=[], choices=AMOUNT_COLUMNS, metavar='FIELD',
+                        help="amount field has a value")
+    parser.add_argument('--sort', choices=SORTABLE_COLUMNS, metavar='COLUMN', help="sort column")
+    parser.add_argument('--desc', action='store_true', help="sort in descending order")
+    parser.add_argument('--limit', type=int, help="maximum number of entries")
+
+
+def build_query(args):
+    """Build a LedgerQuery from filter arguments"""
+    query = LedgerQuery().name_contains(args.name)
+    try:
+        query = query.created_between(args.created_from, args.created_to)
+        query = query.updated_between(args.updated_from, args.updated_to)
+        bounds = {}
+        for index, pairs in ((0, args.min), (1, args.max)):
+            for column, amount in pairs:
+                bounds.setdefault(column, [None, None])[index] = float(amount)
+        for column, (minimum, maximum) in bounds.items():
+            query = query.amount_between(column, minimum, maximum)
+    except ValueError as e:
+        raise CommandError(str(e))
+    for column in args.null:
+        query = query.is_null(column)
+    for column in args.not_null:
+        query = query.not_null(column)
+    if args.sort:
+        query = query.order_by(args.sort, args.desc)
+    return query
+
+
+def limited(entries, limit):
+    """Stop an entry iterator after limit entries (None for no limit)"""
+    if limit is None:
+        yield from entries
+        return
+    for count, entry in enumerate(entries):
+        if count >= limit:
+            return
+        yield entry
+
+
+def ids_argument(values):
+    """Parse ID arguments such as 5, 1,2 or 10-20"""
+    try:
+        return parse_id_list(','.join(values))
+    except ValueError:
+        raise CommandError(f"invalid ID list: {' '.join(values)}")
+
+
+def command_add(db, args):
+    writer = RecordWriter(sys.stdout, 'csv' if args.format == 'csv' else 'jsonl')
+    if args.upsert:
+        require_natural_key(db)
+    elif args.date:
+        raise CommandError("--date needs --upsert")
+    if not args.stdin:
+        if not args.name:
+            raise CommandError("add needs a NAME or --stdin")
+        fields = {column: getattr(args, column) for column in AMOUNT_COLUMNS}
+        if args.upsert:
+            writer.write({'id': upsert(db, args.name, args.date, fields), 'name': args.name})
+        else:
+            writer.write({'id': db.add_entry(args.name, **fields), 'name': args.name})
+        return 0
+    
+    with db.transaction():
+        for line_number, record in read_records(sys.stdin, args.input_format):
+            fields = record_fields(record, line_number)
+            if not fields.get('name'):
+                raise CommandError(f"line {line_number}: name is required")
+            if args.upsert:
+                name = fields.pop('name')
+                entry_id = upsert(db, name, record.get('date') or args.date, fields, line_number)
+            else:
+                name = fields['name']
+                entry_id = db.add_entry(**fields)
+            writer.write({'id': entry_id, 'name': name})
+    return 0
+
+
+def require_natural_key(db):
+    if not db.natural_key:
+        raise CommandError("the natural key is not enabled; run 'ledger.py migrate --natural-key' first")
+
+
+def upsert(db, name, day, fields, line_number=None):
+    """Upsert one entry, reporting a bad date as a command error"""
+    try:
+        return db.upsert_entry(name, day, **fields)
+    except ValueError as e:
+        raise CommandError(f"line {line_number}: {e}" if line_number else str(e))
+
+
+def command_get(db, args):
+    status = 0
+    found = []
+    for entry_id in ids_argument(args.ids):
+        entry = db.get_entry(entry_id)
+        if entry:
+            found.append(entry)
+        else:
+            print(f"Entry {entry_id} not found", file=sys.stderr)
+            status = 1
+    write_entries(found, args.format, pager=args.pager)
+    return status
+
+
+def command_list(db, args):
+    write_entries(limited(db.stream_entries(build_query(args)), args.limit), args.format, pager=args.pager)
+    return 0
 
 
-def main():
+def command_search(db, args):
+    query = build_query(args).name_contains(args.term)
+    write_entries(limited(db.stream_entries(query), args.limit), args.format, pager=args.pager)
+    return 0
+
+
+def command_update(db, args):
+    writer = RecordWriter(sys.stdout, 'csv' if args.format == 'csv' else 'jsonl')
+    if not args.stdin:
+        if args.id is None:
+            raise CommandError("update needs an ID or --stdin")
+        fields = {column: getattr(args, column) for column in EDITABLE_COLUMNS
+                  if getattr(args, column) is not None}
+        fields.update((column, None) for column in args.clear)
+        if not fields:
+            raise CommandError("nothing to update")
+        updated = db.update_entries([args.id], **fields) > 0
+        writer.write({'id': args.id, 'updated': updated})
+        return 0 if updated else 1
+    
+    # Fields present in a record are set exactly; null or "" clears an amount
+    with db.transaction():
+        for line_number, record in read_records(sys.stdin, args.input_format):
+            entry_id = record_id(record, line_number)
+            fields = record_fields(record, line_number)
+            if 'name' in fields and not fields['name']:
+                raise CommandError(f"line {line_number}: name cannot be empty")
+            updated = db.update_entries([entry_id], **fields) > 0 if fields else False
+            writer.write({'id': entry_id, 'updated': updated})
+    return 0
+
+
+def command_delete(db, args):
+    entry_ids = ids_argument(args.ids) if args.ids else []
+    if args.stdin:
+        entry_ids.extend(read_ids(sys.stdin, args.input_format))
+    if not entry_ids:
+        raise CommandError("delete needs IDs or --stdin")
+    deleted = db.delete_entries(entry_ids)
+    RecordWriter(sys.stdout, 'csv' if args.format == 'csv' else 'jsonl').write(
+        {'requested': len(set(entry_ids)), 'deleted': deleted})
+    return 0
+
+
+def command_stats(db, args):
+    totals = db.get_totals(build_query(args))
+    if args.format == 'table':
+        print(f"Entries: {totals['count']}")
+        for column in AMOUNT_COLUMNS:
+            print(f"{column}: {format_currency(totals[column])}")
+    else:
+        RecordWriter(sys.stdout, args.format).write(totals)
+    return 0
+
+
+def command_balance(db, args):
+    summary = db.get_name_summary(args.name)
+    if summary is None:
+        print(f"No entries for {args.name!r}", file=sys.stderr)
+        return 1
+    if args.format == 'table':
+        print(f"Name: {summary['name']}")
+        print(f"Entries: {summary['entry_count']} (latest ID {summary['latest_id']})")
+        print(f"Current Balance: {format_currency(db.get_current_balance(args.name))}")
+        print(f"Latest Today's Total: {format_currency(summary['last_today_total'])}")
+        print(f"Sum of Today's Totals: {format_currency(summary['today_total_sum'])}")
+        print(f"Sum of Seller Amounts: {format_currency(summary['seller_total'])}")
+    else:
+        RecordWriter(sys.stdout, args.format).write(summary)
+    return 0
+
+
+def command_history(db, args):
+    write_entries(db.get_name_history(args.name, args.limit), args.format, pager=args.pager)
+    return 0
+
+
+def command_close_day(db, args):
+    try:
+        carried = db.close_day(args.date)
+    except ValueError as e:
+        raise CommandError(str(e))
+    write_summary(args, {'date': args.date, 'carried_forward': carried})
+    return 0
+
+
+REPORT_TABLE_COLUMNS = ('seller_total', 'balance_delta', 'today_total', 'today_balance')
+
+
+def command_report(db, args):
+    try:
+        report = run_report(db, build_query(args), by=args.by, start=args.created_from, end=args.created_to,
+                            workers=args.workers, partitions=args.partitions)
+    except ValueError as e:
+        raise CommandError(str(e))
+    records = report['partitions'] + [report['total']]
+    if args.format == 'table':
+        header = f"{'Partition':<12} {'Entries':>9}" + ''.join(f" {column:>16}" for column in REPORT_TABLE_COLUMNS)
+        print(header)
+        print('-' * len(header))
+        for record in records:
+            if record is report['total']:
+                print('-' * len(header))
+            print(f"{record['partition']:<12} {record['count']:>9}"
+                  + ''.join(f" {format_currency(record[column]):>16}" for column in REPORT_TABLE_COLUMNS))
+    else:
+        writer = RecordWriter(sys.stdout, args.format)
+        for record in records:
+            writer.write(record)
+    return 0
+
+
+def command_day_report(db, args):
+    if not args.html and not args.csv:
+        raise CommandError("give --html PATH and/or --csv PATH")
+    query = LedgerQuery().name_contains(args.name)
+    try:
+        result = write_day_report(db, args.date, args.to, html_out=args.html, csv_out=args.csv,
+                                  query=query, page_rows=args.page_rows)
+    except (OSError, ValueError) as e:
+        raise CommandError(str(e))
+    write_summary(args, {'html': args.html, 'csv': args.csv, 'entries': result['entries'],
+                         'pages': result['pages'], **result['totals']})
+    return 0
+
+
+def write_summary(args, record):
+    """Write a one-record command summary (tables fall back to JSON lines)"""
+    RecordWriter(sys.stdout, 'csv' if args.format == 'csv' else 'jsonl').write(record)
+
+
+def command_export_snapshot(db, args):
+    write_summary(args, {'path': args.path, 'exported': export_snapshot(db, args.path)})
+    return 0
+
+
+def command_import_snapshot(db, args):
+    try:
+        imported = import_snapshot(db, args.path, replace=args.replace)
+    except (OSError, ValueError) as e:
+        raise CommandError(str(e))
+    write_summary(args, {'path': args.path, 'imported': imported})
+    return 0
+
+
+def command_backup(db, args):
+    try:
+        backup_database(db, args.path)
+    except sqlite3.Error as e:
+        raise CommandError(str(e))
+    write_summary(args, {'path': args.path, 'bytes': os.path.getsize(args.path)})
+    return 0
+
+
+def command_migrate(db, args):
+    if args.cents:
+        db.migrate_to_cents(print_migration_progress, args.chunk_size)
+    if args.seller_table:
+        db.enable_seller_table()
+    if args.natural_key:
+        try:
+            db.enable_natural_key()
+        except ValueError as e:
+            raise CommandError(str(e))
+    if args.sync:
+        try:
+            db.enable_sync(args.station)
+        except ValueError as e:
+            raise CommandError(str(e))
+    write_summary(args, {'schema_version': db.schema_version, 'money_storage': db.money_storage,
+                         'seller_table': db.seller_table, 'natural_key': db.natural_key,
+                         'sync_station': db.sync_station})
+    return 0
+
+
+def require_sync(db):
+    if not db.sync_enabled:
+        raise CommandError("sync is not enabled; run 'ledger.py migrate --sync' first")
+
+
+def command_sync_export(db, args):
+    require_sync(db)
+    since = args.since
+    if since is None:
+        since = sent_token(db, args.to) if args.to else 0
+    changeset = export_changes(db, since, exclude_origin=args.to)
+    try:
+        write_changeset(changeset, args.path)
+    except OSError as e:
+        raise CommandError(str(e))
+    if args.to:
+        mark_sent(db, args.to, changeset['until'])
+    write_summary(args, {'path': args.path, 'station': changeset['station'], 'since': since,
+                         'until': changeset['until'], 'changes': len(changeset['changes'])})
+    return 0
+
+
+def command_sync_apply(db, args):
+    require_sync(db)
+    try:
+        changeset = read_changeset(args.path)
+        counts = apply_changes(db, changeset)
+    except (OSError, ValueError) as e:
+        raise CommandError(str(e))
+    write_summary(args, {'path': args.path, 'station': changeset['station'], **counts,
+                         'pending_rejected': rejected_changes(db)})
+    return 0
+
+
+def command_sync(db, args):
+    require_sync(db)
+    if not os.path.exists(args.other):
+        raise CommandError(f"no such database: {args.other}")
+    other = SettlementLedgerDB(args.other, busy_timeout=args.busy_timeout)
+    try:
+        if not other.sync_enabled:
+            raise CommandError(f"sync is not enabled in {args.other}")
+        try:
+            result = sync_databases(db, other)
+        except ValueError as e:
+            raise CommandError(str(e))
+    finally:
+        other.close()
+    write_summary(args, {'other': args.other,
+                         **{f"sent_{key}": count for key, count in result['sent'].items()},
+                         **{f"received_{key}": count for key, count in result['received'].items()},
+                         'pending_rejected': rejected_changes(db)})
+    return 0
+
+
+def command_maintain(db, args):
+    if args.vacuum:
+        try:
+            result = db.vacuum()
+        except sqlite3.Error as e:
+            raise CommandError(str(e))
+    else:
+        result = run_maintenance(db.db_path, args.budget)
+    write_summary(args, result)
+    return 0
+
+
+def require_seller_table(db):
+    if not db.seller_table:
+        raise CommandError("the seller table is not enabled; run 'ledger.py migrate --seller-table' first")
+
+
+def command_sellers(db, args):
+    require_seller_table(db)
+    totals = db.get_seller_totals()
+    if args.format == 'table':
+        for seller_no, total in totals.items():
+            print(f"Seller {seller_no}: {total['count']} entries, {format_currency(total['total'])}")
+    else:
+        writer = RecordWriter(sys.stdout, args.format)
+        for seller_no, total in totals.items():
+            writer.write({'seller_no': seller_no, **total})
+    return 0
+
+
+def command_seller(db, args):
+    require_seller_table(db)
+    entries = db.find_by_seller(args.seller_no, args.min, args.max, args.limit)
+    write_entries(entries, args.format, pager=args.pager)
+    return 0
+
+
+def command_set_seller(db, args):
+    if args.seller_no > len(SELLER_COLUMNS):
+        require_seller_table(db)
+    try:
+        found = db.set_seller_amount(args.id, args.seller_no, args.amount)
+    except ValueError as e:
+        raise CommandError(str(e))
+    if not found:
+        raise CommandError(f"no entry with ID {args.id}")
+    write_summary(args, {'id': args.id, 'seller_no': args.seller_no, 'amount': args.amount})
+    return 0
+
+
+COMMANDS = {
+    'add': command_add,
+    'get': command_get,
+    'list': command_list,
+    'search': command_search,
+    'update': command_update,
+    'delete': command_delete,
+    'stats': command_stats,
+    'balance': command_balance,
+    'history': command_history,
+    'close-day': command_close_day,
+    'report': command_report,
+    'day-report': command_day_report,
+    'export-snapshot': command_export_snapshot,
+    'import-snapshot': command_import_snapshot,
+    'backup': command_backup,
+    'migrate': command_migrate,
+    'sync-export': command_sync_export,
+    'sync-apply': command_sync_apply,
+    'sync': command_sync,
+    'maintain': command_maintain,
+    'sellers': command_sellers,
+    'seller': command_seller,
+    'set-seller': command_set_seller,
+}
+
+
+def build_parser():
+    """Build the argument parser for non-interactive use"""
+    parser = argparse.ArgumentParser(
+        prog='ledger',
+        description="Daily Settlement Ledger. Run without arguments for the interactive menu.")
+    parser.add_argument('--db', default='settlement_ledger.db', help="database file (default: %(default)s)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='jsonl',
+                        help="output format (default: %(default)s)")
+    parser.add_argument('--pager', action='store_true',
+                        help="page table output through $PAGER, less or more when on a terminal")
+    parser.add_argument('--busy-timeout', type=float, default=DEFAULT_BUSY_TIMEOUT, metavar='SECONDS',
+                        help="wait this long for another program's write lock (default: %(default)s)")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+    
+    add_parser = subparsers.add_parser('add', help="add an entry, or many from stdin")
+    add_parser.add_argument('name', nargs='?')
+    add_amount_arguments(add_parser)
+    add_parser.add_argument('--upsert', action='store_true',
+                            help="update the name's entry for the day if there is one (needs the natural key)")
+    add_parser.add_argument('--date', help="PH settlement date for --upsert, YYYY-MM-DD (default: today); "
+                                           "stdin records may carry their own date")
+    
+    get_parser = subparsers.add_parser('get', help="show entries by ID")
+    get_parser.add_argument('ids', nargs='+', metavar='ID', help="IDs, lists or ranges (e.g. 5 1,2 10-20)")
+    
+    list_parser = subparsers.add_parser('list', help="stream entries, optionally filtered and sorted")
+    add_filter_arguments(list_parser)
+    
+    search_parser = subparsers.add_parser('search', help="stream entries whose name contains a term")
+    search_parser.add_argument('term')
+    add_filter_arguments(search_parser)
+    
+    update_parser = subparsers.add_parser('update', help="update an entry, or many from stdin")
+    update_parser.add_argument('id', nargs='?', type=int)
+    update_parser.add_argument('--name', dest='name')
+    add_amount_arguments(update_parser)
+    update_parser.add_argument('--clear', action='append', default=[], choices=AMOUNT_COLUMNS,
+                               metavar='FIELD', help="set an amount field to empty")
+    
+    delete_parser = subparsers.add_parser('delete', help="delete entries by ID, or IDs from stdin")
+    delete_parser.add_argument('ids', nargs='*', metavar='ID', help="IDs, lists or ranges (e.g. 5 1,2 10-20)")
+    
+    stats_parser = subparsers.add_parser('stats', help="entry count and amount totals")
+    add_filter_arguments(stats_parser)
+    
+    balance_parser = subparsers.add_parser('balance', help="current balance and running totals for a name")
+    balance_parser.add_argument('name', help="exact name")
+    
+    history_parser = subparsers.add_parser('history', help="entries for a name, newest first")
+    history_parser.add_argument('name', help="exact name")
+    history_parser.add_argument('--limit', type=int, help="maximum number of entries")
+    
+    close_day_parser = subparsers.add_parser(
+        'close-day', help="open the next day with each name's latest balance and total (safe to repeat)")
+    close_day_parser.add_argument('date', nargs='?', help="PH day to close, YYYY-MM-DD (default: today)")
+    
+    report_parser = subparsers.add_parser('report', help="per-day, per-month or per-id-range totals, computed in parallel")
+    report_parser.add_argument('--by', choices=PARTITION_KINDS, default='month',
+                               help="partition by PH day, PH month or id range (default: %(default)s)")
+    report_parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    report_parser.add_argument('--partitions', type=int, help="number of id ranges for --by id")
+    add_filter_arguments(report_parser)
+    
+    day_report_parser = subparsers.add_parser(
+        'day-report', help="print-ready end-of-day report (HTML and/or CSV) with page subtotals and totals")
+    day_report_parser.add_argument('date', nargs='?', help="PH day, YYYY-MM-DD (default: today)")
+    day_report_parser.add_argument('--to', metavar='DATE', help="last PH day for a multi-day report")
+    day_report_parser.add_argument('--name', help="only names containing this text")
+    day_report_parser.add_argument('--html', metavar='PATH', help="HTML file to write (open and print it)")
+    day_report_parser.add_argument('--csv', metavar='PATH', help="CSV file to write")
+    day_report_parser.add_argument('--page-rows', type=int, default=REPORT_PAGE_ROWS,
+                                   help="entries per page (default: %(default)s)")
+    
+    export_parser = subparsers.add_parser('export-snapshot', help="write a columnar binary snapshot of all entries")
+    export_parser.add_argument('path', help="snapshot file")
+    
+    import_parser = subparsers.add_parser('import-snapshot', help="load entries from a snapshot file")
+    import_parser.add_argument('path', help="snapshot file")
+    import_parser.add_argument('--replace', action='store_true', help="delete all existing entries first")
+    
+    backup_parser = subparsers.add_parser('backup', help="copy the database file while it is in use")
+    backup_parser.add_argument('path', help="destination database file")
+    
+    migrate_parser = subparsers.add_parser('migrate', help="bring the schema up to date (runs on every open)")
+    migrate_parser.add_argument('--cents', action='store_true',
+                                help="convert amounts to exact integer centavos; resumes if interrupted")
+    migrate_parser.add_argument('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE,
+                                help="rows copied per transaction (default: %(default)s)")
+    migrate_parser.add_argument('--seller-table', action='store_true',
+                                help="keep seller amounts in an indexed per-seller table (allows sellers 5+)")
+    migrate_parser.add_argument('--natural-key', action='store_true',
+                                help="allow one entry per name and PH day, enabling 'add --upsert'")
+    migrate_parser.add_argument('--sync', action='store_true',
+                                help="track changes for exchange with other stations (sync commands)")
+    migrate_parser.add_argument('--station', help="this station's name for --sync (default: random)")
+    
+    sync_export_parser = subparsers.add_parser(
+        'sync-export', help="write the entries changed since the last export to a changeset file")
+    sync_export_parser.add_argument('path', help="changeset file to create")
+    sync_export_parser.add_argument('--to', metavar='STATION',
+                                    help="receiving station: send only what was not exported for it before")
+    sync_export_parser.add_argument('--since', type=int, metavar='TOKEN',
+                                    help="send changes after this sync token instead (0 = everything)")
+    
+    sync_apply_parser = subparsers.add_parser('sync-apply', help="apply a changeset from another station (safe to repeat)")
+    sync_apply_parser.add_argument('path', help="changeset file")
+    
+    sync_parser = subparsers.add_parser('sync', help="exchange changes both ways with another station's database file")
+    sync_parser.add_argument('other', help="the other station's database file")
+    
+    maintain_parser = subparsers.add_parser(
+        'maintain', help="update query statistics and release free pages (the GUI and service do this when idle)")
+    maintain_parser.add_argument('--budget', type=float, default=MAINTENANCE_BUDGET, metavar='SECONDS',
+                                 help="stop after this long (default: %(default)s)")
+    maintain_parser.add_argument('--vacuum', action='store_true',
+                                 help="rebuild the whole file instead (blocks other programs while it runs)")
+    
+    subparsers.add_parser('sellers', help="entry count and total per seller (needs the seller table)")
+    
+    seller_parser = subparsers.add_parser('seller', help="entries with an amount for one seller, smallest first")
+    seller_parser.add_argument('seller_no', type=int, metavar='SELLER', help="seller number")
+    seller_parser.add_argument('--min', type=float, help="smallest amount")
+    seller_parser.add_argument('--max', type=float, help="largest amount")
+    seller_parser.add_argument('--limit', type=int, help="maximum number of entries")
+    
+    set_seller_parser = subparsers.add_parser('set-seller', help="set or clear one seller's amount on an entry")
+    set_seller_parser.add_argument('id', type=int, metavar='ID')
+    set_seller_parser.add_argument('seller_no', type=int, metavar='SELLER', help="seller number (5+ needs the seller table)")
+    set_seller_parser.add_argument('amount', type=float, nargs='?', help="amount (omit to clear)")
+    
+    for batch_parser in (add_parser, update_parser, delete_parser):
+        batch_parser.add_argument('--stdin', action='store_true',
+                                  help="read records from stdin, applied in one transaction")
+        batch_parser.add_argument('--input-format', choices=INPUT_FORMATS, default='jsonl',
+                                  help="stdin format: JSON lines or CSV with a header (default: %(default)s)")
+    return parser
+
+
+def print_migration_progress(description, done, total):
+    """Show schema migration progress on stderr"""
+    end = '\n' if done >= total else ''
+    print(f"\r{description}: {done}/{total}", end=end, file=sys.stderr, flush=True)
+
+
+def run_command(argv):
+    """Run one scripted command against a single database connection"""
+    args = build_parser().parse_args(argv)
+    # Schema upgrades can take a while on large files; show progress to people, not scripts
+    show_progress = args.command == 'migrate' or sys.stderr.isatty()
+    db = SettlementLedgerDB(args.db, migration_progress=print_migration_progress if show_progress else None,
+                            busy_timeout=args.busy_timeout)
+    try:
+        return COMMANDS[args.command](db, args)
+    except CommandError as e:
+        print(f"ledger {args.command}: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader (e.g. head) went away; stop quietly
+        sys.stderr.close()
+        return 0
+    finally:
+        db.close()
+
+
+def main(argv=None):
     """Main function to start the application"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_command(argv)
+    
     db = SettlementLedgerDB()
     
     try:
@@ -260,8 +1165,8 @@ def main():
         print(f"\nAn error occurred: {e}")
     finally:
         db.close()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
-
+    sys.exit(main())
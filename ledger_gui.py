@@ -6,19 +6,253 @@ Provides a graphical user interface for managing settlement ledger entries
 
 """
 
+import argparse
+import queue
+import string
+import threading
+import webbrowser
+from bisect import bisect_left, bisect_right
+from pathlib import Path
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from database import SettlementLedgerDB
-from typing import Optional
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from database import SettlementLedgerDB, LedgerQuery, MaintenanceScheduler
+from reports import write_day_report
+from typing import Callable, List, Optional
 from datetime import datetime
 import pytz
 
 
+# Background table loading: rows handed to the UI per event-loop tick, chunks
+# buffered between the loader thread and the UI (bounds memory if the UI
+# falls behind), and how often the UI checks for new chunks
+LOAD_CHUNK_ROWS = 500
+LOAD_QUEUE_CHUNKS = 8
+LOAD_POLL_MS = 15
+
+# Type-ahead search: result sets up to this many rows are kept in memory, so a
+# search term that extends the previous one is filtered without a query
+SEARCH_CACHE_MAX_ROWS = 50000
+
+# SQLite's LIKE ignores case for ASCII letters only
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class SearchCache:
+    """
+    The rows of the last completed load, narrowed in memory while the search term grows
+    
+    Every name containing "mar" also contains "ma", so the rows for a term
+    that extends the cached one are a subset of the cached rows, in the same
+    order. The cache only answers for the same filter, sort and database
+    state (source) it was filled from.
+    """
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.source = None
+        self.term = None
+        self.names = []
+        self.rows = []
+    
+    @staticmethod
+    def _fold(term):
+        # % and _ are LIKE wildcards in the query, so such terms are not plain substrings
+        if '%' in term or '_' in term:
+            return None
+        return term.translate(_ASCII_LOWER)
+    
+    def store(self, source, term, rows):
+        """Keep the rows of a completed load (too many rows clears the cache instead)"""
+        self.clear()
+        term = self._fold(term)
+        if term is None or len(rows) > SEARCH_CACHE_MAX_ROWS:
+            return
+        self.source, self.term, self.rows = source, term, rows
+        self.names = [row[2].translate(_ASCII_LOWER) for row in rows]
+    
+    def narrow(self, source, term):
+        """
+        Filter the cached rows down to a term extending the cached one
+        
+        Returns:
+            The matching Treeview rows, or None if the database has to be queried
+        """
+        term = self._fold(term)
+        if term is None or self.term is None or source != self.source or self.term not in term:
+            return None
+        if term != self.term:
+            kept = [i for i, name in enumerate(self.names) if term in name]
+            self.names = [self.names[i] for i in kept]
+            self.rows = [self.rows[i] for i in kept]
+            self.term = term
+        return self.rows
+
+
+# Name autocomplete: suggestions shown below the name field
+NAME_SUGGESTIONS = 8
+
+
+class NameIndex:
+    """
+    Sorted distinct names for prefix completion
+    
+    Names are kept in two parallel lists sorted by their case-folded form, so
+    the names starting with a prefix are one contiguous run found by binary
+    search; a lookup costs O(log n) plus the suggestions returned. Adding or
+    removing a name is a single list insert or delete.
+    """
+    
+    def __init__(self, names=()):
+        pairs = sorted((name.casefold(), name) for name in set(names))
+        self.keys = [key for key, _ in pairs]
+        self.names = [name for _, name in pairs]
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def _find(self, name):
+        """The position of name, or of where it would be inserted, and whether it is present"""
+        key = name.casefold()
+        low, high = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        # Names differing only in case share a key; keep those few in name order
+        position = bisect_left(self.names, name, low, high)
+        return key, position, position < high and self.names[position] == name
+    
+    def __contains__(self, name):
+        return self._find(name)[2]
+    
+    def add(self, name):
+        key, position, found = self._find(name)
+        if not found:
+            self.keys.insert(position, key)
+            self.names.insert(position, name)
+    
+    def discard(self, name):
+        _, position, found = self._find(name)
+        if found:
+            del self.keys[position]
+            del self.names[position]
+    
+    def complete(self, prefix: str, limit: int = NAME_SUGGESTIONS) -> List[str]:
+        """Up to limit names starting with prefix, ignoring case, in case-folded order"""
+        key = prefix.casefold()
+        position = bisect_left(self.keys, key)
+        matches = []
+        while position < len(self.keys) and len(matches) < limit and self.keys[position].startswith(key):
+            matches.append(self.names[position])
+            position += 1
+        return matches
+
+
+class AutocompleteEntry(ttk.Entry):
+    """
+    Entry that lists completions in a dropdown while typing
+    
+    Down/Up move through the suggestions, Enter or Tab takes the highlighted
+    one, Escape closes the list and a click picks one. While the list is
+    closed these keys keep their usual meaning, including bindings the
+    caller adds to the widget.
+    """
+    
+    def __init__(self, master, suggest: Callable[[str], List[str]], **kwargs):
+        super().__init__(master, **kwargs)
+        self.suggest = suggest
+        self.dropdown = None
+        self.listbox = None
+        
+        # Run before the widget's own bindings so a handled key can stop them
+        tag = f"Autocomplete{id(self)}"
+        self.bindtags((tag,) + self.bindtags())
+        self.bind_class(tag, '<KeyRelease>', self._on_key_release)
+        self.bind_class(tag, '<Down>', lambda e: self._move(1))
+        self.bind_class(tag, '<Up>', lambda e: self._move(-1))
+        self.bind_class(tag, '<Return>', lambda e: self._accept())
+        self.bind_class(tag, '<Tab>', lambda e: self._accept())
+        self.bind_class(tag, '<Escape>', lambda e: self._close())
+        self.bind_class(tag, '<FocusOut>', lambda e: self.after(150, self._hide))
+        self.bind('<Destroy>', lambda e: self._hide(), add='+')
+    
+    def _on_key_release(self, event):
+        if event.keysym in ('Down', 'Up', 'Return', 'Tab', 'Escape', 'KP_Enter'):
+            return
+        text = self.get()
+        matches = self.suggest(text) if text.strip() else []
+        if not matches or matches == [text]:
+            self._hide()
+        else:
+            self._show(matches)
+    
+    def _show(self, matches):
+        if self.dropdown is None:
+            self.dropdown = tk.Toplevel(self)
+            self.dropdown.overrideredirect(True)
+            self.listbox = tk.Listbox(self.dropdown, exportselection=False, takefocus=0,
+                                      activestyle='none')
+            self.listbox.pack(fill=tk.BOTH, expand=True)
+            # Handle the click here so the entry keeps the keyboard focus
+            self.listbox.bind('<ButtonPress-1>', self._on_click)
+        self.listbox.delete(0, tk.END)
+        for match in matches:
+            self.listbox.insert(tk.END, match)
+        self.listbox.configure(height=len(matches))
+        self.dropdown.geometry(f"{self.winfo_width()}x{self.listbox.winfo_reqheight()}"
+                               f"+{self.winfo_rootx()}+{self.winfo_rooty() + self.winfo_height()}")
+        self.dropdown.deiconify()
+        self.dropdown.lift()
+    
+    def _hide(self):
+        if self.dropdown is not None:
+            try:
+                self.dropdown.destroy()
+            except tk.TclError:
+                pass
+            self.dropdown = None
+            self.listbox = None
+    
+    def _move(self, step):
+        if self.listbox is None:
+            return None
+        current = self.listbox.curselection()
+        index = current[0] + step if current else (0 if step > 0 else self.listbox.size() - 1)
+        index = max(0, min(index, self.listbox.size() - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+    
+    def _accept(self):
+        if self.listbox is None or not self.listbox.curselection():
+            self._hide()
+            return None
+        self._set_text(self.listbox.get(self.listbox.curselection()[0]))
+        return "break"
+    
+    def _close(self):
+        if self.dropdown is None:
+            return None
+        self._hide()
+        return "break"
+    
+    def _on_click(self, event):
+        self._set_text(self.listbox.get(self.listbox.nearest(event.y)))
+        return "break"
+    
+    def _set_text(self, text):
+        self.delete(0, tk.END)
+        self.insert(0, text)
+        self.icursor(tk.END)
+        self._hide()
+
+
 class EntryDialog:
     """Dialog window for adding/editing entries"""
     
-    def __init__(self, parent, title: str, entry_data: Optional[dict] = None):
+    def __init__(self, parent, title: str, entry_data: Optional[dict] = None,
+                 suggest_names: Optional[Callable[[str], List[str]]] = None):
         self.result = None
+        self.suggest_names = suggest_names
         self.dialog = tk.Toplevel(parent)
         self.dialog.title(title)
         self.dialog.geometry("500x600")
@@ -51,7 +285,10 @@ class EntryDialog:
         
         # Name field (required)
         ttk.Label(main_frame, text="Name *:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        name_entry = ttk.Entry(main_frame, textvariable=self.name_var, width=40)
+        if self.suggest_names:
+            name_entry = AutocompleteEntry(main_frame, self.suggest_names, textvariable=self.name_var, width=40)
+        else:
+            name_entry = ttk.Entry(main_frame, textvariable=self.name_var, width=40)
         name_entry.grid(row=0, column=1, sticky=tk.EW, pady=5, padx=5)
         
         # Previous Settlement section
@@ -145,16 +382,246 @@ class EntryDialog:
         return self.result
 
 
+class FilterDialog:
+    """Dialog window for building a date/amount/empty-field filter"""
+    
+    # Amount fields offered in the filter, as (label, database field)
+    AMOUNT_FIELDS = [
+        ('Prev Balance', 'previous_balance'),
+        ('Prev Total', 'previous_total'),
+        ('Seller 1', 'seller_1'),
+        ('Seller 2', 'seller_2'),
+        ('Seller 3', 'seller_3'),
+        ('Seller 4', 'seller_4'),
+        ('Today Total', 'today_total'),
+        ('Today Balance', 'today_balance'),
+    ]
+    NULL_CHOICES = ['(any)', 'is empty', 'is not empty']
+    
+    def __init__(self, parent, filter_values: Optional[dict] = None):
+        self.result = None
+        values = filter_values or {}
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Filter Entries")
+        self.dialog.geometry("420x420")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        
+        # Center the dialog
+        self.dialog.update_idletasks()
+        x = (self.dialog.winfo_screenwidth() // 2) - (420 // 2)
+        y = (self.dialog.winfo_screenheight() // 2) - (420 // 2)
+        self.dialog.geometry(f"420x420+{x}+{y}")
+        
+        self.created_from_var = tk.StringVar(value=values.get('created_from', ''))
+        self.created_to_var = tk.StringVar(value=values.get('created_to', ''))
+        self.updated_from_var = tk.StringVar(value=values.get('updated_from', ''))
+        self.updated_to_var = tk.StringVar(value=values.get('updated_to', ''))
+        self.amount_field_var = tk.StringVar(value=values.get('amount_field', self.AMOUNT_FIELDS[0][0]))
+        self.amount_min_var = tk.StringVar(value=values.get('amount_min', ''))
+        self.amount_max_var = tk.StringVar(value=values.get('amount_max', ''))
+        self.null_field_var = tk.StringVar(value=values.get('null_field', self.AMOUNT_FIELDS[0][0]))
+        self.null_choice_var = tk.StringVar(value=values.get('null_choice', self.NULL_CHOICES[0]))
+        
+        self._create_widgets()
+    
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self.dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Date ranges (PH time, inclusive days)
+        date_frame = ttk.LabelFrame(main_frame, text="Dates (YYYY-MM-DD, PH time)", padding="5")
+        date_frame.grid(row=0, column=0, sticky=tk.EW, pady=5)
+        
+        ttk.Label(date_frame, text="Created from:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(date_frame, textvariable=self.created_from_var, width=12).grid(row=0, column=1, pady=3, padx=5)
+        ttk.Label(date_frame, text="to:").grid(row=0, column=2, sticky=tk.W, pady=3)
+        ttk.Entry(date_frame, textvariable=self.created_to_var, width=12).grid(row=0, column=3, pady=3, padx=5)
+        
+        ttk.Label(date_frame, text="Updated from:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(date_frame, textvariable=self.updated_from_var, width=12).grid(row=1, column=1, pady=3, padx=5)
+        ttk.Label(date_frame, text="to:").grid(row=1, column=2, sticky=tk.W, pady=3)
+        ttk.Entry(date_frame, textvariable=self.updated_to_var, width=12).grid(row=1, column=3, pady=3, padx=5)
+        
+        labels = [label for label, _ in self.AMOUNT_FIELDS]
+        
+        # Amount range
+        amount_frame = ttk.LabelFrame(main_frame, text="Amount Range", padding="5")
+        amount_frame.grid(row=1, column=0, sticky=tk.EW, pady=5)
+        
+        ttk.Label(amount_frame, text="Field:").grid(row=0, column=0, sticky=tk.W, pady=3)
+        ttk.Combobox(amount_frame, textvariable=self.amount_field_var, values=labels,
+                     state='readonly', width=15).grid(row=0, column=1, sticky=tk.W, pady=3, padx=5)
+        ttk.Label(amount_frame, text="Minimum:").grid(row=1, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(amount_frame, textvariable=self.amount_min_var, width=15).grid(row=1, column=1, sticky=tk.W, pady=3, padx=5)
+        ttk.Label(amount_frame, text="Maximum:").grid(row=2, column=0, sticky=tk.W, pady=3)
+        ttk.Entry(amount_frame, textvariable=self.amount_max_var, width=15).grid(row=2, column=1, sticky=tk.W, pady=3, padx=5)
+        
+        # Empty (NULL) check
+        null_frame = ttk.LabelFrame(main_frame, text="Empty Fields", padding="5")
+        null_frame.grid(row=2, column=0, sticky=tk.EW, pady=5)
+        
+        ttk.Combobox(null_frame, textvariable=self.null_field_var, values=labels,
+                     state='readonly', width=15).grid(row=0, column=0, sticky=tk.W, pady=3, padx=5)
+        ttk.Combobox(null_frame, textvariable=self.null_choice_var, values=self.NULL_CHOICES,
+                     state='readonly', width=15).grid(row=0, column=1, sticky=tk.W, pady=3, padx=5)
+        
+        # Buttons
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=3, column=0, pady=15)
+        
+        ttk.Button(button_frame, text="Apply", command=self._apply).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Clear", command=self._clear).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self._cancel).pack(side=tk.LEFT, padx=5)
+        
+        main_frame.columnconfigure(0, weight=1)
+    
+    def _field_for_label(self, label: str) -> str:
+        return dict(self.AMOUNT_FIELDS)[label]
+    
+    def _parse_amount(self, value: str, label: str) -> Optional[float]:
+        value = value.strip().replace('$', '').replace(',', '')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{label} must be a number")
+    
+    def _apply(self):
+        """Build the query from the form"""
+        values = {
+            'created_from': self.created_from_var.get().strip(),
+            'created_to': self.created_to_var.get().strip(),
+            'updated_from': self.updated_from_var.get().strip(),
+            'updated_to': self.updated_to_var.get().strip(),
+            'amount_field': self.amount_field_var.get(),
+            'amount_min': self.amount_min_var.get().strip(),
+            'amount_max': self.amount_max_var.get().strip(),
+            'null_field': self.null_field_var.get(),
+            'null_choice': self.null_choice_var.get(),
+        }
+        try:
+            query = LedgerQuery()
+            query = query.created_between(values['created_from'] or None, values['created_to'] or None)
+            query = query.updated_between(values['updated_from'] or None, values['updated_to'] or None)
+            query = query.amount_between(self._field_for_label(values['amount_field']),
+                                         self._parse_amount(values['amount_min'], "Minimum"),
+                                         self._parse_amount(values['amount_max'], "Maximum"))
+            if values['null_choice'] != self.NULL_CHOICES[0]:
+                query = query.is_null(self._field_for_label(values['null_field']),
+                                      values['null_choice'] == 'is empty')
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.dialog)
+            return
+        
+        self.result = (query, values)
+        self.dialog.destroy()
+    
+    def _clear(self):
+        """Remove the filter"""
+        self.result = (None, {})
+        self.dialog.destroy()
+    
+    def _cancel(self):
+        """Cancel the dialog"""
+        self.dialog.destroy()
+    
+    def show(self):
+        """Show the dialog and return (query, form values), or None if cancelled"""
+        self.dialog.wait_window()
+        return self.result
+
+
+class BulkEditDialog:
+    """Dialog window for setting one field on several entries at once"""
+    
+    def __init__(self, parent, fields: dict, count: int):
+        self.result = None
+        self.fields = fields
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(f"Bulk Edit {count} Entries")
+        self.dialog.geometry("360x180")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+        
+        # Center the dialog
+        self.dialog.update_idletasks()
+        x = (self.dialog.winfo_screenwidth() // 2) - (360 // 2)
+        y = (self.dialog.winfo_screenheight() // 2) - (180 // 2)
+        self.dialog.geometry(f"360x180+{x}+{y}")
+        
+        self.field_var = tk.StringVar(value=list(fields)[0])
+        self.value_var = tk.StringVar()
+        
+        self._create_widgets()
+    
+    def _create_widgets(self):
+        main_frame = ttk.Frame(self.dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="Field:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        ttk.Combobox(main_frame, textvariable=self.field_var, values=list(self.fields),
+                     state='readonly', width=20).grid(row=0, column=1, sticky=tk.EW, pady=5, padx=5)
+        
+        ttk.Label(main_frame, text="New value:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        value_entry = ttk.Entry(main_frame, textvariable=self.value_var, width=20)
+        value_entry.grid(row=1, column=1, sticky=tk.EW, pady=5, padx=5)
+        ttk.Label(main_frame, text="Leave empty to clear an amount").grid(row=2, column=0, columnspan=2, sticky=tk.W)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=3, column=0, columnspan=2, pady=15)
+        
+        ttk.Button(button_frame, text="Apply", command=self._apply).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self._cancel).pack(side=tk.LEFT, padx=5)
+        
+        main_frame.columnconfigure(1, weight=1)
+        value_entry.focus()
+    
+    def _apply(self):
+        """Validate and return the field update"""
+        label = self.field_var.get()
+        field = self.fields[label]
+        value = self.value_var.get().strip()
+        
+        if field == 'name':
+            if not value:
+                messagebox.showerror("Error", "Name cannot be empty!", parent=self.dialog)
+                return
+        elif value:
+            try:
+                value = float(value.replace('$', '').replace(',', ''))
+            except ValueError:
+                messagebox.showerror("Error", f"{label} must be a number!", parent=self.dialog)
+                return
+        else:
+            value = None
+        
+        self.result = {field: value}
+        self.dialog.destroy()
+    
+    def _cancel(self):
+        """Cancel the dialog"""
+        self.dialog.destroy()
+    
+    def show(self):
+        """Show the dialog and return {field: value}, or None if cancelled"""
+        self.dialog.wait_window()
+        return self.result
+
+
 class SettlementLedgerGUI:
     """Main GUI application for Daily Settlement Ledger"""
     
-    def __init__(self, root):
+    def __init__(self, root, working_set_days=None):
         self.root = root
         self.root.title("Daily Settlement Ledger")
         self.root.geometry("1200x700")
         
-        # Database connection
-        self.db = SettlementLedgerDB()
+        # Database connection; a working set keeps recent entries in memory
+        self.db = SettlementLedgerDB(working_set_days=working_set_days)
+        if working_set_days is not None:
+            self.root.title(f"Daily Settlement Ledger (last {working_set_days} days)")
         
         # Inline editing variables
         self.editing_entry = None
@@ -162,6 +629,34 @@ class SettlementLedgerGUI:
         self.editing_column = None
         self.tree_frame = None  # Will be set in _create_widgets
         
+        # Active toolbar filter (LedgerQuery) and the form values that built it
+        self.active_filter = None
+        self.filter_values = {}
+        
+        # Server-side sort state (heading text and direction); None keeps the default order
+        self.sort_column = None
+        self.sort_descending = False
+        
+        # Background load state; a new load bumps the generation so chunks
+        # from an older, cancelled load are ignored
+        self.load_generation = 0
+        self.load_cancel = None
+        self.load_count = 0
+        # Rows of the load in progress, kept for the search cache (None: not cached)
+        self.load_rows = None
+        self.load_source = None
+        self.load_term = ""
+        self.search_cache = SearchCache()
+        # Read-only connection for the loader threads, opened by the first
+        # load and reused by later ones; the lock lets one loader use it at a time
+        self.load_db = None
+        self.load_db_lock = threading.Lock()
+        
+        # Name autocomplete index, loaded on first use; reloaded when another
+        # program changes the file (data_version), updated in place on our writes
+        self.name_index = None
+        self.name_index_version = None
+        
         # Column to database field mapping (excluding ID and PH Date columns)
         self.column_to_field = {
             'Name': 'name',
@@ -176,10 +671,18 @@ class SettlementLedgerGUI:
         }
         self.non_editable_columns = {'ID', 'Date (PH time)'}
         
+        # Column to database field used for sorting
+        self.column_to_sort_field = {'ID': 'id', 'Date (PH time)': 'created_at'}
+        self.column_to_sort_field.update(self.column_to_field)
+        
         # Currency columns (need parsing)
         self.currency_columns = {'Prev Balance', 'Prev Total', 'Seller 1', 'Seller 2', 
                                 'Seller 3', 'Seller 4', 'Today Total', 'Today Balance'}
         
+        # Statistics, free-page cleanup etc. while nobody is typing
+        self.maintenance = MaintenanceScheduler(self.db.db_path)
+        self.maintenance.start()
+        
         # Create UI
         self._create_widgets()
         self._refresh_table()
@@ -205,7 +708,13 @@ class SettlementLedgerGUI:
         ttk.Button(toolbar, text="Add New Entry", command=self._add_entry).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Edit Entry", command=self._edit_entry).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Delete Entry", command=self._delete_entry).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Bulk Edit...", command=self._bulk_edit_entries).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Refresh", command=self._refresh_table).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Filter...", command=self._open_filter).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Close Day...", command=self._close_day).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="Day Report...", command=self._day_report).pack(side=tk.LEFT, padx=5)
+        self.stop_button = ttk.Button(toolbar, text="Stop Loading", command=self._cancel_load, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
         
         ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, fill=tk.Y, padx=10)
         
@@ -224,7 +733,8 @@ class SettlementLedgerGUI:
         columns = ('ID', 'Date (PH time)', 'Name', 'Prev Balance', 'Prev Total', 'Seller 1', 'Seller 2', 
                   'Seller 3', 'Seller 4', 'Today Total', 'Today Balance')
         
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=20)
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=20,
+                                 selectmode='extended')
         
         # Configure column headings and widths
         column_configs = [
@@ -242,7 +752,7 @@ class SettlementLedgerGUI:
         ]
         
         for col, width in column_configs:
-            self.tree.heading(col, text=col)
+            self.tree.heading(col, text=col, command=lambda c=col: self._sort_by_column(c))
             self.tree.column(col, width=width, anchor=tk.CENTER)
         
         # Scrollbars
@@ -269,7 +779,7 @@ class SettlementLedgerGUI:
         # Bind Enter key to edit (only if not inline editing)
         self.root.bind('<Return>', lambda e: self._handle_return_key())
         self.root.bind('<Delete>', lambda e: self._delete_entry())
-        self.root.bind('<Escape>', lambda e: self._cancel_inline_edit())
+        self.root.bind('<Escape>', lambda e: self._handle_escape_key())
     
     def _format_currency(self, value):
         """Format a value as currency"""
@@ -307,70 +817,223 @@ class SettlementLedgerGUI:
             return dt_ph.strftime("%Y-%m-%d %I:%M:%S %p")
         except Exception:
             return utc_str or 'N/A'
-
+    
+    def _entry_to_values(self, entry):
+        """Convert a database row to Treeview column values"""
+        entry_id, name, prev_bal, prev_total, seller1, seller2, seller3, seller4, today_total, today_bal, created_at, updated_at = entry
+        return (
+            entry_id,
+            self._convert_to_ph_time(created_at),
+            name,
+            self._format_currency(prev_bal),
+            self._format_currency(prev_total),
+            self._format_currency(seller1),
+            self._format_currency(seller2),
+            self._format_currency(seller3),
+            self._format_currency(seller4),
+            self._format_currency(today_total),
+            self._format_currency(today_bal),
+        )
+    
+    def _current_query(self):
+        """Combine the toolbar filter and search box into one query"""
+        query = self.active_filter or LedgerQuery()
+        if self.sort_column:
+            query = query.order_by(self.column_to_sort_field[self.sort_column], self.sort_descending)
+        return query.name_contains(self.search_var.get().strip())
+    
+    def _load_entries(self, on_done=None):
+        """
+        Reload the table from the database using the current filter, search and sort
+        
+        The query runs on a background thread with its own connection; rows
+        arrive in chunks that are inserted from the event loop, so the window
+        stays responsive. on_done(count) is called when every row is shown.
+        
+        A search term that extends the previous one is answered from the
+        search cache instead, as long as nothing else changed.
+        """
+        self._cancel_load(quiet=True)
+        self.tree.delete(*self.tree.get_children())
+        
+        self.load_generation += 1
+        self.load_cancel = threading.Event()
+        self.load_count = 0
+        self.load_source = self._load_source()
+        self.load_term = self.search_var.get().strip()
+        cached = self.search_cache.narrow(self.load_source, self.load_term)
+        if cached is not None:
+            # Shown in chunks like a load, so a long list keeps the window responsive
+            self.load_rows = None
+            chunks = queue.Queue()
+            for start in range(0, len(cached), LOAD_CHUNK_ROWS):
+                chunks.put(('rows', cached[start:start + LOAD_CHUNK_ROWS]))
+            chunks.put(('done', None))
+        else:
+            self.load_rows = []
+            chunks = queue.Queue(maxsize=LOAD_QUEUE_CHUNKS)
+            loader = threading.Thread(target=self._load_worker,
+                                      args=(self._current_query(), chunks, self.load_cancel), daemon=True)
+            loader.start()
+        self.stop_button.configure(state=tk.NORMAL)
+        self.status_var.set("Loading entries...")
+        self.root.after(LOAD_POLL_MS, self._apply_loaded_chunks, self.load_generation, chunks, on_done)
+    
+    def _load_source(self):
+        """
+        Everything the table contents depend on besides the search term
+        
+        PRAGMA data_version changes when another connection commits and
+        total_changes when this one writes, so any change to the data gives
+        a new source and the search cache is not used.
+        """
+        data_version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+        return (self.active_filter, self.sort_column, self.sort_descending,
+                data_version, self.db.conn.total_changes)
+    
+    def _suggest_names(self, prefix):
+        """Existing names starting with prefix, for the name autocomplete"""
+        data_version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self.name_index is None or data_version != self.name_index_version:
+            self.name_index = NameIndex(self.db.iter_names())
+            self.name_index_version = data_version
+        return self.name_index.complete(prefix.strip())
+    
+    def _update_name_index(self, added=(), removed=()):
+        """Apply our own writes to the name index; a removed name stays while other entries use it"""
+        if self.name_index is None:
+            return
+        for name in added:
+            self.name_index.add(name)
+        for name in removed:
+            if name not in added and self.db.get_name_summary(name) is None:
+                self.name_index.discard(name)
+    
+    def _load_worker(self, query, chunks, cancel):
+        """Loader thread: read the query in chunks and queue the Treeview values"""
+        def put(item):
+            # Wait for room, but give up promptly once the load is cancelled
+            while not cancel.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        # A cancelled loader gives up the lock within one put timeout
+        with self.load_db_lock:
+            try:
+                db = self._loader_db()
+                rows = []
+                for entry in db.iter_entries(query, page_size=LOAD_CHUNK_ROWS):
+                    rows.append(self._entry_to_values(entry))
+                    if len(rows) == LOAD_CHUNK_ROWS:
+                        if not put(('rows', rows)):
+                            return
+                        rows = []
+                if rows and not put(('rows', rows)):
+                    return
+                put(('done', None))
+            except Exception as e:
+                self._close_loader_db()
+                put(('error', e))
+    
+    def _loader_db(self):
+        """The loaders' read-only connection, opened on first use (call with load_db_lock held)"""
+        if self.load_db is None:
+            self.load_db = SettlementLedgerDB(self.db.read_path, check_same_thread=False)
+            self.load_db.conn.execute("PRAGMA query_only = ON")
+        return self.load_db
+    
+    def _close_loader_db(self):
+        """Close the loaders' connection; the next load opens a new one"""
+        if self.load_db is not None:
+            self.load_db.close()
+            self.load_db = None
+    
+    def _apply_loaded_chunks(self, generation, chunks, on_done):
+        """Insert the next queued chunk into the table, then reschedule"""
+        if generation != self.load_generation:
+            return  # superseded or cancelled
+        try:
+            kind, payload = chunks.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self._apply_loaded_chunks, generation, chunks, on_done)
+            return
+        
+        if kind == 'rows':
+            for values in payload:
+                self.tree.insert('', tk.END, values=values)
+            self.load_count += len(payload)
+            if self.load_rows is not None:
+                self.load_rows.extend(payload)
+                if len(self.load_rows) > SEARCH_CACHE_MAX_ROWS:
+                    self.load_rows = None
+            self.status_var.set(f"Loading entries... {self.load_count} (Esc to stop)")
+            # Yield to the event loop between chunks
+            self.root.after(1, self._apply_loaded_chunks, generation, chunks, on_done)
+            return
+        
+        self.load_cancel = None
+        self.stop_button.configure(state=tk.DISABLED)
+        if kind == 'error':
+            self.status_var.set(f"Loading failed after {self.load_count} entries")
+            messagebox.showerror("Error", f"Failed to load entries: {payload}")
+            return
+        if self.load_rows is not None:
+            self.search_cache.store(self.load_source, self.load_term, self.load_rows)
+            self.load_rows = None
+        if on_done:
+            on_done(self.load_count)
+    
+    def _cancel_load(self, quiet=False):
+        """Stop a background load, keeping the rows already shown"""
+        if not self.load_cancel:
+            return
+        self.load_cancel.set()
+        self.load_cancel = None
+        self.load_rows = None
+        self.load_generation += 1
+        self.stop_button.configure(state=tk.DISABLED)
+        if not quiet:
+            self.status_var.set(f"Loading stopped: {self.load_count} entries shown")
+    
+    def _sort_by_column(self, column):
+        """Sort by a column heading; clicking the same heading again reverses the order"""
+        if self.editing_entry:
+            self._cancel_inline_edit()
+        
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            if self.sort_column:
+                self.tree.heading(self.sort_column, text=self.sort_column)
+            self.sort_column = column
+            self.sort_descending = False
+        
+        arrow = " \u25bc" if self.sort_descending else " \u25b2"
+        self.tree.heading(column, text=column + arrow)
+        direction = "descending" if self.sort_descending else "ascending"
+        self._load_entries(lambda count: self.status_var.set(f"Sorted by {column} ({direction})"))
+    
     def _refresh_table(self):
         """Refresh the table with all entries"""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Get all entries
-        entries = self.db.get_all_entries()
-        
-        # Insert entries
-        for entry in entries:
-            entry_id, name, prev_bal, prev_total, seller1, seller2, seller3, seller4, today_total, today_bal, created_at, updated_at = entry
-            ph_date_str = self._convert_to_ph_time(created_at)
-            values = (
-                entry_id,
-                ph_date_str,
-                name,
-                self._format_currency(prev_bal),
-                self._format_currency(prev_total),
-                self._format_currency(seller1),
-                self._format_currency(seller2),
-                self._format_currency(seller3),
-                self._format_currency(seller4),
-                self._format_currency(today_total),
-                self._format_currency(today_bal),
-            )
-            self.tree.insert('', tk.END, values=values)
-        
-        self.status_var.set(f"Total entries: {len(entries)}")
+        label = "Filtered entries" if self.active_filter else "Total entries"
+        self._load_entries(lambda count: self.status_var.set(f"{label}: {count}"))
     
     def _search_entries(self):
         """Search entries by name"""
-        search_term = self.search_var.get().strip()
-        
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        if search_term:
-            entries = self.db.search_by_name(search_term)
-        else:
-            entries = self.db.get_all_entries()
-        
-        # Insert matching entries
-        for entry in entries:
-            entry_id, name, prev_bal, prev_total, seller1, seller2, seller3, seller4, today_total, today_bal, created_at, updated_at = entry
-            ph_date_str = self._convert_to_ph_time(created_at)
-            values = (
-                entry_id,
-                ph_date_str,
-                name,
-                self._format_currency(prev_bal),
-                self._format_currency(prev_total),
-                self._format_currency(seller1),
-                self._format_currency(seller2),
-                self._format_currency(seller3),
-                self._format_currency(seller4),
-                self._format_currency(today_total),
-                self._format_currency(today_bal),
-            )
-            self.tree.insert('', tk.END, values=values)
-        
-        self.status_var.set(f"Found {len(entries)} entries")
+        self._load_entries(lambda count: self.status_var.set(f"Found {count} entries"))
+    
+    def _open_filter(self):
+        """Open the filter dialog and apply the result"""
+        dialog = FilterDialog(self.root, self.filter_values)
+        result = dialog.show()
+        if result is None:
+            return
+        self.active_filter, self.filter_values = result
+        self._refresh_table()
     
     def _get_selected_entry_id(self):
         """Get the ID of the selected entry"""
@@ -381,14 +1044,19 @@ class SettlementLedgerGUI:
         item = self.tree.item(selection[0])
         return item['values'][0]  # First column is ID
     
+    def _get_selected_entry_ids(self):
+        """Get the IDs of all selected entries"""
+        return [self.tree.item(item)['values'][0] for item in self.tree.selection()]
+    
     def _add_entry(self):
         """Add a new entry"""
-        dialog = EntryDialog(self.root, "Add New Entry")
+        dialog = EntryDialog(self.root, "Add New Entry", suggest_names=self._suggest_names)
         result = dialog.show()
         
         if result:
             try:
                 self.db.add_entry(**result)
+                self._update_name_index(added=[result['name']])
                 self._refresh_table()
                 self.status_var.set("Entry added successfully")
                 messagebox.showinfo("Success", "Entry added successfully!")
@@ -421,7 +1089,7 @@ class SettlementLedgerGUI:
             'today_balance': entry[9],
         }
         
-        dialog = EntryDialog(self.root, f"Edit Entry #{entry_id}", entry_data)
+        dialog = EntryDialog(self.root, f"Edit Entry #{entry_id}", entry_data, suggest_names=self._suggest_names)
         result = dialog.show()
         
         if result:
@@ -439,6 +1107,7 @@ class SettlementLedgerGUI:
                     result['today_total'],
                     result['today_balance']
                 )
+                self._update_name_index(added=[result['name']], removed=[entry[1]])
                 self._refresh_table()
                 self.status_var.set("Entry updated successfully")
                 messagebox.showinfo("Success", "Entry updated successfully!")
@@ -446,11 +1115,16 @@ class SettlementLedgerGUI:
                 messagebox.showerror("Error", f"Failed to update entry: {str(e)}")
     
     def _delete_entry(self):
-        """Delete the selected entry"""
+        """Delete the selected entry (or entries)"""
         # Cancel any ongoing inline edit
         if self.editing_entry:
             self._cancel_inline_edit()
         
+        entry_ids = self._get_selected_entry_ids()
+        if len(entry_ids) > 1:
+            self._delete_entries(entry_ids)
+            return
+        
         entry_id = self._get_selected_entry_id()
         if not entry_id:
             messagebox.showwarning("No Selection", "Please select an entry to delete.")
@@ -468,12 +1142,118 @@ class SettlementLedgerGUI:
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete entry '{entry_name}' (ID: {entry_id})?"):
             try:
                 self.db.delete_entry(entry_id)
+                self._update_name_index(removed=[entry_name])
                 self._refresh_table()
                 self.status_var.set("Entry deleted successfully")
                 messagebox.showinfo("Success", "Entry deleted successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to delete entry: {str(e)}")
     
+    def _delete_entries(self, entry_ids):
+        """Delete several entries in one transaction"""
+        if not messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {len(entry_ids)} entries?"):
+            return
+        try:
+            deleted = self.db.delete_entries(entry_ids)
+            # Which names went away is unknown here; reload the index when next needed
+            self.name_index = None
+            self._refresh_table()
+            self.status_var.set(f"{deleted} entries deleted successfully")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to delete entries: {str(e)}")
+    
+    def _bulk_edit_entries(self):
+        """Set one field on all selected entries"""
+        if self.editing_entry:
+            self._cancel_inline_edit()
+        
+        entry_ids = self._get_selected_entry_ids()
+        if not entry_ids:
+            messagebox.showwarning("No Selection", "Please select the entries to edit.")
+            return
+        
+        dialog = BulkEditDialog(self.root, self.column_to_field, len(entry_ids))
+        result = dialog.show()
+        
+        if result:
+            try:
+                updated = self.db.update_entries(entry_ids, **result)
+                if 'name' in result:
+                    self.name_index = None
+                self._refresh_table()
+                self.status_var.set(f"{updated} entries updated successfully")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to update entries: {str(e)}")
+    
+    def _close_day(self):
+        """Carry each name's latest balance and total forward into the next day"""
+        today = datetime.now(pytz.timezone('Asia/Manila')).strftime('%Y-%m-%d')
+        day = simpledialog.askstring("Close Day", "Day to close (YYYY-MM-DD, PH time):",
+                                     initialvalue=today, parent=self.root)
+        if not day:
+            return
+        try:
+            carried = self.db.close_day(day.strip())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to close day: {str(e)}")
+            return
+        self._load_entries(lambda count: self.status_var.set(
+            f"Closed {day.strip()}: {carried} entries carried forward to the next day"))
+    
+    def _day_report(self):
+        """Write a print-ready report of one day's entries in the background, then open it"""
+        today = datetime.now(pytz.timezone('Asia/Manila')).strftime('%Y-%m-%d')
+        day = simpledialog.askstring("Day Report", "Day to report (YYYY-MM-DD, PH time):",
+                                     initialvalue=today, parent=self.root)
+        if not day:
+            return
+        day = day.strip()
+        path = filedialog.asksaveasfilename(parent=self.root, title="Save Day Report",
+                                            initialfile=f"settlement-report-{day}.html",
+                                            defaultextension=".html",
+                                            filetypes=[("HTML (printable)", "*.html"), ("CSV", "*.csv")])
+        if not path:
+            return
+        
+        results = queue.Queue()
+        
+        def write():
+            db = None
+            try:
+                # Its own connection to the file: the report may take a few
+                # seconds on a large day, and a working set may not hold the day.
+                # Queued working-set writes go to the file first
+                self.db.flush()
+                db = SettlementLedgerDB(self.db.db_path)
+                if path.lower().endswith('.csv'):
+                    results.put(('done', write_day_report(db, day, csv_out=path)))
+                else:
+                    results.put(('done', write_day_report(db, day, html_out=path)))
+            except Exception as e:
+                results.put(('error', e))
+            finally:
+                if db:
+                    db.close()
+        
+        threading.Thread(target=write, daemon=True).start()
+        self.status_var.set(f"Writing the report for {day}...")
+        self.root.after(LOAD_POLL_MS, self._finish_day_report, results, path)
+    
+    def _finish_day_report(self, results, path):
+        """Report the outcome of _day_report once its thread is done, and open an HTML report"""
+        try:
+            kind, payload = results.get_nowait()
+        except queue.Empty:
+            self.root.after(LOAD_POLL_MS, self._finish_day_report, results, path)
+            return
+        if kind == 'error':
+            self.status_var.set("Day report failed")
+            messagebox.showerror("Error", f"Failed to write the report: {str(payload)}")
+            return
+        self.status_var.set(f"Report written: {payload['entries']} entries on {payload['pages']} pages ({path})")
+        if not path.lower().endswith('.csv'):
+            webbrowser.open(Path(path).resolve().as_uri())
+    
     def _on_tree_double_click(self, event):
         """Handle double-click on treeview to start inline editing"""
         # Cancel any existing inline edit
@@ -538,8 +1318,11 @@ class SettlementLedgerGUI:
         x = tree_frame_x + tree_x
         y = tree_frame_y + tree_y
         
-        # Create entry widget
-        entry = ttk.Entry(self.tree_frame)
+        # Create entry widget; names get the autocomplete dropdown
+        if self.column_to_field.get(column_name) == 'name':
+            entry = AutocompleteEntry(self.tree_frame, self._suggest_names)
+        else:
+            entry = ttk.Entry(self.tree_frame)
         
         # For currency columns, remove formatting for editing
         if column_name in self.currency_columns:
@@ -615,9 +1398,12 @@ class SettlementLedgerGUI:
         
         # Update the database
         try:
+            old_entry = self.db.get_entry(entry_id) if field_name == 'name' else None
             # Create update dictionary with only the changed field
             update_dict = {field_name: update_value}
             self.db.update_entry(entry_id, **update_dict)
+            if old_entry:
+                self._update_name_index(added=[update_value], removed=[old_entry[1]])
             
             # Refresh the table to show updated value
             self._refresh_table()
@@ -655,6 +1441,13 @@ class SettlementLedgerGUI:
             if hasattr(self, 'editing_column_index'):
                 delattr(self, 'editing_column_index')
     
+    def _handle_escape_key(self):
+        """Escape cancels inline editing, or else stops a running load"""
+        if self.editing_entry:
+            self._cancel_inline_edit()
+        else:
+            self._cancel_load()
+    
     def _handle_return_key(self):
         """Handle Return key press - only edit if not inline editing"""
         if not self.editing_entry:
@@ -662,14 +1455,23 @@ class SettlementLedgerGUI:
     
     def on_closing(self):
         """Handle window closing"""
+        self._cancel_load(quiet=True)
+        self.maintenance.stop()
+        with self.load_db_lock:
+            self._close_loader_db()
         self.db.close()
         self.root.destroy()
 
 
-def main():
+def main(argv=None):
     """Main function to start the GUI application"""
+    parser = argparse.ArgumentParser(prog='ledger_gui', description="Daily Settlement Ledger GUI")
+    parser.add_argument('--working-set', type=int, metavar='DAYS',
+                        help="work on the last DAYS days in memory; changes are still saved to the file")
+    args = parser.parse_args(argv)
+    
     root = tk.Tk()
-    app = SettlementLedgerGUI(root)
+    app = SettlementLedgerGUI(root, working_set_days=args.working_set)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
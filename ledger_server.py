@@ -0,0 +1,538 @@
+"""
+Daily Settlement Ledger - Local HTTP/JSON Service
+Shares one database between several local tools through a small JSON API
+
+Run with: python ledger_server.py [--db settlement_ledger.db] [--port 8765]
+
+Endpoints:
+    GET    /entries               One page of entries (filters, sort, limit, after)
+    GET    /entries.jsonl         Every matching entry, streamed as JSON lines
+    GET    /entries/<id>          A single entry
+    POST   /entries               Add an entry (JSON body)
+    PUT    /entries/<id>          Replace all fields of an entry
+    PATCH  /entries/<id>          Set some fields of an entry (null clears an amount)
+    DELETE /entries/<id>          Delete an entry
+    DELETE /entries?ids=1,2,5-9   Delete several entries in one transaction
+    GET    /stats                 Entry count and amount totals (same filters)
+    GET    /names?name=<name>     Current balance and running totals for a name
+    GET    /history?name=<name>   Entries for a name, newest first (limit)
+
+Filters (query string): name, created_from, created_to, updated_from,
+updated_to (YYYY-MM-DD, PH time), min_<field>, max_<field>, null=<field>,
+not_null=<field>, sort=<column>, desc=1. Paging: limit, after (the "next"
+token of the previous page).
+
+Every GET response carries an ETag derived from the database's change
+counter, so clients can send If-None-Match and get 304 Not Modified
+without the server running a query.
+"""
+import argparse
+import base64
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from database import (SettlementLedgerDB, LedgerQuery, AMOUNT_COLUMNS, EDITABLE_COLUMNS,
+                      ENTRY_COLUMNS, SORTABLE_COLUMNS, DEFAULT_BUSY_TIMEOUT, MaintenanceScheduler)
+
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_ROWS = 500
+RESPONSE_CACHE_SIZE = 256
+# Seconds an idle keep-alive connection may hold its worker thread
+KEEPALIVE_TIMEOUT = 15
+
+
+class RequestError(Exception):
+    """A client error, reported as a JSON error response"""
+    
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    """A fixed set of warm SettlementLedgerDB connections shared by worker threads"""
+    
+    def __init__(self, db_path: str, size: int, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self._connections = queue.Queue()
+        for _ in range(size):
+            self._connections.put(SettlementLedgerDB(db_path, check_same_thread=False,
+                                                     busy_timeout=busy_timeout))
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of one request"""
+        db = self._connections.get()
+        try:
+            yield db
+        finally:
+            self._connections.put(db)
+    
+    def close(self):
+        while not self._connections.empty():
+            self._connections.get_nowait().close()
+
+
+class ChangeCounter:
+    """
+    Detects commits from any connection, including other processes
+    
+    PRAGMA data_version on a dedicated connection changes whenever another
+    connection commits to the file, which makes it a cheap global version.
+    """
+    
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._nonce = uuid.uuid4().hex[:8]
+    
+    def etag(self) -> str:
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return f'"{self._nonce}-{version}"'
+    
+    def close(self):
+        self._conn.close()
+
+
+class ResponseCache:
+    """LRU cache of encoded GET responses, valid for a single ETag"""
+    
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE):
+        self._size = size
+        self._etag = None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, etag: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            if etag != self._etag:
+                return None
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+    
+    def put(self, etag: str, key: str, body: bytes):
+        with self._lock:
+            if etag != self._etag:
+                self._etag = etag
+                self._items.clear()
+            self._items[key] = body
+            if len(self._items) > self._size:
+                self._items.popitem(last=False)
+
+
+def entry_to_record(entry) -> dict:
+    """Convert an entry tuple to a dict keyed by column name"""
+    return dict(zip(ENTRY_COLUMNS, entry))
+
+
+def encode_after(key) -> str:
+    """Encode a keyset sort key as an opaque URL-safe token"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_after(token: str):
+    """Decode a token produced by encode_after"""
+    try:
+        value, entry_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return (value, int(entry_id))
+    except (ValueError, TypeError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "invalid 'after' token")
+
+
+def query_from_params(params: dict) -> LedgerQuery:
+    """Build a LedgerQuery from parsed query-string parameters"""
+    def single(name):
+        values = params.get(name)
+        return values[-1] if values else None
+    
+    try:
+        query = LedgerQuery().name_contains(single("name"))
+        query = query.created_between(single("created_from"), single("created_to"))
+        query = query.updated_between(single("updated_from"), single("updated_to"))
+        for column in AMOUNT_COLUMNS:
+            minimum, maximum = single(f"min_{column}"), single(f"max_{column}")
+            if minimum is not None or maximum is not None:
+                query = query.amount_between(column,
+                                             float(minimum) if minimum is not None else None,
+                                             float(maximum) if maximum is not None else None)
+        for column in params.get("null", []):
+            query = query.is_null(column)
+        for column in params.get("not_null", []):
+            query = query.not_null(column)
+        sort = single("sort")
+        if sort:
+            if sort not in SORTABLE_COLUMNS:
+                raise ValueError(f"cannot sort by {sort}")
+            query = query.order_by(sort, single("desc") in ("1", "true", "yes"))
+    except ValueError as e:
+        raise RequestError(HTTPStatus.BAD_REQUEST, str(e))
+    return query
+
+
+def parse_ids(text: str):
+    """Parse "1,2,5-9" into a list of IDs"""
+    ids = []
+    try:
+        for part in text.split(","):
+            part = part.strip()
+            if "-" in part:
+                start, end = part.split("-", 1)
+                ids.extend(range(int(start), int(end) + 1))
+            elif part:
+                ids.append(int(part))
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"invalid ID list: {text}")
+    return ids
+
+
+def body_fields(body: dict, complete: bool = False) -> dict:
+    """Validate the editable fields of a request body"""
+    if not isinstance(body, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "expected a JSON object")
+    unknown = set(body) - set(EDITABLE_COLUMNS) - {"id"}
+    if unknown:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"unknown fields: {', '.join(sorted(unknown))}")
+    fields = {}
+    for column in EDITABLE_COLUMNS:
+        if column not in body:
+            if complete:
+                fields[column] = None
+            continue
+        value = body[column]
+        if column == "name":
+            if not isinstance(value, str) or not value.strip():
+                raise RequestError(HTTPStatus.BAD_REQUEST, "name must be a non-empty string")
+            fields[column] = value.strip()
+        elif value is None or isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields[column] = value
+        else:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"{column} must be a number or null")
+    if complete and not fields.get("name"):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "name is required")
+    return fields
+
+
+class LedgerRequestHandler(BaseHTTPRequestHandler):
+    """Routes JSON requests to SettlementLedgerDB operations"""
+    
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server_version = "DailySettlementLedger/1.0"
+    # Each connection holds a pool worker, so idle ones are closed after this
+    # long rather than starving later clients
+    timeout = KEEPALIVE_TIMEOUT
+    
+    # --- helpers -----------------------------------------------------------
+    
+    def _send_json(self, status: HTTPStatus, payload=None, body: Optional[bytes] = None,
+                   etag: Optional[str] = None):
+        if body is None:
+            body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_not_modified(self, etag: str):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def _start_chunked(self, content_type: str, etag: str):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("ETag", etag)
+        self.end_headers()
+    
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+    
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "a JSON body is required")
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid JSON body")
+    
+    def _route(self):
+        """Split the request path into (resource, entry id or None, query params)"""
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if not segments:
+            raise RequestError(HTTPStatus.NOT_FOUND, "not found")
+        if len(segments) == 2 and segments[0] == "entries":
+            try:
+                return "entries", int(segments[1]), params
+            except ValueError:
+                raise RequestError(HTTPStatus.NOT_FOUND, "not found")
+        if len(segments) == 1:
+            return segments[0], None, params
+        raise RequestError(HTTPStatus.NOT_FOUND, "not found")
+    
+    def _handle(self, method):
+        try:
+            resource, entry_id, params = self._route()
+            getattr(self, f"_{method}_{resource.replace('.', '_')}", self._not_found)(entry_id, params)
+        except RequestError as e:
+            if method != "get":
+                # The body may not have been read; don't reuse the connection
+                self.close_connection = True
+            self._send_json(e.status, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            self.log_error("Unhandled error: %r", e)
+            if self.close_connection:
+                return  # A streamed response was already started
+            self.close_connection = True
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"})
+    
+    def _not_found(self, entry_id, params):
+        raise RequestError(HTTPStatus.NOT_FOUND, "not found")
+    
+    def _cached_get(self, build):
+        """Serve a GET from the If-None-Match check or response cache, else build it"""
+        etag = self.server.changes.etag()
+        if self.headers.get("If-None-Match") == etag:
+            self._send_not_modified(etag)
+            return
+        body = self.server.cache.get(etag, self.path)
+        if body is None:
+            with self.server.pool.connection() as db:
+                body = json.dumps(build(db)).encode()
+            self.server.cache.put(etag, self.path, body)
+        self._send_json(HTTPStatus.OK, body=body, etag=etag)
+    
+    # --- endpoints -------------------------------------------------------
+    
+    def do_GET(self):
+        self._handle("get")
+    
+    def do_POST(self):
+        self._handle("post")
+    
+    def do_PUT(self):
+        self._handle("put")
+    
+    def do_PATCH(self):
+        self._handle("patch")
+    
+    def do_DELETE(self):
+        self._handle("delete")
+    
+    def _get_entries(self, entry_id, params):
+        if entry_id is not None:
+            def build(db):
+                entry = db.get_entry(entry_id)
+                if entry is None:
+                    raise RequestError(HTTPStatus.NOT_FOUND, f"entry {entry_id} not found")
+                return entry_to_record(entry)
+            self._cached_get(build)
+            return
+        
+        query = query_from_params(params)
+        limit = min(self._limit(params, DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        after = decode_after(params["after"][-1]) if "after" in params else None
+        
+        def build(db):
+            page = db.find_entries(query, limit, after)
+            next_token = encode_after(query.sort_key(page[-1])) if len(page) == limit else None
+            return {"entries": [entry_to_record(entry) for entry in page], "next": next_token}
+        self._cached_get(build)
+    
+    def _get_entries_jsonl(self, entry_id, params):
+        """Stream every matching entry as chunked JSON lines"""
+        query = query_from_params(params)
+        etag = self.server.changes.etag()
+        if self.headers.get("If-None-Match") == etag:
+            self._send_not_modified(etag)
+            return
+        with self.server.pool.connection() as db:
+            self._start_chunked("application/x-ndjson", etag)
+            # Headers are sent; from here on a failure can only drop the connection
+            self.close_connection = True
+            lines = []
+            for entry in db.stream_entries(query, STREAM_BATCH_ROWS):
+                lines.append(json.dumps(entry_to_record(entry)))
+                if len(lines) >= STREAM_BATCH_ROWS:
+                    lines.append("")
+                    self._write_chunk("\n".join(lines).encode())
+                    lines = []
+            if lines:
+                lines.append("")
+                self._write_chunk("\n".join(lines).encode())
+            self._end_chunked()
+            self.close_connection = False
+    
+    def _get_stats(self, entry_id, params):
+        query = query_from_params(params)
+        self._cached_get(lambda db: db.get_totals(query))
+    
+    def _required_name(self, params) -> str:
+        name = params.get("name", [""])[-1]
+        if not name:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "name is required")
+        return name
+    
+    def _limit(self, params, default: Optional[int]) -> Optional[int]:
+        """The limit parameter (default if absent); must be a positive number"""
+        if "limit" not in params:
+            return default
+        try:
+            limit = int(params["limit"][-1])
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "limit must be a number")
+        if limit < 1:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "limit must be at least 1")
+        return limit
+    
+    def _get_names(self, entry_id, params):
+        name = self._required_name(params)
+        
+        def build(db):
+            summary = db.get_name_summary(name)
+            if summary is None:
+                raise RequestError(HTTPStatus.NOT_FOUND, f"no entries for {name!r}")
+            return summary
+        self._cached_get(build)
+    
+    def _get_history(self, entry_id, params):
+        name = self._required_name(params)
+        limit = self._limit(params, None)
+        self._cached_get(lambda db: [entry_to_record(entry) for entry in db.get_name_history(name, limit)])
+    
+    def _post_entries(self, entry_id, params):
+        if entry_id is not None:
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "use PUT or PATCH to change an entry")
+        fields = body_fields(self._read_json())
+        if not fields.get("name"):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "name is required")
+        with self.server.pool.connection() as db:
+            new_id = db.add_entry(**fields)
+            entry = db.get_entry(new_id)
+        self._send_json(HTTPStatus.CREATED, entry_to_record(entry))
+    
+    def _put_entries(self, entry_id, params):
+        if entry_id is None:
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "PUT needs an entry ID")
+        fields = body_fields(self._read_json(), complete=True)
+        with self.server.pool.connection() as db:
+            if not db.update_entry_complete(entry_id, **fields):
+                raise RequestError(HTTPStatus.NOT_FOUND, f"entry {entry_id} not found")
+            entry = db.get_entry(entry_id)
+        self._send_json(HTTPStatus.OK, entry_to_record(entry))
+    
+    def _patch_entries(self, entry_id, params):
+        if entry_id is None:
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "PATCH needs an entry ID")
+        fields = body_fields(self._read_json())
+        with self.server.pool.connection() as db:
+            if fields and not db.update_entries([entry_id], **fields):
+                raise RequestError(HTTPStatus.NOT_FOUND, f"entry {entry_id} not found")
+            entry = db.get_entry(entry_id)
+        if entry is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"entry {entry_id} not found")
+        self._send_json(HTTPStatus.OK, entry_to_record(entry))
+    
+    def _delete_entries(self, entry_id, params):
+        if entry_id is not None:
+            ids = [entry_id]
+        elif "ids" in params:
+            ids = parse_ids(params["ids"][-1])
+        else:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "DELETE needs an entry ID or ?ids=")
+        with self.server.pool.connection() as db:
+            deleted = db.delete_entries(ids)
+        if entry_id is not None and not deleted:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"entry {entry_id} not found")
+        self._send_json(HTTPStatus.OK, {"deleted": deleted})
+
+
+class LedgerHTTPServer(HTTPServer):
+    """HTTP server that hands each connection to a fixed pool of worker threads"""
+    
+    def __init__(self, address, db_path: str, workers: int = 8,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        # Open the ledger once up front so the schema exists before the pool starts
+        SettlementLedgerDB(db_path, busy_timeout=busy_timeout).close()
+        self.pool = ConnectionPool(db_path, workers, busy_timeout)
+        self.changes = ChangeCounter(db_path)
+        self.cache = ResponseCache()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ledger-worker")
+        self.maintenance = MaintenanceScheduler(db_path)
+        super().__init__(address, LedgerRequestHandler)
+        self.maintenance.start()
+    
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+    
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        self.maintenance.stop()
+        self.pool.close()
+        self.changes.close()
+
+
+def main(argv=None):
+    """Start the local ledger service"""
+    parser = argparse.ArgumentParser(description="Daily Settlement Ledger local HTTP/JSON service")
+    parser.add_argument("--db", default="settlement_ledger.db", help="database file (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="worker threads and pooled connections (default: %(default)s)")
+    parser.add_argument("--busy-timeout", type=float, default=DEFAULT_BUSY_TIMEOUT, metavar="SECONDS",
+                        help="wait this long for another program's write lock (default: %(default)s)")
+    args = parser.parse_args(argv)
+    # Background maintenance reports each pass at INFO level
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    
+    server = LedgerHTTPServer((args.host, args.port), args.db, args.workers, args.busy_timeout)
+    print(f"Daily Settlement Ledger service on http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping service.")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
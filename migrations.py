@@ -0,0 +1,163 @@
+"""
+Schema migration module for Daily Settlement Ledger
+Applies versioned migrations tracked in PRAGMA user_version
+"""
+import sqlite3
+from typing import Callable, Iterable, List, Optional
+
+
+# Rows copied per transaction by copy_in_chunks; each chunk holds the write
+# lock only briefly, so other connections can write between chunks
+MIGRATION_CHUNK_SIZE = 5000
+
+# progress(description, done, total)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class Migration:
+    """
+    One schema change, applied once when the file's user_version is below its version
+    
+    apply(db) runs in a single transaction together with the user_version
+    update, so a migration is either fully applied or not at all. Long data
+    copies go in prepare(db, progress), which runs first in its own short,
+    resumable transactions (see copy_in_chunks) and must be safe to repeat.
+    """
+    
+    def __init__(self, version: int, description: str, apply: Callable,
+                 prepare: Optional[Callable] = None):
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.prepare = prepare
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """The migration version recorded in the database file"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _begin(conn: sqlite3.Connection):
+    # sqlite3 only opens transactions implicitly before DML; DDL would autocommit
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def run_migrations(db, migrations: Iterable[Migration],
+                   progress: Optional[ProgressCallback] = None) -> List[int]:
+    """
+    Apply the migrations newer than the file's user_version, in version order
+    
+    Args:
+        db: Object with a `conn` sqlite3 connection, passed to each migration
+        migrations: The full migration list
+        progress: Optional callback(description, done, total)
+    
+    Returns:
+        The versions applied
+    """
+    migrations = sorted(migrations, key=lambda migration: migration.version)
+    current = schema_version(db.conn)
+    latest = migrations[-1].version if migrations else 0
+    if current > latest:
+        raise ValueError(f"Database schema version {current} is newer than this program supports ({latest})")
+    
+    applied = []
+    for migration in migrations:
+        if migration.version <= current:
+            continue
+        if migration.prepare:
+            migration.prepare(db, progress)
+        _begin(db.conn)
+        try:
+            migration.apply(db)
+            # PRAGMA does not accept parameters; the version is an int
+            db.conn.execute(f"PRAGMA user_version = {int(migration.version)}")
+        except BaseException:
+            db.conn.rollback()
+            raise
+        db.conn.commit()
+        applied.append(migration.version)
+        if progress:
+            progress(migration.description, 1, 1)
+    return applied
+
+
+def _ensure_progress_table(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migration_progress (
+            task TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+
+
+def chunk_progress(conn: sqlite3.Connection, task: str) -> Optional[int]:
+    """The last id copied by an unfinished copy_in_chunks task, or None if none is in progress"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                          "AND name = 'schema_migration_progress'").fetchone()
+    if not exists:
+        return None
+    row = conn.execute("SELECT last_id FROM schema_migration_progress WHERE task = ?", (task,)).fetchone()
+    return row[0] if row else None
+
+
+def finish_chunks(conn: sqlite3.Connection, task: str):
+    """Forget a copy_in_chunks task's position; call inside the transaction that completes it"""
+    if chunk_progress(conn, task) is not None:
+        conn.execute("DELETE FROM schema_migration_progress WHERE task = ?", (task,))
+
+
+def copy_in_chunks(conn: sqlite3.Connection, task: str, source: str, target: str, select: str,
+                   chunk_size: int = MIGRATION_CHUNK_SIZE,
+                   progress: Optional[ProgressCallback] = None,
+                   description: Optional[str] = None) -> int:
+    """
+    Copy rows from source to target in ascending id order, one short transaction per chunk
+    
+    The last copied id is committed with each chunk, so an interrupted copy
+    resumes where it stopped. Rows already in target are kept (INSERT OR
+    IGNORE): triggers that mirror concurrent writes into target hold newer
+    versions than the source rows still waiting to be copied.
+    
+    Args:
+        conn: The database connection (not inside a transaction)
+        task: Name under which the position is recorded
+        source: Table to copy from; must have an integer id column
+        target: Table to copy into
+        select: Column list selected from source, in target's column order
+        chunk_size: Rows per transaction
+        progress: Optional callback(description, done, total)
+        description: Label passed to progress (default: task)
+    
+    Returns:
+        The number of source rows processed by this call
+    """
+    _ensure_progress_table(conn)
+    conn.commit()
+    last_id = chunk_progress(conn, task) or 0
+    total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE id > ?", (last_id,)).fetchone()[0]
+    copied = 0
+    while True:
+        _begin(conn)
+        try:
+            upper, count = conn.execute(f"""
+                SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {source} WHERE id > ? ORDER BY id LIMIT ?)
+            """, (last_id, chunk_size)).fetchone()
+            if upper is None:
+                conn.commit()
+                return copied
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {target}
+                SELECT {select} FROM {source} WHERE id > ? AND id <= ?
+            """, (last_id, upper))
+            conn.execute("INSERT OR REPLACE INTO schema_migration_progress (task, last_id) VALUES (?, ?)",
+                         (task, upper))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        copied += count
+        last_id = upper
+        if progress:
+            progress(description or task, min(copied, total), total)
@@ -0,0 +1,419 @@
+"""
+Report module for Daily Settlement Ledger
+Aggregates the ledger over date or id-range partitions in parallel worker processes,
+and streams print-ready end-of-day reports
+"""
+import csv
+import html
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional, TextIO, Tuple, Union
+
+from database import (SettlementLedgerDB, LedgerQuery, AMOUNT_COLUMNS, MONEY_CENTS, CENTS_PER_PESO,
+                      MANILA_TZ, SQLITE_TIMESTAMP_FORMAT, DateLike, _compile_conditions,
+                      _parse_date_text, _seller_sum_sql, _to_utc_timestamp)
+
+
+PARTITION_KINDS = ("day", "month", "id")
+
+# Id ranges per worker; more, smaller ranges keep every worker busy when
+# some ranges hold more matching rows than others
+ID_PARTITIONS_PER_WORKER = 4
+
+# Layout of an aggregate row: COUNT(*), the SUM and COUNT of each amount
+# column, then the seller sum and the balance delta
+_SUMS = slice(1, 1 + len(AMOUNT_COLUMNS))
+_PRESENT = slice(_SUMS.stop, _SUMS.stop + len(AMOUNT_COLUMNS))
+_SELLER_TOTAL = _PRESENT.stop
+_BALANCE_DELTA = _SELLER_TOTAL + 1
+
+# Read-only connections opened by a worker process, keyed by database URI
+_worker_connections = {}
+
+
+def _aggregate_sql(partition_condition: str, conditions: str) -> str:
+    """Build the aggregate query for one partition plus the report filter"""
+    sums = ", ".join(f"SUM({column})" for column in AMOUNT_COLUMNS)
+    present = ", ".join(f"COUNT({column})" for column in AMOUNT_COLUMNS)
+    where = " AND ".join(condition for condition in (partition_condition, conditions) if condition)
+    # today_balance - previous_balance is NULL unless both are set, so SUM skips those rows
+    return f"""
+        SELECT COUNT(*), {sums}, {present},
+               SUM({_seller_sum_sql("")}),
+               SUM(today_balance - previous_balance)
+        FROM settlement_ledger
+        WHERE {where}
+    """
+
+
+def _read_only_uri(db_path: str) -> str:
+    """An SQLite URI opening the database file read-only"""
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+def _aggregate_partition(task: Tuple[str, str, List]) -> Tuple:
+    """Worker: run one partition's aggregate on this process's read-only connection"""
+    uri, sql, params = task
+    conn = _worker_connections.get(uri)
+    if conn is None:
+        conn = _worker_connections[uri] = sqlite3.connect(uri, uri=True)
+    return conn.execute(sql, params).fetchone()
+
+
+def _add(total, value):
+    """Add two SQL sums where None means no values"""
+    if value is None:
+        return total
+    return value if total is None else total + value
+
+
+def _merge(rows: List[Tuple]) -> List:
+    """Merge partition aggregate rows column by column"""
+    merged = [0] + [None] * len(AMOUNT_COLUMNS) + [0] * len(AMOUNT_COLUMNS) + [None, None]
+    for row in rows:
+        merged = [_add(total, value) for total, value in zip(merged, row)]
+    return merged
+
+
+def _to_record(label: str, row, money_storage: str) -> dict:
+    """Convert an aggregate row to a report record with amounts in pesos"""
+    def money(amount):
+        if amount is None or money_storage != MONEY_CENTS:
+            return amount
+        return amount / CENTS_PER_PESO
+    
+    count = row[0]
+    record = {
+        "partition": label,
+        "count": count,
+        "seller_total": money(row[_SELLER_TOTAL]),
+        "balance_delta": money(row[_BALANCE_DELTA]),
+    }
+    for column, total in zip(AMOUNT_COLUMNS, row[_SUMS]):
+        record[column] = money(total)
+    for column, present in zip(AMOUNT_COLUMNS, row[_PRESENT]):
+        record[f"{column}_null_rate"] = round((count - present) / count, 4) if count else None
+    return record
+
+
+def _manila_date(timestamp: str) -> date:
+    """The Manila calendar day of a UTC created_at/updated_at value"""
+    value = datetime.strptime(timestamp, SQLITE_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    return value.astimezone(MANILA_TZ).date()
+
+
+def _as_date(value: DateLike) -> date:
+    if isinstance(value, str):
+        value = _parse_date_text(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def date_partitions(start: DateLike, end: DateLike, period: str = "month") -> List[Tuple[str, str, str]]:
+    """
+    Split the Manila calendar days from start to end (inclusive) into days or months
+    
+    Returns:
+        (label, utc_start, utc_end) tuples; each is a half-open created_at range
+    """
+    day, end = _as_date(start), _as_date(end)
+    partitions = []
+    while day <= end:
+        if period == "day":
+            last = day
+            label = day.strftime("%Y-%m-%d")
+        else:
+            next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+            last = min(next_month - timedelta(days=1), end)
+            label = day.strftime("%Y-%m")
+        partitions.append((label, _to_utc_timestamp(day), _to_utc_timestamp(last, end=True)))
+        day = last + timedelta(days=1)
+    return partitions
+
+
+def id_partitions(low: int, high: int, count: int) -> List[Tuple[str, int, int]]:
+    """
+    Split the ids low..high (inclusive) into at most count equal ranges
+    
+    Returns:
+        (label, first_id, last_id) tuples
+    """
+    size = max(1, -(-(high - low + 1) // max(1, count)))
+    return [(f"{first}-{min(first + size - 1, high)}", first, min(first + size - 1, high))
+            for first in range(low, high + 1, size)]
+
+
+def run_report(db: SettlementLedgerDB, query: Optional[LedgerQuery] = None, by: str = "month",
+               start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+               workers: Optional[int] = None, partitions: Optional[int] = None) -> dict:
+    """
+    Aggregate the ledger per partition in parallel worker processes
+    
+    Each worker process opens its own read-only connection to the database
+    file, so partitions are scanned concurrently; the partial sums are then
+    merged here. In cents mode the sums stay exact integers until the end.
+    
+    Args:
+        db: The ledger; supplies the file path, money mode and partition bounds
+        query: Optional filter applied within every partition (its sort order is ignored)
+        by: "day" or "month" (Manila created_at dates) or "id" (equal id ranges)
+        start: First day for date partitions (default: the oldest entry's day)
+        end: Last day for date partitions (default: the newest entry's day)
+        workers: Number of worker processes (default: CPU count); 1 runs in this process
+        partitions: Number of id ranges (default: ID_PARTITIONS_PER_WORKER per worker)
+    
+    Returns:
+        {"partitions": [record, ...], "total": record}. Records hold the entry
+        count, the sum of each amount column, seller_total, balance_delta
+        (today_balance - previous_balance where both are set) and the NULL rate
+        of each amount column.
+    """
+    if by not in PARTITION_KINDS:
+        raise ValueError(f"Unknown partition kind: {by}")
+    workers = max(1, workers or os.cpu_count() or 1)
+    db._check_schema()
+    query = query or LedgerQuery()
+    conditions = _compile_conditions(query.shape())
+    params = query.parameters(db._to_storage)
+    
+    if by == "id":
+        db.cursor.execute("SELECT MIN(id), MAX(id) FROM settlement_ledger")
+        low, high = db.cursor.fetchone()
+        count = partitions or workers * ID_PARTITIONS_PER_WORKER
+        bounds = id_partitions(low, high, count) if low is not None else []
+        sql = _aggregate_sql("id >= ? AND id <= ?", conditions)
+    else:
+        if start is None or end is None:
+            db.cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM settlement_ledger")
+            oldest, newest = db.cursor.fetchone()
+            if oldest is None:
+                return {"partitions": [], "total": _to_record("TOTAL", _merge([]), db.money_storage)}
+            start = start if start is not None else _manila_date(oldest)
+            end = end if end is not None else _manila_date(newest)
+        bounds = date_partitions(start, end, by)
+        sql = _aggregate_sql("created_at >= ? AND created_at < ?", conditions)
+    
+    uri = _read_only_uri(db.db_path)
+    tasks = [(uri, sql, [first, last] + params) for _, first, last in bounds]
+    if workers == 1 or len(tasks) <= 1:
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            rows = [conn.execute(task_sql, task_params).fetchone() for _, task_sql, task_params in tasks]
+        finally:
+            conn.close()
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            rows = list(pool.map(_aggregate_partition, tasks))
+    
+    return {
+        "partitions": [_to_record(label, row, db.money_storage) for (label, _, _), row in zip(bounds, rows)],
+        "total": _to_record("TOTAL", _merge(rows), db.money_storage),
+    }
+
+
+# End-of-day report (write_day_report): entries per printed page, and rows
+# fetched from the cursor at a time. Memory use depends on these only, not
+# on the number of entries in the report
+REPORT_PAGE_ROWS = 40
+REPORT_FETCH_ROWS = 5000
+REPORT_TITLE = "Daily Settlement Report"
+REPORT_AMOUNT_HEADINGS = ("Prev Balance", "Prev Total", "Seller 1", "Seller 2",
+                          "Seller 3", "Seller 4", "Today Total", "Today Balance")
+
+_REPORT_CSS = """
+@page { size: A4 landscape; margin: 10mm; }
+body { font: 9pt sans-serif; margin: 0; }
+section.page { break-after: page; padding: 4mm 0; }
+section.page:last-of-type { break-after: auto; }
+header { display: flex; justify-content: space-between; align-items: baseline; }
+h1 { font-size: 13pt; margin: 0 0 2mm; }
+table { width: 100%; border-collapse: collapse; }
+th, td { padding: 1px 4px; border-bottom: 1px solid #ccc; white-space: nowrap; }
+th { text-align: left; border-bottom: 2px solid #000; }
+.num { text-align: right; font-variant-numeric: tabular-nums; }
+tfoot td { font-weight: bold; border-top: 2px solid #000; border-bottom: none; }
+tr.total td { border-top: 3px double #000; }
+"""
+
+
+def _add_amounts(totals: List, amounts) -> None:
+    """Add a row's amounts to running totals in place (None means no values yet)"""
+    for i, amount in enumerate(amounts):
+        if amount is not None:
+            totals[i] = amount if totals[i] is None else totals[i] + amount
+
+
+class _HtmlReport:
+    """Writes one HTML section per printed page; the browser's print view paginates on them"""
+    
+    def __init__(self, out: TextIO, title: str, period: str, money):
+        self.out = out
+        self.title = html.escape(title)
+        self.period = html.escape(period)
+        self.money = money
+        headings = ["Date (PH time)", "ID", "Name"] + list(REPORT_AMOUNT_HEADINGS)
+        self.head = "<thead><tr>" + "".join(
+            f'<th class="num">{heading}</th>' if heading in REPORT_AMOUNT_HEADINGS or heading == "ID"
+            else f"<th>{heading}</th>" for heading in headings) + "</tr></thead>"
+        # One template per row: formatting a row is then a single str.format call
+        self.amount_cells = '<td class="num">{}</td>' * len(AMOUNT_COLUMNS)
+        self.row = '<tr><td>{}</td><td class="num">{}</td><td>{}</td>' + self.amount_cells + "</tr>\n"
+    
+    def begin(self):
+        self.out.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{self.title} {self.period}</title>'
+                       f"<style>{_REPORT_CSS}</style></head><body>\n")
+    
+    def _amount_cells(self, amounts) -> str:
+        return self.amount_cells.format(*map(self.money, amounts))
+    
+    def page(self, number: int, rows: List[Tuple], subtotals: List, grand: Optional[Tuple] = None):
+        escape, money, template, cells = html.escape, self.money, self.row.format, self._amount_cells
+        parts = [f"<section class=\"page\"><header><h1>{self.title}</h1>"
+                 f"<span>{self.period} &middot; Page {number}</span></header><table>{self.head}<tbody>\n"]
+        parts.extend(template(row[0], row[1], escape(row[2]), *map(money, row[3:])) for row in rows)
+        if not rows:
+            parts.append(f'<tr><td colspan="{3 + len(AMOUNT_COLUMNS)}">No entries</td></tr>\n')
+        parts.append(f'</tbody><tfoot><tr><td colspan="3">Page {number} subtotal ({len(rows)} entries)</td>'
+                     f"{cells(subtotals)}</tr>")
+        if grand is not None:
+            count, totals = grand
+            parts.append(f'<tr class="total"><td colspan="3">Grand total ({count} entries)</td>{cells(totals)}</tr>')
+        parts.append("</tfoot></table></section>\n")
+        self.out.write("".join(parts))
+    
+    def finish(self):
+        self.out.write("</body></html>\n")
+
+
+class _CsvReport:
+    """Writes entry rows, a subtotal row after each page and a final total row"""
+    
+    def __init__(self, out: TextIO, money):
+        self.writer = csv.writer(out)
+        self.money = money
+    
+    def begin(self):
+        self.writer.writerow(("page", "row", "id", "created_at_ph", "name") + AMOUNT_COLUMNS)
+    
+    def page(self, number: int, rows: List[Tuple], subtotals: List, grand: Optional[Tuple] = None):
+        money = self.money
+        self.writer.writerows((number, "entry", row[1], row[0], row[2], *map(money, row[3:])) for row in rows)
+        self.writer.writerow((number, "subtotal", "", "", f"Page {number} ({len(rows)} entries)",
+                              *map(money, subtotals)))
+        if grand is not None:
+            count, totals = grand
+            self.writer.writerow(("", "total", "", "", f"Grand total ({count} entries)", *map(money, totals)))
+    
+    def finish(self):
+        pass
+
+
+def _money_formatter(money_storage: str, thousands: bool):
+    """A function formatting a stored amount (or sum) as pesos with 2 decimals; None gives ''"""
+    scale = CENTS_PER_PESO if money_storage == MONEY_CENTS else 1
+    spec = ",.2f" if thousands else ".2f"
+    
+    def money(amount):
+        return "" if amount is None else format(amount / scale, spec)
+    return money
+
+
+def write_day_report(db: SettlementLedgerDB, start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+                     html_out: Union[str, TextIO, None] = None, csv_out: Union[str, TextIO, None] = None,
+                     query: Optional[LedgerQuery] = None, page_rows: int = REPORT_PAGE_ROWS,
+                     title: str = REPORT_TITLE) -> dict:
+    """
+    Write the entries of a range of PH days as a paginated, print-ready report
+    
+    Entries are read in created_at order from one cursor, REPORT_FETCH_ROWS
+    at a time, and written a page at a time, so memory use stays the same
+    for any number of entries. Every page ends with its subtotals and the
+    last page also carries the grand totals, all computed in the same pass
+    (exactly, in cents mode). HTML and CSV can be written together.
+    
+    Args:
+        db: The ledger
+        start: First PH day (default: today)
+        end: Last PH day (default: start)
+        html_out: HTML file path or text stream; each page is a section that
+                  prints on its own sheet
+        csv_out: CSV file path or text stream
+        query: Optional further filter, e.g. a name (its sort order is ignored)
+        page_rows: Entries per page
+        title: Heading printed on every page
+    
+    Returns:
+        {"entries": count, "pages": count, "totals": {column: pesos}}
+    """
+    if html_out is None and csv_out is None:
+        raise ValueError("Give an HTML or CSV output (or both)")
+    if page_rows < 1:
+        raise ValueError("page_rows must be at least 1")
+    start = _as_date(start) if start is not None else datetime.now(MANILA_TZ).date()
+    end = _as_date(end) if end is not None else start
+    if end < start:
+        raise ValueError("The report ends before it starts")
+    period = start.isoformat() if end == start else f"{start.isoformat()} to {end.isoformat()}"
+    
+    db._check_schema()
+    query = query or LedgerQuery()
+    conditions = _compile_conditions(query.shape())
+    # The created_at index returns the rows in (created_at, id) order without sorting
+    sql = f"""
+        SELECT strftime('%Y-%m-%d %H:%M', created_at, '+8 hours'), id, name, {", ".join(AMOUNT_COLUMNS)}
+        FROM settlement_ledger
+        WHERE created_at >= ? AND created_at < ?{" AND " + conditions if conditions else ""}
+        ORDER BY created_at, id
+    """
+    params = [_to_utc_timestamp(start), _to_utc_timestamp(end, end=True)] + query.parameters(db._to_storage)
+    
+    with ExitStack() as stack:
+        def stream(target, **options):
+            if isinstance(target, str):
+                return stack.enter_context(open(target, "w", encoding="utf-8", **options))
+            return target
+        
+        writers = []
+        if html_out is not None:
+            writers.append(_HtmlReport(stream(html_out), title, period,
+                                       _money_formatter(db.money_storage, thousands=True)))
+        if csv_out is not None:
+            writers.append(_CsvReport(stream(csv_out, newline=""),
+                                      _money_formatter(db.money_storage, thousands=False)))
+        for writer in writers:
+            writer.begin()
+        
+        cursor = db.conn.execute(sql, params)
+        stack.callback(cursor.close)
+        count = pages = 0
+        grand = [None] * len(AMOUNT_COLUMNS)
+        page, subtotals = [], [None] * len(AMOUNT_COLUMNS)
+        while True:
+            rows = cursor.fetchmany(REPORT_FETCH_ROWS)
+            for row in rows:
+                if len(page) == page_rows:
+                    # A full page is written once the next row shows it is not the last
+                    for writer in writers:
+                        writer.page(pages, page, subtotals)
+                    _add_amounts(grand, subtotals)
+                    page, subtotals = [], [None] * len(AMOUNT_COLUMNS)
+                if not page:
+                    pages += 1
+                page.append(row)
+                _add_amounts(subtotals, row[3:])
+            count += len(rows)
+            if len(rows) < REPORT_FETCH_ROWS:
+                break
+        _add_amounts(grand, subtotals)
+        pages = max(pages, 1)
+        for writer in writers:
+            writer.page(pages, page, subtotals, (count, grand))
+            writer.finish()
+    
+    scale = CENTS_PER_PESO if db.money_storage == MONEY_CENTS else 1
+    return {"entries": count, "pages": pages,
+            "totals": {column: None if total is None else total / scale
+                       for column, total in zip(AMOUNT_COLUMNS, grand)}}
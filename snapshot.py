@@ -0,0 +1,331 @@
+"""
+Snapshot module for Daily Settlement Ledger
+Columnar binary snapshots of the ledger and online backups of the database file
+"""
+import mmap
+import sqlite3
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
+
+from database import (SettlementLedgerDB, AMOUNT_COLUMNS, TIMESTAMP_COLUMNS, ENTRY_COLUMNS,
+                      MONEY_REAL, MONEY_CENTS, CENTS_PER_PESO, SQLITE_TIMESTAMP_FORMAT)
+
+
+# File layout (all sections 8-byte aligned):
+#   header     magic, byte order, money mode, section count, row count
+#   directory  one entry per section: key, array typecode, offset/length of
+#              the values and of the null bitmap (bit set = NULL; 0/0 if none)
+#   sections   raw array data in the byte order named in the header
+# Names are stored once in a string table ("name.offsets" into the UTF-8
+# "name.text") and referenced per row by an int32 index ("name").
+# Timestamps are int64 seconds since the Unix epoch (UTC).
+SNAPSHOT_MAGIC = b"SLSNAP\x00\x01"
+_HEADER = struct.Struct("<8sBBHQ")
+_SECTION = struct.Struct("<24ssxxxxxxxQQQQ")
+_BYTE_ORDERS = ("little", "big")
+_MONEY_MODES = (MONEY_REAL, MONEY_CENTS)
+
+# Pages copied per backup step; between steps other connections may write
+BACKUP_PAGES_PER_STEP = 1024
+
+_SNAPSHOT_SELECT = f"""
+    SELECT id, name, {", ".join(AMOUNT_COLUMNS)},
+           CAST(strftime('%s', created_at) AS INTEGER),
+           CAST(strftime('%s', updated_at) AS INTEGER)
+    FROM settlement_ledger
+    ORDER BY id
+"""
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _set_null(bitmap: bytearray, row: int):
+    bitmap[row >> 3] |= 1 << (row & 7)
+
+
+def export_snapshot(db: SettlementLedgerDB, path: str) -> int:
+    """
+    Write every entry to a columnar snapshot file
+    
+    The rows come from a single SELECT, so the snapshot is consistent even
+    while other connections write. Amounts are written in the ledger's
+    storage form: float64 pesos (REAL mode) or int64 centavos (cents mode).
+    
+    Args:
+        db: The ledger to export
+        path: Snapshot file to create (overwritten if it exists)
+    
+    Returns:
+        The number of entries written
+    """
+    db._require_file("export_snapshot()")
+    db._check_schema()
+    amount_code = "q" if db.money_storage == MONEY_CENTS else "d"
+    ids = array("q")
+    name_rows = array("i")
+    name_index = {}
+    values = {column: array(amount_code) for column in AMOUNT_COLUMNS}
+    values.update({column: array("q") for column in TIMESTAMP_COLUMNS})
+    nulls = {column: bytearray() for column in AMOUNT_COLUMNS + TIMESTAMP_COLUMNS}
+    value_columns = AMOUNT_COLUMNS + TIMESTAMP_COLUMNS
+    
+    cursor = db.conn.execute(_SNAPSHOT_SELECT)
+    count = 0
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            break
+        for row in rows:
+            if count & 7 == 0:
+                for bitmap in nulls.values():
+                    bitmap.append(0)
+            ids.append(row[0])
+            index = name_index.get(row[1])
+            if index is None:
+                index = name_index[row[1]] = len(name_index)
+            name_rows.append(index)
+            for column, value in zip(value_columns, row[2:]):
+                if value is None:
+                    _set_null(nulls[column], count)
+                    value = 0
+                values[column].append(value)
+            count += 1
+    cursor.close()
+    
+    text = bytearray()
+    name_offsets = array("q", [0])
+    for name in name_index:
+        text += name.encode("utf-8")
+        name_offsets.append(len(text))
+    
+    # (key, typecode, data, null bitmap)
+    sections = [("id", "q", ids.tobytes(), b""),
+                ("name", "i", name_rows.tobytes(), b""),
+                ("name.offsets", "q", name_offsets.tobytes(), b""),
+                ("name.text", "B", bytes(text), b"")]
+    sections += [(column, values[column].typecode, values[column].tobytes(), bytes(nulls[column]))
+                 for column in value_columns]
+    
+    offset = _align(_HEADER.size + _SECTION.size * len(sections))
+    directory = []
+    for key, typecode, data, bitmap in sections:
+        data_offset = offset
+        null_offset = _align(data_offset + len(data)) if bitmap else 0
+        offset = _align((null_offset or data_offset) + len(bitmap or data))
+        directory.append((key, typecode, data, bitmap, data_offset, null_offset))
+    
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, _BYTE_ORDERS.index(sys.byteorder),
+                             _MONEY_MODES.index(db.money_storage), len(sections), count))
+        for key, typecode, data, bitmap, data_offset, null_offset in directory:
+            f.write(_SECTION.pack(key.encode("ascii"), typecode.encode("ascii"),
+                                  data_offset, len(data), null_offset, len(bitmap)))
+        for key, typecode, data, bitmap, data_offset, null_offset in directory:
+            f.write(b"\0" * (data_offset - f.tell()))
+            f.write(data)
+            if bitmap:
+                f.write(b"\0" * (null_offset - f.tell()))
+                f.write(bitmap)
+    return count
+
+
+class Snapshot:
+    """
+    A memory-mapped snapshot file
+    
+    column() and nulls() return memoryviews straight into the mapping, so
+    reading a column copies nothing. Release those views before close().
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Empty snapshot file: {path}")
+        self._view = memoryview(self._map)
+        try:
+            magic, byte_order, money_mode, section_count, self.row_count = _HEADER.unpack_from(self._map)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a ledger snapshot: {path}")
+            self.byte_order = _BYTE_ORDERS[byte_order]
+            self.money_storage = _MONEY_MODES[money_mode]
+            self._sections = {}
+            for i in range(section_count):
+                key, typecode, *location = _SECTION.unpack_from(self._map, _HEADER.size + i * _SECTION.size)
+                self._sections[key.rstrip(b"\0").decode("ascii")] = (typecode.decode("ascii"), *location)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            self.close()
+            raise ValueError(f"Corrupt snapshot file: {path}")
+        except ValueError:
+            self.close()
+            raise
+        self._names = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def __len__(self):
+        return self.row_count
+    
+    def column(self, key: str):
+        """
+        The values of a section as a typed memoryview (no copy)
+        
+        Amounts are in storage form (see money_storage) and NULLs read as 0;
+        check nulls(). Snapshots written on a machine of the other byte order
+        are converted into a copy.
+        """
+        typecode, offset, length, _, _ = self._section(key)
+        view = self._view[offset:offset + length]
+        if self.byte_order == sys.byteorder or typecode == "B":
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        view.release()
+        values.byteswap()
+        return memoryview(values)
+    
+    def nulls(self, key: str):
+        """The NULL bitmap of a section (bit i of byte i // 8 set = row i is NULL), or None"""
+        _, _, _, offset, length = self._section(key)
+        return self._view[offset:offset + length] if length else None
+    
+    def is_null(self, key: str, row: int) -> bool:
+        bitmap = self.nulls(key)
+        return bool(bitmap is not None and bitmap[row >> 3] & (1 << (row & 7)))
+    
+    def _section(self, key: str) -> Tuple:
+        try:
+            return self._sections[key]
+        except KeyError:
+            raise KeyError(f"No such snapshot column: {key}")
+    
+    @property
+    def names(self) -> list:
+        """The string table: distinct names in first-seen order"""
+        if self._names is None:
+            offsets = self.column("name.offsets")
+            text = self.column("name.text")
+            self._names = [bytes(text[offsets[i]:offsets[i + 1]]).decode("utf-8")
+                           for i in range(len(offsets) - 1)]
+            offsets.release()
+            text.release()
+        return self._names
+    
+    def raw_rows(self) -> Iterator[Tuple]:
+        """
+        Yield rows in storage form: (id, name, amounts..., created_at, updated_at)
+        with timestamps as epoch seconds
+        """
+        names = self.names
+        columns = [self.column(key) for key in ENTRY_COLUMNS]
+        bitmaps = [self.nulls(key) for key in ENTRY_COLUMNS]
+        try:
+            for row in range(self.row_count):
+                byte, bit = row >> 3, 1 << (row & 7)
+                values = [None if bitmap is not None and bitmap[byte] & bit else column[row]
+                          for column, bitmap in zip(columns, bitmaps)]
+                values[1] = names[values[1]]
+                yield tuple(values)
+        finally:
+            for view in columns + [bitmap for bitmap in bitmaps if bitmap is not None]:
+                view.release()
+    
+    def entries(self) -> Iterator[Tuple]:
+        """Yield entry tuples in the same form as SettlementLedgerDB.get_entry"""
+        cents = self.money_storage == MONEY_CENTS
+        for row in self.raw_rows():
+            amounts = row[2:10]
+            if cents:
+                amounts = tuple(None if value is None else value / CENTS_PER_PESO for value in amounts)
+            timestamps = tuple(None if value is None else
+                               datetime.fromtimestamp(value, timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+                               for value in row[10:])
+            yield row[:2] + amounts + timestamps
+    
+    def close(self):
+        """Unmap the file"""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self._map.close()
+            self._file.close()
+
+
+def import_snapshot(db: SettlementLedgerDB, path: str, replace: bool = False) -> int:
+    """
+    Load a snapshot into the ledger, keeping ids and timestamps
+    
+    Runs in one transaction. Amounts are converted when the snapshot and the
+    ledger use different money storage modes.
+    
+    Args:
+        db: The ledger to load into
+        path: Snapshot file
+        replace: Delete every existing entry first; otherwise an id that
+                 already exists aborts the import
+    
+    Returns:
+        The number of entries imported
+    """
+    db._require_file("import_snapshot()")
+    with Snapshot(path) as snapshot:
+        if snapshot.money_storage == db.money_storage:
+            def convert(amount):
+                return amount
+        elif snapshot.money_storage == MONEY_CENTS:
+            def convert(amount):
+                return None if amount is None else amount / CENTS_PER_PESO
+        else:
+            convert = db._to_storage
+        
+        raw_rows = snapshot.raw_rows()
+        rows = (row[:2] + tuple(convert(value) for value in row[2:10]) + row[10:]
+                for row in raw_rows)
+        columns = ", ".join(ENTRY_COLUMNS)
+        placeholders = ", ".join(["?"] * (len(ENTRY_COLUMNS) - 2) + ["datetime(?, 'unixepoch')"] * 2)
+        try:
+            with db.transaction():
+                if replace:
+                    db.cursor.execute("DELETE FROM settlement_ledger")
+                db.cursor.executemany(
+                    f"INSERT INTO settlement_ledger ({columns}) VALUES ({placeholders})", rows)
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Snapshot conflicts with existing entries: {e}")
+        finally:
+            # Release the column views before the snapshot is unmapped
+            raw_rows.close()
+        return snapshot.row_count
+
+
+def backup_database(db: SettlementLedgerDB, path: str,
+                    pages: int = BACKUP_PAGES_PER_STEP, progress=None) -> None:
+    """
+    Copy the database file with SQLite's online backup API
+    
+    The copy is consistent even if other connections write meanwhile (the
+    backup restarts when the source changes under it). Copying in steps of
+    `pages` pages lets writers in between.
+    
+    Args:
+        db: The ledger to copy
+        path: Destination file (overwritten)
+        pages: Pages copied per step (-1 copies everything in one step)
+        progress: Optional callback(status, remaining, total) after each step
+    """
+    db._require_file("backup_database()")
+    target = sqlite3.connect(path)
+    try:
+        db.conn.backup(target, pages=pages, progress=progress, sleep=0.005)
+    finally:
+        target.close()
@@ -0,0 +1,309 @@
+"""
+Sync module for Daily Settlement Ledger
+Exchanges changesets between offline ledger stations
+"""
+import gzip
+import json
+import sqlite3
+from typing import Optional
+
+from database import SettlementLedgerDB, AMOUNT_COLUMNS, SELLER_COLUMNS
+
+
+# A changeset holds the latest state of every entry changed on the sending
+# station since a sequence number (the sync token): one row per entry, in
+# CHANGE_COLUMNS order, with amounts in pesos so stations may use different
+# money storage modes. Deleted entries are sent as tombstones. "sellers"
+# lists sellers 5 and up as [seller_no, amount] pairs, or is null when the
+# sender has no seller table (version 1 changesets do not have it).
+CHANGESET_FORMAT = "settlement-ledger-changeset"
+CHANGESET_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+CHANGE_COLUMNS = ("uid", "origin", "changed_at", "deleted", "name") + AMOUNT_COLUMNS + ("created_at", "sellers")
+
+# Changes applied per transaction
+SYNC_BATCH_SIZE = 500
+
+_NEXT_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM sync_row)"
+
+
+def _require_sync(db: SettlementLedgerDB):
+    if db.working_set_days is not None:
+        raise ValueError("Sync needs the ledger file; open it without a working set")
+    if not db.sync_enabled:
+        raise ValueError("Sync is not enabled for this ledger")
+
+
+def _peer_tokens(db: SettlementLedgerDB, station: str):
+    db.cursor.execute("SELECT received_seq, sent_seq FROM sync_peer WHERE station = ?", (station,))
+    return db.cursor.fetchone() or (0, 0)
+
+
+def sync_token(db: SettlementLedgerDB, station: str) -> int:
+    """The sequence number up to which changes from station have been applied here (0 if none)"""
+    _require_sync(db)
+    return _peer_tokens(db, station)[0]
+
+
+def sent_token(db: SettlementLedgerDB, station: str) -> int:
+    """The sequence number up to which changes were last exported for station (see mark_sent)"""
+    _require_sync(db)
+    return _peer_tokens(db, station)[1]
+
+
+def _save_token(db: SettlementLedgerDB, station: str, column: str, seq: int):
+    db.cursor.execute("INSERT OR IGNORE INTO sync_peer (station) VALUES (?)", (station,))
+    db.cursor.execute(f"UPDATE sync_peer SET {column} = MAX({column}, ?) WHERE station = ?", (seq, station))
+
+
+def mark_sent(db: SettlementLedgerDB, station: str, until: int):
+    """Remember that changes up to until were exported for station"""
+    _require_sync(db)
+    with db.transaction():
+        _save_token(db, station, "sent_seq", until)
+
+
+def export_changes(db: SettlementLedgerDB, since: int = 0, exclude_origin: Optional[str] = None) -> dict:
+    """
+    Collect the entries changed on this ledger after the sync token since
+    
+    Reads sync_row through its seq index, so the cost follows the number of
+    changed entries, not the size of the ledger. An entry changed several
+    times is sent once, in its latest state, with its sellers 5 and up if
+    the seller table is enabled.
+    
+    Args:
+        db: The ledger to export from
+        since: Sync token; only changes with a higher sequence number are included
+        exclude_origin: Leave out changes that came from this station (the
+                        receiver), which it already has
+    
+    Returns:
+        A changeset dict; its "until" is the token for the next export
+    """
+    _require_sync(db)
+    db._check_schema()
+    db.cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_row")
+    until = max(db.cursor.fetchone()[0], since)
+    amounts = ", ".join(f"entry.{column}" for column in AMOUNT_COLUMNS)
+    sellers = f"""(
+        SELECT json_group_array(json_array(seller_no, amount)) FROM settlement_seller
+        WHERE entry_id = entry.id AND seller_no > {len(SELLER_COLUMNS)}
+    )""" if db.seller_table else "NULL"
+    # Changes made after reading until get a higher seq and go with the next export
+    db.cursor.execute(f"""
+        SELECT row.uid, row.origin, row.changed_at, row.deleted, entry.name, {amounts}, entry.created_at,
+               CASE WHEN entry.id IS NOT NULL THEN {sellers} END
+        FROM sync_row AS row
+        LEFT JOIN settlement_ledger AS entry ON entry.id = row.entry_id
+        WHERE row.seq > ? AND row.seq <= ? AND row.origin IS NOT ?
+        ORDER BY row.seq
+    """, (since, until, exclude_origin))
+    changes = []
+    for row in db.cursor.fetchall():
+        change = list(row)
+        change[5:13] = [db._from_storage(amount) for amount in change[5:13]]
+        if change[14] is not None:
+            change[14] = [[seller_no, db._from_storage(amount)] for seller_no, amount in json.loads(change[14])]
+        changes.append(change)
+    return {
+        "format": CHANGESET_FORMAT,
+        "version": CHANGESET_VERSION,
+        "station": db.sync_station,
+        "since": since,
+        "until": until,
+        "columns": list(CHANGE_COLUMNS),
+        "changes": changes,
+    }
+
+
+def write_changeset(changeset: dict, path: str):
+    """Write a changeset as gzip-compressed JSON"""
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(changeset, f, separators=(",", ":"))
+
+
+def read_changeset(path: str) -> dict:
+    """Read a changeset written by write_changeset"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            changeset = json.load(f)
+    except (OSError, EOFError, ValueError) as e:
+        raise ValueError(f"Not a ledger changeset: {path} ({e})")
+    if not isinstance(changeset, dict) or changeset.get("format") != CHANGESET_FORMAT:
+        raise ValueError(f"Not a ledger changeset: {path}")
+    if changeset.get("version") not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported changeset version {changeset.get('version')}: {path}")
+    return changeset
+
+
+def _newer(change: dict, local) -> bool:
+    """Last writer wins: compare (changed_at, origin), so every station picks the same version"""
+    return local is None or (change["changed_at"], change["origin"]) > (local[3], local[2])
+
+
+def _apply_sellers(db: SettlementLedgerDB, entry_id: int, sellers):
+    """Replace an entry's sellers 5 and up; kept only where the seller table is enabled"""
+    if sellers is None or not db.seller_table:
+        return
+    db.cursor.execute("DELETE FROM settlement_seller WHERE entry_id = ? AND seller_no > ?",
+                      (entry_id, len(SELLER_COLUMNS)))
+    db.cursor.executemany("INSERT INTO settlement_seller (entry_id, seller_no, amount) VALUES (?, ?, ?)",
+                          [(entry_id, seller_no, db._to_storage(amount)) for seller_no, amount in sellers])
+
+
+def _apply_change(db: SettlementLedgerDB, change: dict) -> bool:
+    """
+    Apply one change if it is newer than the local version; returns whether it was applied
+    
+    Raises:
+        sqlite3.IntegrityError: The change breaks a constraint here (e.g. the natural key)
+    """
+    cursor = db.cursor
+    cursor.execute("SELECT row_no, entry_id, origin, changed_at FROM sync_row WHERE uid = ?", (change["uid"],))
+    local = cursor.fetchone()
+    if not _newer(change, local):
+        return False
+    
+    # The sync triggers stamp each write below with this station; the final
+    # UPDATE puts back the origin and time of the change being applied
+    if change["deleted"]:
+        if local is None:
+            cursor.execute(f"""
+                INSERT INTO sync_row (uid, entry_id, origin, changed_at, deleted, seq)
+                VALUES (?, NULL, ?, ?, 1, {_NEXT_SEQ})
+            """, (change["uid"], change["origin"], change["changed_at"]))
+            return True
+        if local[1] is not None:
+            cursor.execute("DELETE FROM settlement_ledger WHERE id = ?", (local[1],))
+    else:
+        values = (change["name"],) + db._entry_to_storage(tuple(change[column] for column in AMOUNT_COLUMNS))
+        if local is not None and local[1] is not None:
+            entry_id = local[1]
+            assignments = ", ".join(f"{column} = ?" for column in ("name",) + AMOUNT_COLUMNS)
+            cursor.execute(f"""
+                UPDATE settlement_ledger
+                SET {assignments}, created_at = COALESCE(?, created_at), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, values + (change["created_at"], entry_id))
+        else:
+            placeholders = ", ".join(["?"] * len(values))
+            cursor.execute(f"""
+                INSERT INTO settlement_ledger (name, {", ".join(AMOUNT_COLUMNS)}, created_at, updated_at)
+                VALUES ({placeholders}, COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+            """, values + (change["created_at"],))
+            entry_id = cursor.lastrowid
+            if local is not None:
+                cursor.execute("DELETE FROM sync_row WHERE row_no = ?", (local[0],))
+            cursor.execute("UPDATE sync_row SET uid = ? WHERE entry_id = ?", (change["uid"], entry_id))
+        _apply_sellers(db, entry_id, change.get("sellers"))
+    cursor.execute("""
+        UPDATE sync_row SET origin = ?, changed_at = ?, deleted = ? WHERE uid = ?
+    """, (change["origin"], change["changed_at"], 1 if change["deleted"] else 0, change["uid"]))
+    return True
+
+
+def _reject(db: SettlementLedgerDB, change: dict):
+    """Keep a change that could not be applied for _retry_rejected, unless a newer one is kept already"""
+    db.cursor.execute("""
+        INSERT INTO sync_rejected (uid, origin, changed_at, change) VALUES (?, ?, ?, ?)
+        ON CONFLICT (uid) DO UPDATE
+        SET origin = excluded.origin, changed_at = excluded.changed_at, change = excluded.change
+        WHERE (excluded.changed_at, excluded.origin) > (sync_rejected.changed_at, sync_rejected.origin)
+    """, (change["uid"], change["origin"], change["changed_at"], json.dumps(change)))
+
+
+def _retry_rejected(db: SettlementLedgerDB) -> int:
+    """
+    Try the kept rejected changes again, oldest first; returns how many were applied
+    
+    A change is dropped once it is applied or a newer version of its entry
+    is here; one that still breaks a constraint is kept.
+    """
+    applied = 0
+    with db.transaction():
+        db.cursor.execute("SELECT uid, change FROM sync_rejected ORDER BY changed_at, origin")
+        for uid, text in db.cursor.fetchall():
+            try:
+                applied += _apply_change(db, json.loads(text))
+            except sqlite3.IntegrityError:
+                continue
+            db.cursor.execute("DELETE FROM sync_rejected WHERE uid = ?", (uid,))
+    return applied
+
+
+def rejected_changes(db: SettlementLedgerDB) -> int:
+    """The number of received changes kept because they could not be applied yet"""
+    _require_sync(db)
+    db.cursor.execute("SELECT COUNT(*) FROM sync_rejected")
+    return db.cursor.fetchone()[0]
+
+
+def apply_changes(db: SettlementLedgerDB, changeset: dict, batch_size: int = SYNC_BATCH_SIZE) -> dict:
+    """
+    Apply a changeset from another station, batch_size changes per transaction
+    
+    Conflicts are resolved per entry by last writer wins on the time of the
+    change, with the station name breaking ties, so stations that apply the
+    same changesets in any order end up with the same entries. Station
+    clocks should therefore be roughly right. The whole entry wins, not
+    single fields: if two stations edit different fields of one entry
+    between syncs, the earlier edit is lost. Applying a changeset again
+    changes nothing. The sender's token is saved once every batch is in.
+    
+    A change that would break a constraint here (e.g. the natural key) is
+    rejected and kept in sync_rejected. The kept changes are tried again
+    after every changeset, so one applies once the clash is resolved here
+    (e.g. the other entry is renamed or deleted).
+    
+    Applied changes are recorded like local ones, so they are passed on
+    when this station syncs with a third one.
+    
+    Returns:
+        A dict with the number of changes applied, skipped (the local
+        version is as new or newer), rejected (kept for a retry) and
+        retried (earlier rejected changes applied now)
+    """
+    _require_sync(db)
+    station = changeset["station"]
+    if station == db.sync_station:
+        raise ValueError("This changeset was exported from this ledger")
+    columns = changeset["columns"]
+    # Version 1 changesets carry no sellers
+    missing = set(CHANGE_COLUMNS) - set(columns) - {"sellers"}
+    if missing:
+        raise ValueError(f"Changeset is missing columns: {', '.join(sorted(missing))}")
+    
+    counts = {"applied": 0, "skipped": 0, "rejected": 0}
+    rows = changeset["changes"]
+    for start in range(0, len(rows), batch_size):
+        with db.transaction():
+            for row in rows[start:start + batch_size]:
+                change = dict(zip(columns, row))
+                try:
+                    applied = _apply_change(db, change)
+                except sqlite3.IntegrityError:
+                    _reject(db, change)
+                    counts["rejected"] += 1
+                    continue
+                counts["applied" if applied else "skipped"] += 1
+    with db.transaction():
+        _save_token(db, station, "received_seq", changeset["until"])
+    counts["retried"] = _retry_rejected(db)
+    return counts
+
+
+def sync_databases(db: SettlementLedgerDB, other: SettlementLedgerDB) -> dict:
+    """
+    Sync two ledgers both ways, sending each only what the other has not applied yet
+    
+    Returns:
+        {"sent": counts, "received": counts} as returned by apply_changes on
+        the other and on this ledger
+    """
+    _require_sync(db)
+    _require_sync(other)
+    here, there = db.sync_station, other.sync_station
+    sent = apply_changes(other, export_changes(db, sync_token(other, here), exclude_origin=there))
+    received = apply_changes(db, export_changes(other, sync_token(db, there), exclude_origin=here))
+    return {"sent": sent, "received": received}
@@ -0,0 +1,151 @@
+"""
+Tests for sync.py: two stations, each with its own ledger file
+Run with: python -m pytest tests (or python -m unittest discover tests)
+"""
+import os
+import tempfile
+import time
+import unittest
+
+from database import SettlementLedgerDB
+from sync import (apply_changes, export_changes, read_changeset, rejected_changes,
+                  sync_databases, write_changeset)
+
+
+def entries(db):
+    """Every entry without its local id and updated_at, in a station-independent order"""
+    return sorted(entry[1:11] for entry in db.get_all_entries())
+
+
+def later():
+    """Let the sync clock move on, so the next change is stamped later than the previous one"""
+    time.sleep(0.01)
+
+
+class TwoStationTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.north = self.station("north")
+        self.south = self.station("south")
+    
+    def tearDown(self):
+        self.north.close()
+        self.south.close()
+        self.tmp.cleanup()
+    
+    def station(self, name, **options):
+        db = SettlementLedgerDB(os.path.join(self.tmp.name, f"{name}.db"), **options)
+        db.enable_sync(name)
+        return db
+    
+    def test_sync_converges(self):
+        kept = self.north.add_entry("Ana", 100, 50, 10, 20)
+        dropped = self.north.add_entry("Ben", 5)
+        self.south.add_entry("Cora", 7.25)
+        sync_databases(self.north, self.south)
+        
+        # Change the other station's entries, then add one more on each side
+        south_ids = {entry[1]: entry[0] for entry in self.south.get_all_entries()}
+        north_ids = {entry[1]: entry[0] for entry in self.north.get_all_entries()}
+        self.south.update_entry(south_ids["Ana"], seller_3=30)
+        self.south.delete_entry(south_ids["Ben"])
+        self.north.update_entry(north_ids["Cora"], name="Cora Reyes")
+        self.north.add_entry("Dan", 1)
+        self.south.add_entry("Eve", 2)
+        sync_databases(self.north, self.south)
+        
+        self.assertEqual(entries(self.north), entries(self.south))
+        self.assertEqual([entry[0] for entry in entries(self.north)], ["Ana", "Cora Reyes", "Dan", "Eve"])
+        self.assertEqual(self.north.get_entry(kept)[2:7], (100, 50, 10, 20, 30))
+        self.assertIsNone(self.north.get_entry(dropped))
+    
+    def test_resync_changes_nothing(self):
+        self.north.add_entry("Ana", 100)
+        self.south.add_entry("Ben", 5)
+        sync_databases(self.north, self.south)
+        
+        again = sync_databases(self.north, self.south)
+        self.assertEqual(again["sent"]["applied"] + again["received"]["applied"], 0)
+        
+        # Applying the same changeset file twice
+        self.north.add_entry("Cora", 3)
+        path = os.path.join(self.tmp.name, "to-south.changes")
+        write_changeset(export_changes(self.north, exclude_origin="south"), path)
+        first = apply_changes(self.south, read_changeset(path))
+        before = entries(self.south)
+        second = apply_changes(self.south, read_changeset(path))
+        self.assertEqual(first["applied"], 1)
+        self.assertEqual(second["applied"], 0)
+        self.assertEqual(entries(self.south), before)
+        self.assertEqual(entries(self.north), entries(self.south))
+    
+    def test_conflict_later_change_wins(self):
+        entry_id = self.north.add_entry("Ana", 100)
+        sync_databases(self.north, self.south)
+        south_id = self.south.get_all_entries()[0][0]
+        
+        self.north.update_entry(entry_id, seller_1=10)
+        later()
+        self.south.update_entry(south_id, seller_2=20)
+        sync_databases(self.north, self.south)
+        
+        # The whole entry wins: north's seller_1 edit is lost on both stations
+        self.assertEqual(entries(self.north), entries(self.south))
+        self.assertEqual(self.north.get_entry(entry_id)[4:6], (None, 20))
+    
+    def test_conflict_is_resolved_the_same_in_any_order(self):
+        self.north.add_entry("Ana", 100)
+        sync_databases(self.north, self.south)
+        self.north.update_entry(1, today_balance=1)
+        later()
+        self.south.update_entry(1, today_balance=2)
+        path = os.path.join(self.tmp.name, "to-north.changes")
+        write_changeset(export_changes(self.south, exclude_origin="north"), path)
+        
+        # The older change arrives after the newer one was applied
+        apply_changes(self.south, export_changes(self.north, exclude_origin="south"))
+        apply_changes(self.north, read_changeset(path))
+        self.assertEqual(self.north.get_entry(1)[9], 2)
+        self.assertEqual(self.south.get_entry(1)[9], 2)
+    
+    def test_rejected_change_is_retried(self):
+        self.south.enable_natural_key()
+        self.north.add_entry("Ana", 100)
+        south_id = self.south.add_entry("Ana", 5)
+        
+        result = sync_databases(self.north, self.south)
+        self.assertEqual(result["sent"]["rejected"], 1)
+        self.assertEqual(rejected_changes(self.south), 1)
+        
+        # Once the clash is resolved, the next sync applies the kept change
+        self.south.update_entry(south_id, name="Ana B")
+        result = sync_databases(self.north, self.south)
+        self.assertEqual(result["sent"]["retried"], 1)
+        self.assertEqual(rejected_changes(self.south), 0)
+        self.assertEqual(entries(self.north), entries(self.south))
+    
+    def test_sellers_and_dates_are_synced(self):
+        self.north.close()
+        self.south.close()
+        self.north = self.station("north-sellers", seller_table=True)
+        self.south = self.station("south-sellers", seller_table=True, money_storage="cents")
+        entry_id = self.north.add_entry("Ana", 100, None, 10)
+        self.north.set_seller_amount(entry_id, 5, 12.5)
+        sync_databases(self.north, self.south)
+        south_id = self.south.get_all_entries()[0][0]
+        self.assertEqual(self.south.get_seller_amounts(south_id), {1: 10, 5: 12.5})
+        
+        later()
+        self.north.set_seller_amount(entry_id, 6, 0.35)
+        with self.north.transaction():
+            self.north.cursor.execute("UPDATE settlement_ledger SET created_at = '2024-05-31 01:00:00' WHERE id = ?",
+                                      (entry_id,))
+        sync_databases(self.north, self.south)
+        self.assertEqual(self.south.get_seller_amounts(south_id), {1: 10, 5: 12.5, 6: 0.35})
+        self.assertEqual(self.south.get_entry(south_id)[10], "2024-05-31 01:00:00")
+        self.assertEqual(entries(self.north), entries(self.south))
+
+
+if __name__ == "__main__":
+    unittest.main()
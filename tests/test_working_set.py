@@ -0,0 +1,65 @@
+"""
+Tests for the in-memory working-set mode of SettlementLedgerDB
+Run with: python -m pytest tests (or python -m unittest discover tests)
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database import SettlementLedgerDB, MONEY_CENTS
+
+
+class Interrupted(Exception):
+    pass
+
+
+class WorkingSetTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ledger.db")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_half_converted_ledger(self):
+        db = SettlementLedgerDB(self.path)
+        for i in range(50):
+            db.add_entry(f"Customer {i}", i + 0.25)
+        
+        def interrupt(description, done, total):
+            if done:
+                raise Interrupted
+        with self.assertRaises(Interrupted):
+            db.migrate_to_cents(interrupt, chunk_size=10)
+        db.close()
+        
+        # The conversion's mirror triggers call to_cents on every write
+        working_set = SettlementLedgerDB(self.path, working_set_days=7)
+        try:
+            entry_id = working_set.add_entry("New customer", 1.5)
+            working_set.update_entry(1, seller_1=2.35)
+            working_set.flush()
+        finally:
+            working_set.close()
+        
+        conn = sqlite3.connect(self.path)
+        try:
+            mirrored = dict(conn.execute("SELECT id, COALESCE(seller_1, previous_balance) "
+                                         "FROM settlement_ledger_cents WHERE id IN (1, ?)", (entry_id,)))
+        finally:
+            conn.close()
+        self.assertEqual(mirrored, {1: 235, entry_id: 150})
+        
+        db = SettlementLedgerDB(self.path, money_storage=MONEY_CENTS)
+        try:
+            self.assertEqual(db.get_entry(entry_id)[1:3], ("New customer", 1.5))
+            self.assertEqual(db.get_entry(1)[4], 2.35)
+            self.assertEqual(db.get_totals()["count"], 51)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()